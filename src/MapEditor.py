@@ -8,10 +8,39 @@ from PyQt5.QtWidgets import QUndoStack, QUndoCommand
 
 import math
 import yaml
-from PIL import Image
+import numpy as np
 import sys
 import os
 
+from autosave import Autosaver, read_annotations
+from map_analysis import (DIFF_ADDED, DIFF_CHANGED, DIFF_REMOVED, INSCRIBED_INFLATED_OBSTACLE, MAX_CLEARANCE,
+                          OUTSIDE, ClearanceField, PathGrid, WallSnapIndex, align_classes, alignment_rotation,
+                          cast_rays, class_diff, clearance_levels, detect_doorways, detect_wall_lines, diff_counts,
+                          dominant_wall_angle, grid_graph, inflation_cost_lut, path_length, path_tree,
+                          polygon_area, polygon_centroid, region_centroids, trace_path)
+from map_browser import MapBrowserPanel, describe_entry
+from map_io import DepthMapping, MapFormatError, MAP_SUFFIXES, map_basename, read_map, yaml_text
+from map_jobs import MapJob
+from map_ops import (FREE, MAP_MODES, OCCUPIED, UNKNOWN, class_lut, component_areas, crop_pad, flood_region,
+                     known_bbox, occupancy_lut, paint_values, pipeline_halo, rasterize_segments, resample_map,
+                     resample_point, rotate_map, rotate_point, run_pipeline, small_components, straighten_walls,
+                     tile_deltas)
+from map_save import SaveJob, SaveOutput
+from map_store import MapStore, STORE_SUFFIX, is_store
+from map_vector import simplify_polylines, wall_contours, write_dxf, write_svg
+from tiled_view import TILE_SIZE, TiledLayer, color_table_rgba, indexed_image, rgba_image, tile_range
+from ui_panels import (CanvasDialog, ClearanceDialog, CompareDialog, InflationDialog, MorphologyPanel,
+                       ReachabilityDialog, SpeckleDialog, StraightenDialog, WallVectorDialog)
+
+
+# Rendering and click-cycling per cell class (indexed by map_ops class ids)
+CLASS_COLORS = {OCCUPIED: Qt.black, UNKNOWN: Qt.gray, FREE: Qt.white}
+ALTERNATE_NEXT = {OCCUPIED: 'uncertain', UNKNOWN: 'unoccupied', FREE: 'occupied'}
+# Unknown cells in scale/raw maps, kept apart from the mid-gray of the gradient
+GRADIENT_UNKNOWN = QtGui.QColor(150, 160, 190)
+# Overlays drawn from the shared clearance field; edits refresh them tile by tile
+DISTANCE_OVERLAYS = ('clearance', 'inflation')
+
 
 # --- Undo/Redo command for snapshot-based state ---
 class SnapshotCommand(QUndoCommand):
@@ -33,6 +62,67 @@ class SnapshotCommand(QUndoCommand):
         except Exception:
             pass
 
+# --- Undo/Redo command for edits of map cells ---
+class TileDeltaCommand(QUndoCommand):
+    """Stores only the changed cells, grouped by tile (see map_ops.tile_deltas).
+
+    The edit has already been applied when the command is pushed, so the
+    first redo() (called by QUndoStack.push) is a no-op.
+    """
+    def __init__(self, editor, deltas, label="Edit Map"):
+        super(TileDeltaCommand, self).__init__(label)
+        self.editor = editor
+        self.deltas = deltas
+        self._applied = True
+
+    def _apply(self, use_new):
+        for ty, tx, rows, cols, old, new in self.deltas:
+            self.editor.map_data[rows, cols] = new if use_new else old
+        self.editor._tilesChanged([(ty, tx) for ty, tx, *_ in self.deltas])
+
+    def undo(self):
+        try:
+            self._apply(False)
+        except Exception:
+            pass
+
+    def redo(self):
+        if self._applied:
+            self._applied = False
+            return
+        try:
+            self._apply(True)
+        except Exception:
+            pass
+
+# --- Undo/Redo command for changes of map size, resolution or placement ---
+class GeometryCommand(QUndoCommand):
+    """Swaps whole map snapshots (see MapEditor._geometrySnapshot).
+
+    Like TileDeltaCommand, the change is applied before the push.
+    """
+    def __init__(self, editor, before, after, label="Transform Map"):
+        super(GeometryCommand, self).__init__(label)
+        self.editor = editor
+        self.before = before
+        self.after = after
+        self._applied = True
+
+    def undo(self):
+        try:
+            self.editor._applyGeometry(self.before)
+        except Exception as e:
+            print(f"Error undoing {self.text()}: {e}")
+
+    def redo(self):
+        if self._applied:
+            self._applied = False
+            return
+        try:
+            self.editor._applyGeometry(self.after)
+        except Exception as e:
+            print(f"Error redoing {self.text()}: {e}")
+
 # --- Helper classes for text annotations with resize handles ---
 class TextAnnotationItem(QtWidgets.QGraphicsTextItem):
     """QGraphicsTextItem subclass that notifies a callback on position/selection changes."""
@@ -329,9 +419,12 @@ class TextSelectionOverlay(object):
 
 
 class MapEditor(QtWidgets.QMainWindow):
-    def __init__(self, fn):
+    def __init__(self, fn, depth_mapping=None):
         super(MapEditor, self).__init__()
 
+        # How maps with more than 8 bits per sample are squeezed into the model
+        self.depth_mapping = depth_mapping or DepthMapping()
+
     # Setup user interface from the generated Python module (programmatic UI)
         self.ui = Ui_MapEditor()
         self.ui.setupUi(self)
@@ -390,12 +483,112 @@ class MapEditor(QtWidgets.QMainWindow):
         self.line_start_point = None
         self.temp_line = None
         self.lines = []  # Store drawn line items (for persistence/undo)
+
+        # Initialize area tool state
+        self.area_mode = 'polygon'
+        self.area_points = []  # Scene positions of the polygon being placed
+        self.temp_area = None
+        self.areas = []  # Store area annotations (polygons and regions)
+        self._region_labels = {}
+        self.ui.areaModeBox.currentIndexChanged.connect(self.handleAreaMode)
+
+        # Tiled overlays drawn above the map: name -> (tile_source, z)
+        self.overlay_sources = {}
+        self.overlay_layers = {}
+
+        # Morphology preview follows the viewport (debounced)
+        self._morph_steps = []
+        self._morph_job = None
+        # Read-only analyses running on a worker (doorway detection, ...)
+        self._analysis_job = None
+        # One-shot map click consumers (see _requestMapPick)
+        self._map_pick = None
+        self._wall_angle_cache = None
+        self._reach_start = None
+        self._reach_timer = QtCore.QTimer(self)
+        self._reach_timer.setSingleShot(True)
+        self._reach_timer.setInterval(300)
+        self._reach_timer.timeout.connect(self.analyzeReachability)
+        # Path checker: cost grid refreshed per dirty tile on a worker, graph and
+        # search tree rebuilt there only when the grid changed
+        self.path_start = None
+        self.path_goal = None
+        self._path_grid = PathGrid()
+        self._path_field = ClearanceField()
+        self._path_graph = None
+        self._path_tree = None
+        self._path_job = None
+        self._path_pending = False
+        self._path_items = []
+        self._path_cells = None
+        self._path_timer = QtCore.QTimer(self)
+        self._path_timer.setSingleShot(True)
+        self._path_timer.setInterval(300)
+        self._path_timer.timeout.connect(self._startPathSearch)
+        # Vector walls: contours traced on a worker per map version and
+        # simplified there again whenever the tolerance changes
+        self._wall_contours = None
+        self._wall_vectors = None
+        self._wall_item = None
+        self._wall_job = None
+        self._wall_pending = False
+        self._wall_timer = QtCore.QTimer(self)
+        self._wall_timer.setSingleShot(True)
+        self._wall_timer.setInterval(300)
+        self._wall_timer.timeout.connect(self._startWallExtraction)
+        # Wall straightening: detection and redraw run on a worker, the result
+        # is kept for Apply as long as map, thresholds and parameters match
+        self._straighten_job = None
+        self._straighten_pending = None
+        self._straighten_result = None
+        self._straighten_timer = QtCore.QTimer(self)
+        self._straighten_timer.setSingleShot(True)
+        self._straighten_timer.setInterval(300)
+        self._straighten_timer.timeout.connect(
+            lambda: self.previewStraighten(self.straighten_dialog.params()))
+        # Map diff: the reference map's classes and georeference, and its
+        # classes resampled onto the current grid
+        self._diff_source = None
+        self._diff_ref = None
+        self._diff_timer = QtCore.QTimer(self)
+        self._diff_timer.setSingleShot(True)
+        self._diff_timer.setInterval(300)
+        self._diff_timer.timeout.connect(self._updateDiffStats)
+        self._morph_timer = QtCore.QTimer(self)
+        self._morph_timer.setSingleShot(True)
+        self._morph_timer.setInterval(120)
+        self._morph_timer.timeout.connect(self._updateMorphologyPreview)
+        # Distance-based overlays (clearance, inflation) follow edits tile by tile (debounced)
+        self._clearance = ClearanceField()
+        self._distance_dirty = set()
+        self._distance_timer = QtCore.QTimer(self)
+        self._distance_timer.setSingleShot(True)
+        self._distance_timer.setInterval(100)
+        self._distance_timer.timeout.connect(self._refreshDistanceOverlays)
         
         # Initialize cursor size
         self.cursor_size = 1
         self.ui.cursorSizeSlider.valueChanged.connect(self.handleCursorSize)
         self.ui.cursorSizeSpinBox.valueChanged.connect(self.handleCursorSize)
         
+        # Flood fill neighbourhood (4 or 8)
+        self.fill_connectivity = 4
+        self.crop_margin = 10
+        try:
+            self.ui.fillConnectivityBox.currentIndexChanged.connect(self.handleFillConnectivity)
+        except Exception:
+            pass
+
+        # Measure/line endpoints snap to the nearest wall face
+        self.snap_to_walls = True
+        self._snap_index = WallSnapIndex(tolerance=6)
+        try:
+            self.ui.pathInflationCheck.toggled.connect(lambda _: self._startPathSearch())
+            self.ui.snapCheck.toggled.connect(self.handleSnapToggle)
+            self.ui.snapToleranceSpin.valueChanged.connect(self.handleSnapTolerance)
+        except Exception:
+            pass
+
         # Initialize line thickness
         self.line_thickness = 2
         try:
@@ -404,11 +597,22 @@ class MapEditor(QtWidgets.QMainWindow):
         except Exception:
             pass
         
+        # Classification threshold controls (values come from the YAML in read())
+        try:
+            self.ui.occupiedThreshSlider.valueChanged.connect(lambda v: self.handleOccupiedThresh(v / 100.0))
+            self.ui.occupiedThreshSpin.valueChanged.connect(self.handleOccupiedThresh)
+            self.ui.freeThreshSlider.valueChanged.connect(lambda v: self.handleFreeThresh(v / 100.0))
+            self.ui.freeThreshSpin.valueChanged.connect(self.handleFreeThresh)
+            self.ui.resetThreshBtn.clicked.connect(self.resetThresholds)
+        except Exception:
+            pass
+
         # Initialize rotation
         self.rotation_angle = 0
-        self.ui.rotationSlider.valueChanged.connect(self.handleRotation)
+        # The slider drives the spinbox, so the spinbox alone reports the angle
         self.ui.rotationSpinBox.valueChanged.connect(self.handleRotation)
         self.ui.resetRotationBtn.clicked.connect(self.resetRotation)
+        self.ui.detectRotationBtn.clicked.connect(self.detectWallAngle)
 
         self.read(fn)
 
@@ -440,6 +644,37 @@ class MapEditor(QtWidgets.QMainWindow):
         
         self.ui.closeButton.clicked.connect(self.closeEvent)
         self.ui.saveButton.clicked.connect(self.saveEvent)
+        try:
+            self.ui.actionBrowseMaps.triggered.connect(self.showMapBrowser)
+            self.ui.actionRemoveSpeckles.triggered.connect(self.showSpeckleDialog)
+            self.ui.actionMorphology.triggered.connect(self.showMorphologyPanel)
+            self.ui.actionStraightenWalls.triggered.connect(self.showStraightenDialog)
+            self.ui.actionBakeRotation.triggered.connect(self.bakeRotation)
+            self.ui.actionDetectWallAngle.triggered.connect(self.detectWallAngle)
+            self.ui.actionCropToKnown.triggered.connect(self.cropToKnown)
+            self.ui.actionResizeCanvas.triggered.connect(self.showCanvasDialog)
+            self.ui.actionResample.triggered.connect(self.showResampleDialog)
+            self.ui.actionRasterizeLines.triggered.connect(self.rasterizeSelectedLines)
+            self.ui.actionAutoDimension.triggered.connect(
+                lambda: self._requestMapPick("📐 Click inside a room to dimension it (ESC to cancel)",
+                                             self.autoDimensionAt))
+            self.ui.actionDetectDoorways.triggered.connect(self.detectDoorways)
+            self.ui.actionClearance.triggered.connect(self.showClearanceDialog)
+            self.ui.actionInflation.triggered.connect(self.showInflationDialog)
+            self.ui.actionReachability.triggered.connect(self.showReachabilityDialog)
+            self.ui.actionVectorizeWalls.triggered.connect(self.showWallVectorDialog)
+            self.ui.actionCompareMaps.triggered.connect(self.showCompareDialog)
+        except Exception:
+            pass
+        try:
+            self.ui.actionExportRos.triggered.connect(self.exportRosMap)
+            if self.map_store is not None:
+                self.ui.actionSaveNative.setChecked(True)
+        except Exception:
+            pass
+
+        # Background autosave of edits since the last autosave
+        self._setupAutosave()
         # Make Clear Dimensions undoable
         try:
             self.ui.clearDimensionsBtn.clicked.disconnect()
@@ -497,13 +732,23 @@ class MapEditor(QtWidgets.QMainWindow):
             except Exception:
                 pass
             if event.key() == Qt.Key_Escape:
-                if self.tool_mode == 'measure' and self.measuring:
+                if self._map_pick is not None:
+                    self._map_pick = None
+                    self.ui.graphicsView.viewport().unsetCursor()
+                    self.ui.statusInfo.setText("Pick cancelled")
+                elif self.tool_mode == 'measure' and self.measuring:
                     self.cancelMeasurement()
                     self.ui.statusInfo.setText("📏 Measurement cancelled - Click to start")
                     print("Measurement cancelled with ESC")
                 elif self.tool_mode == 'line' and self.drawing_line:
                     self.cancelLineDrawing()
                     self.ui.statusInfo.setText("➖ Line drawing cancelled - Click to start")
+                elif self.tool_mode == 'path' and self.path_start is not None:
+                    self.clearPath()
+                    self.ui.statusInfo.setText("🧭 Path cleared - Click a start point")
+                elif self.tool_mode == 'area' and self.area_points:
+                    self.cancelAreaPolygon()
+                    self.ui.statusInfo.setText("🔷 Area cancelled - Click to start")
                 elif self.selected_dimension:
                     self.deselectDimension()
                 else:
@@ -513,6 +758,9 @@ class MapEditor(QtWidgets.QMainWindow):
                     except Exception:
                         pass
                 return True
+            elif event.key() in (Qt.Key_Return, Qt.Key_Enter) and self.tool_mode == 'area' and self.area_points:
+                self.finishAreaPolygon()
+                return True
             elif event.key() == Qt.Key_V:
                 try:
                     self._setToolMode('select')
@@ -560,8 +808,9 @@ class MapEditor(QtWidgets.QMainWindow):
         if (event.type() == QtCore.QEvent.MouseMove and 
             source is self.ui.graphicsView.viewport()):
             
-                        # Update cursor indicator position
-                        scene_pos = self.ui.graphicsView.mapToScene(event.pos())
+                        # Update cursor indicator position (on the snap point when snapping)
+                        scene_pos = self._snapScenePos(self.ui.graphicsView.mapToScene(event.pos()),
+                                                       event.modifiers())
                         self.updateCursorIndicator(scene_pos)
 
                         # Paint if in paint mode and dragging
@@ -589,6 +838,17 @@ class MapEditor(QtWidgets.QMainWindow):
                                     self.drawing_line and 
                                     self.line_start_point is not None):
                                 self.updateLinePreview(scene_pos)
+
+                        # Show the open polygon in area mode
+                        elif self.tool_mode == 'area' and self.area_points:
+                                self.updateAreaPreview(scene_pos)
+
+                        # Drag the goal in path mode
+                        elif (self.tool_mode == 'path' and
+                                    self.path_start is not None and
+                                    event.buttons() == QtCore.Qt.LeftButton):
+                                self.setPathGoal(scene_pos.x() / self.pixels_per_cell,
+                                                 scene_pos.y() / self.pixels_per_cell)
         
         # Handle mouse enter/leave to show/hide cursor
         elif event.type() == QtCore.QEvent.Enter and source is self.ui.graphicsView.viewport():
@@ -727,39 +987,178 @@ class MapEditor(QtWidgets.QMainWindow):
 
     def paint_area(self, center_x, center_y, brush_size):
         """Paint an area with the specified brush size"""
-        if self.color == 'occupied':
-            val = 0
-        elif self.color == 'unoccupied':
-            val = 255
-        elif self.color == 'uncertain':
-            val = 200
-        else:
+        # Pixel value for the color under this map's mode/negate
+        val = self.paint_values.get(self.color)
+        if val is None:
             return
             
-        # Calculate brush area
+        # Calculate brush area (clipped to the map)
         radius = brush_size // 2
-        for dx in range(-radius, radius + 1):
-            for dy in range(-radius, radius + 1):
-                x = center_x + dx
-                y = center_y + dy
-                
-                # Check bounds
-                if (x >= 0 and x < self.map_width_cells and 
-                    y >= 0 and y < self.map_height_cells):
-                    
-                    # For circular brush, check distance
-                    if brush_size > 1:
-                        distance = math.sqrt(dx*dx + dy*dy)
-                        if distance > radius:
-                            continue
-                    
-                    # Update model
-                    self.im.putpixel((x, y), val)
-                    
-                    # Redraw cell
-                    color = self.value2color(val)
-                    self.color_cell(x, y, color)
+        x0 = max(0, center_x - radius)
+        y0 = max(0, center_y - radius)
+        x1 = min(self.map_width_cells, center_x + radius + 1)
+        y1 = min(self.map_height_cells, center_y + radius + 1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        self._ensureTilesLoaded(x0, y0, x1, y1)
+        region = self.map_data[y0:y1, x0:x1]
+        if brush_size > 1:
+            # For circular brush, check distance
+            dy, dx = np.ogrid[y0 - center_y:y1 - center_y, x0 - center_x:x1 - center_x]
+            region[dx * dx + dy * dy <= radius * radius] = val
+        else:
+            region[...] = val
+
+        # Redraw affected tiles
+        self._mapChanged(x0, y0, x1, y1)
 
+    def fillAt(self, x, y):
+        """Flood fill the region of same-class cells containing (x, y) with the paint color."""
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells):
+            return
+        val = self.paint_values.get(self.color)
+        if val is None:
+            self.ui.statusInfo.setText("⚠️ Pick Occupied, Unoccupied or Uncertain to fill")
+            return
+        self._ensureMapLoaded()
+        mask, (x0, y0, x1, y1) = flood_region(self.class_lut[self.map_data], x, y, self.fill_connectivity)
+        region = self.map_data[y0:y1, x0:x1]
+        filled = np.where(mask, np.uint8(val), region)
+        changed = self._commitCells("Fill", x0, y0, filled)
+        print(f"Filled {int(mask.sum())} cells at ({x}, {y}), {changed} changed")
+        self.ui.statusInfo.setText(f"🪣 Filled {int(mask.sum())} cells")
+
+    def _commitCells(self, label, x0, y0, cells):
+        """Write `cells` into the map at (x0, y0) as one undoable edit; returns the changed cell count."""
+        h, w = cells.shape
+        self._ensureTilesLoaded(x0, y0, x0 + w, y0 + h)
+        deltas = tile_deltas(self.map_data[y0:y0 + h, x0:x0 + w], cells, x0, y0)
+        if not deltas:
+            return 0
+        self.map_data[y0:y0 + h, x0:x0 + w] = cells
+        self._tilesChanged([(ty, tx) for ty, tx, *_ in deltas])
+        self.undo_stack.push(TileDeltaCommand(self, deltas, label))
+        return sum(len(d[2]) for d in deltas)
+
+    def _requestMapPick(self, prompt, callback):
+        """Let the next left click on the map call callback(x, y) in cell coordinates.
+
+        Right click or ESC cancels. Used by analyses that need a location
+        (a room to dimension, a start cell, ...) without a dedicated tool.
+        """
+        self._map_pick = callback
+        self.ui.graphicsView.viewport().setCursor(Qt.CrossCursor)
+        self.ui.statusInfo.setText(prompt)
+
+    def _wallAngle(self):
+        """Dominant wall angle of the current map in (-45, 45], cached per map version."""
+        if self._wall_angle_cache is None or self._wall_angle_cache[0] != self.map_version:
+            self._ensureMapLoaded()
+            angle, _ = dominant_wall_angle(self.class_lut[self.map_data] == OCCUPIED)
+            angle = angle or 0.0
+            self._wall_angle_cache = (self.map_version, angle - 90.0 if angle > 45.0 else angle)
+        return self._wall_angle_cache[1]
+
+    def _dimensionAxes(self):
+        """Angles (degrees) of the two measuring directions for automatic dimensions."""
+        angle = self._wallAngle() if self.ui.actionAlignAutoDimensions.isChecked() else 0.0
+        return angle, angle + 90.0
+
+    def _addDimensions(self, label, segments):
+        """Create dimensions for (x0, y0, x1, y1) cell segments as one undo step."""
+        ppc = self.pixels_per_cell
+
+        def do_add():
+            for x0, y0, x1, y1 in segments:
+                self.createDimension(QtCore.QPointF(x0 * ppc, y0 * ppc), QtCore.QPointF(x1 * ppc, y1 * ppc),
+                                     from_restore=True)
+        self._pushSnapshotAction(label, do_add)
+
+    def autoDimensionAt(self, px, py):
+        """Dimension the room around cell position (px, py) wall to wall along both axes."""
+        self._ensureMapLoaded()
+        x, y = int(math.floor(px)), int(math.floor(py))
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells) or \
+                self.class_lut[self.map_data[y, x]] != FREE:
+            self.ui.statusInfo.setText("⚠️ Click on free space inside a room")
+            return
+        segments, sizes = [], []
+        classes = self.class_lut[self.map_data]
+        max_len = math.hypot(self.map_width_cells, self.map_height_cells)
+        for axis in self._dimensionAxes():
+            (fwd, back), hit = cast_rays(classes, px, py, [axis, axis + 180.0], max_len)
+            if not hit.all():
+                continue
+            ux, uy = math.cos(math.radians(axis)), math.sin(math.radians(axis))
+            segments.append((px - back * ux, py - back * uy, px + fwd * ux, py + fwd * uy))
+            sizes.append((fwd + back) * self.resolution)
+        if not segments:
+            self.ui.statusInfo.setText("⚠️ No walls found around that point (open to unknown space)")
+            return
+        self._addDimensions("Auto Dimension", segments)
+        print(f"Auto dimension at ({px:.1f}, {py:.1f}): " + ", ".join(f"{s:.3f} m" for s in sizes))
+        self.ui.statusInfo.setText("📐 " + " × ".join(f"{s:.2f} m" for s in sizes))
+
+    def detectDoorways(self, min_width_m=0.6, max_width_m=1.5):
+        """Find doorways on a worker thread and dimension each one."""
+        if self._analysis_job is not None:
+            return
+        self._ensureMapLoaded()
+        classes = self.class_lut[self.map_data]
+        angle = self._dimensionAxes()[0]
+        lo, hi = min_width_m / self.resolution, max_width_m / self.resolution
+        start_version = self.map_version
+        job = MapJob(lambda progress, cancelled: detect_doorways(classes, lo, hi, angle, progress=progress,
+                                                                 cancelled=cancelled), self)
+        job.finished_job.connect(lambda result, error: self._onDoorwaysFinished(job, result, error, start_version))
+        self._analysis_job = job
+        self.ui.statusInfo.setText("🚪 Detecting doorways…")
+        job.start()
+
+    def _onDoorwaysFinished(self, job, result, error, start_version):
+        self._analysis_job = None
+        job.deleteLater()
+        if error:
+            self.ui.statusInfo.setText(f"❌ Doorway detection failed: {error}")
+            return
+        if result is None:
+            return
+        if self.map_version != start_version:
+            self.ui.statusInfo.setText("⚠️ Map changed during doorway detection; run it again")
+            return
+        if not result:
+            self.ui.statusInfo.setText("🚪 No doorways found")
+            return
+        self._addDimensions("Detect Doorways", result)
+        print(f"Detected {len(result)} doorways")
+        self.ui.statusInfo.setText(f"🚪 {len(result)} doorway(s) dimensioned")
+
+    def rasterizeSelectedLines(self):
+        """Burn the selected drawn lines into the map as occupied cells (one undo step)."""
+        selected = []
+        for entry in getattr(self, 'lines', []):
+            try:
+                if entry['item'].isSelected():
+                    selected.append(entry)
+            except Exception:
+                pass
+        if not selected:
+            self.ui.statusInfo.setText("⚠️ Select the lines to rasterize first (🖱️ Select tool)")
+            return
+        self._ensureMapLoaded()
+        segments = np.array([e['start_cell'] + e['end_cell'] for e in selected], dtype=np.float64)
+        thickness = np.array([e.get('thickness', 1) for e in selected], dtype=np.int64)
+        rows, cols = rasterize_segments(segments, thickness, self.map_data.shape)
+        if len(rows) == 0:
+            self.ui.statusInfo.setText("⚠️ The selected lines are outside the map")
+            return
+        x0, y0, x1, y1 = int(cols.min()), int(rows.min()), int(cols.max()) + 1, int(rows.max()) + 1
+        self._ensureTilesLoaded(x0, y0, x1, y1)
+        cells = self.map_data[y0:y1, x0:x1].copy()
+        cells[rows - y0, cols - x0] = self.paint_values['occupied']
+        changed = self._commitCells("Rasterize Lines", x0, y0, cells)
+        print(f"Rasterized {len(selected)} lines: {changed} cells set to occupied")
+        self.ui.statusInfo.setText(f"🧱 {len(selected)} line(s) burned into the map ({changed} cells)")
 
     def paintEvent(self, e):
         self.scrollChanged(0)
@@ -770,13 +1169,14 @@ class MapEditor(QtWidgets.QMainWindow):
         try:
             if not hasattr(self, 'scene') or self.scene is None:
                 return
+            self._updateVisibleTiles()
             sw = self.scene.width()
             sh = self.scene.height()
             if sw and sh:
-                x = int(self.ui.graphicsView.horizontalScrollBar().value() / sw * self.im.size[0])
-                y = int(self.ui.graphicsView.verticalScrollBar().value() / sh * self.im.size[1])
-                width = int(self.ui.graphicsView.viewport().size().width() / sw * self.im.size[0])
-                height = int(self.ui.graphicsView.viewport().size().height() / sh * self.im.size[1])
+                x = int(self.ui.graphicsView.horizontalScrollBar().value() / sw * self.map_width_cells)
+                y = int(self.ui.graphicsView.verticalScrollBar().value() / sh * self.map_height_cells)
+                width = int(self.ui.graphicsView.viewport().size().width() / sw * self.map_width_cells)
+                height = int(self.ui.graphicsView.viewport().size().height() / sh * self.map_height_cells)
                 self.drawBox(x, y, width, height)
         except Exception:
             # ignore transient errors (e.g., wrapped C++ object deleted)
@@ -785,16 +1185,19 @@ class MapEditor(QtWidgets.QMainWindow):
 
     def drawBox(self, x=5, y=5, width=50, height=50):
 
-        im = self.im.convert("RGBA")
-        data = im.tobytes("raw","RGBA")
-        qim = QtGui.QImage(data, im.size[0], im.size[1], QtGui.QImage.Format_ARGB32)
-        pix = QtGui.QPixmap.fromImage(qim)
+        # The overview image only changes when the map does; reuse it otherwise.
+        # Large maps are subsampled so the overview stays cheap to rebuild.
+        step = max(1, int(math.ceil(max(self.map_width_cells, self.map_height_cells) / 512.0)))
+        if getattr(self, '_minimap_version', None) != self.map_version:
+            self._minimap_image = indexed_image(self.map_data[::step, ::step], self.color_table)
+            self._minimap_version = self.map_version
+        pix = QtGui.QPixmap.fromImage(self._minimap_image)
 
         painter = QtGui.QPainter(pix)
         pen = QPen(Qt.red)
         pen.setWidth(1)
         painter.setPen(pen)
-        painter.drawRect(x, y, width, height)
+        painter.drawRect(x // step, y // step, width // step, height // step)
 
         painter.end()
 
@@ -805,6 +1208,10 @@ class MapEditor(QtWidgets.QMainWindow):
         mode_data = self.ui.toolModeBox.currentData()
         self.tool_mode = mode_data
         print(f"Tool mode changed to: {self.tool_mode}")
+        if self.tool_mode != 'area' and self.area_points:
+            self.cancelAreaPolygon()
+        if self.tool_mode != 'path' and self.path_start is not None:
+            self.clearPath()
         
         if self.tool_mode == 'select':
             self.ui.statusInfo.setText("🖱️ Select Mode: Click to select, drag to move")
@@ -835,6 +1242,39 @@ class MapEditor(QtWidgets.QMainWindow):
             self.ui.colorBox.setEnabled(False)
             self.ui.cursorSizeSlider.setEnabled(False)
             self.ui.cursorSizeSpinBox.setEnabled(False)
+        elif self.tool_mode == 'area':
+            if self.area_mode == 'region':
+                self.ui.statusInfo.setText("🔷 Area Mode: Click free space to measure its region")
+            else:
+                self.ui.statusInfo.setText("🔷 Area Mode: Click the corners, Enter or right-click to close")
+            try:
+                self.ui.graphicsView.setDragMode(QtWidgets.QGraphicsView.NoDrag)
+            except Exception:
+                pass
+            self.ui.colorBox.setEnabled(False)
+            self.ui.cursorSizeSlider.setEnabled(False)
+            self.ui.cursorSizeSpinBox.setEnabled(False)
+            try:
+                self.ui.textSizeSpinBox.setEnabled(False)
+                self.ui.textRotationSlider.setEnabled(False)
+                self.ui.textRotationSpinBox.setEnabled(False)
+            except Exception:
+                pass
+        elif self.tool_mode == 'path':
+            self.ui.statusInfo.setText("🧭 Path Mode: Click a start point, then click or drag the goal")
+            try:
+                self.ui.graphicsView.setDragMode(QtWidgets.QGraphicsView.NoDrag)
+            except Exception:
+                pass
+            self.ui.colorBox.setEnabled(False)
+            self.ui.cursorSizeSlider.setEnabled(False)
+            self.ui.cursorSizeSpinBox.setEnabled(False)
+            try:
+                self.ui.textSizeSpinBox.setEnabled(False)
+                self.ui.textRotationSlider.setEnabled(False)
+                self.ui.textRotationSpinBox.setEnabled(False)
+            except Exception:
+                pass
         elif self.tool_mode == 'text':
             self.ui.statusInfo.setText("🔤 Text Mode: Click to add text annotations")
             # No rubber-band drag in text mode
@@ -853,6 +1293,22 @@ class MapEditor(QtWidgets.QMainWindow):
                 self.ui.textRotationSpinBox.setEnabled(True)
             except Exception:
                 pass
+        elif self.tool_mode == 'fill':
+            self.ui.statusInfo.setText("🪣 Fill Mode: Click a region to fill it with the selected color")
+            try:
+                self.ui.graphicsView.setDragMode(QtWidgets.QGraphicsView.NoDrag)
+            except Exception:
+                pass
+            # Fill uses the color, but not the brush size
+            self.ui.colorBox.setEnabled(True)
+            self.ui.cursorSizeSlider.setEnabled(False)
+            self.ui.cursorSizeSpinBox.setEnabled(False)
+            try:
+                self.ui.textSizeSpinBox.setEnabled(False)
+                self.ui.textRotationSlider.setEnabled(False)
+                self.ui.textRotationSpinBox.setEnabled(False)
+            except Exception:
+                pass
         elif self.tool_mode == 'line':
             self.ui.statusInfo.setText("➖ Line Mode: Click two points")
             # No rubber-band drag while drawing lines
@@ -907,6 +1363,46 @@ class MapEditor(QtWidgets.QMainWindow):
         print(f"Color changed to: {self.color}")
         self.ui.statusInfo.setText(f"Color mode: {self.color.title()}")
 
+    def handleFillConnectivity(self, index):
+        self.fill_connectivity = self.ui.fillConnectivityBox.currentData() or 4
+        self.ui.statusInfo.setText(f"🪣 Fill connectivity: {self.fill_connectivity}-connected")
+
+    def handleAreaMode(self, index):
+        self.area_mode = self.ui.areaModeBox.currentData() or 'polygon'
+        if self.area_points:
+            self.cancelAreaPolygon()
+        if self.tool_mode == 'area':
+            self.handleToolMode(self.ui.toolModeBox.currentIndex())
+        else:
+            self._setToolMode('area')
+
+    def handleSnapToggle(self, checked):
+        self.snap_to_walls = bool(checked)
+        self.ui.statusInfo.setText("🧲 Snap to walls on" if checked else "🧲 Snap to walls off")
+
+    def handleSnapTolerance(self, value):
+        self._snap_index.tolerance = int(value)
+        self._snap_index.clear()
+
+    def _snapScenePos(self, scene_pos, modifiers=Qt.NoModifier):
+        """Move a measure/line/area point onto the nearest wall face (Shift places it freely)."""
+        if not self.snap_to_walls or modifiers & Qt.ShiftModifier or self.tool_mode not in ('measure', 'line', 'area'):
+            return scene_pos
+        try:
+            ppc = self.pixels_per_cell
+            px, py = scene_pos.x() / ppc, scene_pos.y() / ppc
+            # The tile holding the cursor and the halo around it must be decoded
+            reach = self._snap_index.tolerance + 1
+            tx0, ty0 = int(px) // TILE_SIZE * TILE_SIZE, int(py) // TILE_SIZE * TILE_SIZE
+            self._ensureTilesLoaded(tx0 - reach, ty0 - reach, tx0 + TILE_SIZE + reach, ty0 + TILE_SIZE + reach)
+            hit = self._snap_index.snap(self.map_data, self.class_lut, self.tile_versions, px, py)
+        except Exception as e:
+            print('Error snapping to walls:', e)
+            return scene_pos
+        if hit is None:
+            return scene_pos
+        return QtCore.QPointF(hit[0] * ppc, hit[1] * ppc)
+
     def handleCursorSize(self, value):
         self.cursor_size = value
         print(f"Cursor size changed to: {self.cursor_size}")
@@ -1096,8 +1592,8 @@ class MapEditor(QtWidgets.QMainWindow):
 
     def handleRotation(self, angle):
         self.rotation_angle = angle
-        print(f"Rotation changed to: {self.rotation_angle}°")
-        self.ui.statusInfo.setText(f"Rotation: {self.rotation_angle}°")
+        print(f"Rotation changed to: {self.rotation_angle:g}°")
+        self.ui.statusInfo.setText(f"Rotation: {self.rotation_angle:g}°")
         self.apply_rotation()
 
     def resetRotation(self):
@@ -1106,6 +1602,25 @@ class MapEditor(QtWidgets.QMainWindow):
         self.rotation_angle = 0
         self.apply_rotation()
 
+    def detectWallAngle(self):
+        """Estimate the dominant wall direction and propose the rotation that aligns it."""
+        self._ensureMapLoaded()
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            occupied = self.class_lut[self.map_data] == OCCUPIED
+            angle, confidence = dominant_wall_angle(occupied)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        if angle is None:
+            self.ui.statusInfo.setText("⚠️ No occupied cells to detect walls from")
+            return
+        rotation = round(alignment_rotation(angle), 1)
+        # Setting the spinbox previews the rotation; Map → Apply rotation bakes it in
+        self.ui.rotationSpinBox.setValue(rotation)
+        print(f"Dominant wall angle {angle:.2f}° (confidence {confidence:.2f}), proposing {rotation:g}°")
+        self.ui.statusInfo.setText(f"📐 Walls at {angle:.1f}° — proposed rotation {rotation:g}° "
+                                   f"(confidence {confidence:.0%})")
+
     def apply_rotation(self):
         if hasattr(self, 'scene'):
             # Apply rotation to the graphics view
@@ -1113,6 +1628,218 @@ class MapEditor(QtWidgets.QMainWindow):
             transform.rotate(self.rotation_angle)
             self.ui.graphicsView.setTransform(transform)
 
+    def bakeRotation(self):
+        """Resample the map so the current view rotation becomes part of the map data."""
+        angle = float(self.rotation_angle)
+        if angle % 360 == 0:
+            self.ui.statusInfo.setText("⚠️ Set a view rotation first")
+            return
+        self._ensureMapLoaded()
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            src_shape = self.map_data.shape
+            data = rotate_map(self.map_data, angle, self.paint_values['uncertain'])
+            # Rotate about the map center and keep the center's world position
+            yaw = self.origin_yaw
+            cx, cy = self._mapToWorld(src_shape[1] / 2.0, src_shape[0] / 2.0)
+            hw, hh = data.shape[1] * self.resolution / 2.0, data.shape[0] * self.resolution / 2.0
+            origin = (cx - (hw * math.cos(yaw) - hh * math.sin(yaw)),
+                      cy - (hw * math.sin(yaw) + hh * math.cos(yaw)),
+                      yaw)
+            self._commitGeometry(
+                "Apply Rotation", data, origin=origin,
+                point_fn=lambda x, y: rotate_point(x, y, angle, src_shape, data.shape),
+                rotation=angle)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        self.resetRotation()
+        print(f"Rotation of {angle}° applied to map: {src_shape[1]}x{src_shape[0]} -> "
+              f"{self.map_width_cells}x{self.map_height_cells}")
+        self.ui.statusInfo.setText(f"🔄 Rotation of {angle:g}° applied to the map")
+
+    def resizeCanvas(self, left, top, right, bottom, label="Resize Canvas"):
+        """Add (positive) or remove (negative) cells on each side, keeping world coordinates."""
+        self._ensureMapLoaded()
+        x0, y0 = -left, -top
+        x1, y1 = self.map_width_cells + right, self.map_height_cells + bottom
+        if x1 <= x0 or y1 <= y0:
+            self.ui.statusInfo.setText("⚠️ The map would be empty")
+            return False
+        old_size = (self.map_width_cells, self.map_height_cells)
+        data = crop_pad(self.map_data, x0, y0, x1, y1, self.paint_values['uncertain'])
+        # The new bottom-left corner is old cell position (x0, y1)
+        origin = self._mapToWorld(x0, y1) + (self.origin_yaw,)
+        self._commitGeometry(label, data, origin=origin, point_fn=lambda x, y: (x - x0, y - y0))
+        print(f"{label}: {old_size[0]}x{old_size[1]} -> {self.map_width_cells}x{self.map_height_cells}")
+        self.ui.statusInfo.setText(f"✂️ {label}: {old_size[0]}x{old_size[1]} → "
+                                   f"{self.map_width_cells}x{self.map_height_cells} cells")
+        return True
+
+    def cropToKnown(self):
+        """Crop the map to the bounding box of known cells plus `crop_margin` cells."""
+        self._ensureMapLoaded()
+        bbox = known_bbox(self.class_lut[self.map_data], self.crop_margin)
+        if bbox is None:
+            self.ui.statusInfo.setText("⚠️ The map has no known cells")
+            return
+        x0, y0, x1, y1 = bbox
+        edges = (-x0, -y0, x1 - self.map_width_cells, y1 - self.map_height_cells)
+        if not any(edges):
+            self.ui.statusInfo.setText("✅ Nothing to crop: known cells already reach the margin")
+            return
+        self.resizeCanvas(*edges, label="Crop to Known Area")
+
+    def showCanvasDialog(self):
+        self._ensureMapLoaded()
+        dialog = CanvasDialog(self.map_width_cells, self.map_height_cells, self.resolution,
+                              known_bbox(self.class_lut[self.map_data]), self.crop_margin, self)
+        if dialog.exec_() == QtWidgets.QDialog.Accepted:
+            self.crop_margin = dialog.marginSpin.value()
+            self.resizeCanvas(*dialog.edges())
+
+    def showResampleDialog(self):
+        resolution, ok = QtWidgets.QInputDialog.getDouble(
+            self, "Change resolution",
+            f"New resolution in m/cell (currently {self.resolution:g}).\n"
+            f"Larger values downsample (any occupied cell wins), smaller values upsample.",
+            self.resolution * 2, 1e-4, 100.0, 4)
+        if ok:
+            self.resampleMap(resolution)
+
+    def resampleMap(self, resolution):
+        """Resample the map to a new cell size, keeping the origin and world coordinates."""
+        if resolution <= 0 or abs(resolution - self.resolution) < 1e-12:
+            self.ui.statusInfo.setText("⚠️ Choose a resolution different from the current one")
+            return
+        self._ensureMapLoaded()
+        factor = resolution / self.resolution
+        old = (self.map_width_cells, self.map_height_cells, self.resolution)
+        QtWidgets.QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            src_shape = self.map_data.shape
+            data = resample_map(self.map_data, self.class_lut, factor, self.paint_values)
+            self._commitGeometry(
+                "Change Resolution", data, resolution=resolution,
+                point_fn=lambda x, y: resample_point(x, y, factor, src_shape, data.shape),
+                line_scale=1.0 / factor)
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        print(f"Resampled {old[0]}x{old[1]} @ {old[2]:g} m -> "
+              f"{self.map_width_cells}x{self.map_height_cells} @ {resolution:g} m")
+        self.ui.statusInfo.setText(f"📏 Resolution {old[2]:g} → {resolution:g} m/cell: {old[0]}x{old[1]} → "
+                                   f"{self.map_width_cells}x{self.map_height_cells} cells")
+
+    def _mapToWorld(self, x, y):
+        """World (x, y) in meters of a continuous cell position (row 0 at the top)."""
+        mx = x * self.resolution
+        my = (self.map_height_cells - y) * self.resolution
+        c, s = math.cos(self.origin_yaw), math.sin(self.origin_yaw)
+        return self.origin_x + mx * c - my * s, self.origin_y + mx * s + my * c
+
+    # --- Geometry changes (rotate, crop, resample) ---
+    def _geometrySnapshot(self):
+        return {
+            'data': self.map_data,
+            'resolution': self.resolution,
+            'origin': (self.origin_x, self.origin_y, self.origin_yaw),
+            'state': self._captureState(),
+        }
+
+    def _transformState(self, state, point_fn, rotation=0.0, scale=1.0):
+        """Copy an annotation state with every cell position mapped through point_fn."""
+        def move(p):
+            return tuple(float(v) for v in point_fn(p[0], p[1]))
+        return {
+            'text': [dict(t, cell_pos=move(t['cell_pos']), rotation=t.get('rotation', 0) + rotation)
+                     for t in state.get('text', [])],
+            'dimensions': [dict(d, start_cell=move(d['start_cell']), end_cell=move(d['end_cell']))
+                           for d in state.get('dimensions', [])],
+            'selected_dimension_index': state.get('selected_dimension_index'),
+            'lines': [dict(l, start_cell=move(l['start_cell']), end_cell=move(l['end_cell']),
+                           thickness=max(1, int(round(l.get('thickness', 1) * scale))))
+                      for l in state.get('lines', [])],
+            'areas': [dict(a, points=[move(p) for p in a['points']]) for a in state.get('areas', [])],
+        }
+
+    def _commitGeometry(self, label, data, resolution=None, origin=None, point_fn=None, rotation=0.0,
+                        line_scale=1.0):
+        """Replace the map array (and placement) as one undoable step, moving annotations along."""
+        before = self._geometrySnapshot()
+        state = before['state']
+        if point_fn is not None:
+            state = self._transformState(state, point_fn, rotation, line_scale)
+        after = {
+            'data': data,
+            'resolution': self.resolution if resolution is None else resolution,
+            'origin': before['origin'] if origin is None else tuple(origin),
+            'state': state,
+        }
+        self._applyGeometry(after)
+        self.undo_stack.push(GeometryCommand(self, before, after, label))
+
+    def _applyGeometry(self, snap):
+        self.map_data = snap['data']
+        self.resolution = snap['resolution']
+        self.origin_x, self.origin_y, self.origin_yaw = snap['origin']
+        self.map_height_cells, self.map_width_cells = self.map_data.shape
+        self._resetGeometry()
+        self.ui.width_lbl.setText(f"{self.map_width_cells} pixels")
+        self.ui.height_lbl.setText(f"{self.map_height_cells} pixels")
+        self.draw_map()
+        self._restoreState(snap['state'])
+        self.scrollChanged(0)
+
+    def _resetGeometry(self):
+        """Rebuild per-tile bookkeeping after the map array was replaced wholesale."""
+        tiles_y = (self.map_height_cells + TILE_SIZE - 1) // TILE_SIZE
+        tiles_x = (self.map_width_cells + TILE_SIZE - 1) // TILE_SIZE
+        self.tile_versions = np.zeros((tiles_y, tiles_x), dtype=np.int64)
+        # map_version keeps counting so caches keyed on it cannot match the old map
+        self.map_version += 1
+        self.tiles_loaded = np.ones((tiles_y, tiles_x), dtype=bool)
+        if getattr(self, '_lazy_timer', None) is not None:
+            self._lazy_timer.stop()
+            self._lazy_timer = None
+        # Nothing on disk matches the new array any more: save and autosave in full
+        self.map_store = None
+        self.output_store = None
+        self.output_store_versions = None
+        self._autosave_versions = None
+        self._autosave_base = None
+        self._speckle_labels = None
+        self._region_labels = {}
+        self._reach_start = None
+        self.clearPath()
+        if self._path_job is not None:
+            self._path_job.wait()
+        self._path_grid.clear()
+        self._path_field.clear()
+        self._snap_index.clear()
+        self._clearance.clear()
+        self._distance_dirty = set()
+        if getattr(self, 'speckle_dialog', None) is not None:
+            self.speckle_dialog.close()
+        if getattr(self, 'clearance_dialog', None) is not None:
+            self.clearance_dialog.close()
+        if getattr(self, 'inflation_dialog', None) is not None:
+            self.inflation_dialog.close()
+        if getattr(self, 'reachability_dialog', None) is not None:
+            self.reachability_dialog.close()
+        if getattr(self, 'straighten_dialog', None) is not None:
+            self.straighten_dialog.close()
+        if getattr(self, 'wall_vector_dialog', None) is not None:
+            self.wall_vector_dialog.close()
+        self._wall_contours = None
+        # Overlays were computed for the old array (a morphology preview recomputes itself)
+        for name in list(self.overlay_sources):
+            self._removeOverlay(name)
+        # The reference map is georeferenced, so it can be aligned to the new grid
+        if (getattr(self, 'compare_dialog', None) is not None and self.compare_dialog.isVisible()
+                and self._diff_source is not None):
+            self._alignReference()
+        if getattr(self, 'autosaver', None) is not None:
+            self.autosaver.note_edit()
+
     def updateMeasurePreview(self, end_pos):
         """Update the temporary measurement line as mouse moves"""
         if self.temp_measure_line:
@@ -1440,6 +2167,134 @@ class MapEditor(QtWidgets.QMainWindow):
         self.drawing_line = False
         self.line_start_point = None
 
+    def updateAreaPreview(self, cursor_pos=None):
+        """Redraw the open polygon being placed, closing it through the cursor."""
+        if self.temp_area:
+            try:
+                self.scene.removeItem(self.temp_area)
+            except Exception:
+                pass
+            self.temp_area = None
+        if not self.area_points:
+            return
+        points = list(self.area_points)
+        if cursor_pos is not None:
+            points.append(cursor_pos)
+        pen = QPen(Qt.cyan)
+        pen.setWidth(2)
+        pen.setStyle(Qt.DashLine)
+        pen.setCosmetic(True)
+        self.temp_area = self.scene.addPolygon(QtGui.QPolygonF(points), pen,
+                                               QBrush(QtGui.QColor(0, 255, 255, 40)))
+        self.temp_area.setZValue(900)
+        if len(points) >= 3:
+            cells = [(p.x() / self.pixels_per_cell, p.y() / self.pixels_per_cell) for p in points]
+            self.ui.statusInfo.setText(f"🔷 {polygon_area(cells) * self.resolution ** 2:.2f} m² "
+                                       f"(Enter or right-click to close, ESC to cancel)")
+
+    def cancelAreaPolygon(self):
+        """Drop the polygon being placed."""
+        self.area_points = []
+        if getattr(self, 'temp_area', None):
+            try:
+                self.scene.removeItem(self.temp_area)
+            except Exception:
+                pass
+            self.temp_area = None
+
+    def finishAreaPolygon(self):
+        """Close the polygon being placed and store it as an area annotation (undoable)."""
+        cells = [(p.x() / self.pixels_per_cell, p.y() / self.pixels_per_cell) for p in self.area_points]
+        self.cancelAreaPolygon()
+        if len(cells) < 3:
+            self.ui.statusInfo.setText("🔷 An area needs at least three corners")
+            return
+        self._pushSnapshotAction("Add Area", lambda: self.createArea(cells, 'polygon'))
+
+    def _freeRegionTable(self, connectivity=4):
+        """Return (labels, areas) of the connected free regions (cached per map version and connectivity)."""
+        self._ensureMapLoaded()
+        key = (self.map_version, self.class_lut.tobytes())
+        cached = self._region_labels.get(connectivity)
+        if cached is None or cached[0] != key:
+            labels, areas = component_areas(self.class_lut[self.map_data] == FREE, connectivity)
+            cached = (key, labels, areas)
+            self._region_labels[connectivity] = cached
+        return cached[1], cached[2]
+
+    def addRegionArea(self, px, py):
+        """Measure the connected free region around cell (px, py) and store it as an area annotation."""
+        x, y = int(math.floor(px)), int(math.floor(py))
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells):
+            return
+        try:
+            labels, areas = self._freeRegionTable()
+        except Exception as e:
+            print('Error labelling free regions:', e)
+            self.ui.statusInfo.setText(f"❌ Region area failed: {e}")
+            return
+        label = labels[y, x]
+        if label == 0:
+            self.ui.statusInfo.setText("🔷 Click inside free space to measure a region")
+            return
+        area_m2 = float(areas[label]) * self.resolution ** 2
+        seed = (x + 0.5, y + 0.5)
+        self._pushSnapshotAction("Add Region Area", lambda: self.createArea([seed], 'region', area_m2))
+
+    def createArea(self, points, kind='polygon', area_m2=None, from_restore=False):
+        """Create an area annotation: a filled polygon, or a marker for a measured free region.
+
+        `points` are cell coordinates (the polygon corners, or the region seed).
+        Polygon areas are recomputed from the corners; region areas are given.
+        """
+        if not hasattr(self, 'scene') or self.scene is None:
+            return None
+        try:
+            ppc = self.pixels_per_cell
+            color = QtGui.QColor(0, 140, 255)
+            pen = QPen(color)
+            pen.setWidth(2)
+            pen.setCosmetic(True)
+            if kind == 'region':
+                sx, sy = points[0][0] * ppc, points[0][1] * ppc
+                item = self.scene.addEllipse(sx - 6, sy - 6, 12, 12, pen, QBrush(color))
+                anchor = QtCore.QPointF(sx + 10, sy - 10)
+                text = f"Region {area_m2:.2f} m²"
+            else:
+                area_m2 = polygon_area(points) * self.resolution ** 2
+                item = self.scene.addPolygon(QtGui.QPolygonF([QtCore.QPointF(x * ppc, y * ppc) for x, y in points]),
+                                             pen, QBrush(QtGui.QColor(0, 140, 255, 50)))
+                cx, cy = polygon_centroid(points)
+                anchor = QtCore.QPointF(cx * ppc, cy * ppc)
+                text = f"{area_m2:.2f} m²"
+            item.setZValue(860)
+            item.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
+            label = QtWidgets.QGraphicsSimpleTextItem(text, item)
+            font = label.font()
+            font.setPointSize(10)
+            font.setBold(True)
+            label.setFont(font)
+            label.setBrush(QBrush(QtGui.QColor(0, 70, 160)))
+            rect = label.boundingRect()
+            if kind == 'region':
+                label.setPos(anchor.x(), anchor.y() - rect.height() / 2)
+            else:
+                label.setPos(anchor.x() - rect.width() / 2, anchor.y() - rect.height() / 2)
+            entry = {
+                'item': item,
+                'kind': kind,
+                'points': [tuple(float(v) for v in p) for p in points],
+                'area_m2': float(area_m2),
+            }
+            self.areas.append(entry)
+            if not from_restore:
+                print(f"Area added: {text}")
+                self.ui.statusInfo.setText(f"🔷 Area: {text}")
+            return item
+        except Exception as e:
+            print('Error creating area:', e)
+            return None
+
     def clearDimensions(self):
         """Clear all dimension annotations"""
         for dim in self.dimensions:
@@ -1709,8 +2564,38 @@ class MapEditor(QtWidgets.QMainWindow):
             except Exception:
                 continue
 
+    def _captureAreas(self):
+        """Capture area annotations (deleted items are dropped)."""
+        data = []
+        valid = []
+        for entry in list(getattr(self, 'areas', [])):
+            item = entry.get('item')
+            if item is None or item.scene() is None:
+                continue
+            data.append({'kind': entry['kind'], 'points': list(entry['points']), 'area_m2': entry['area_m2']})
+            valid.append(entry)
+        self.areas = valid
+        return data
+
+    def _restoreAreas(self, areas_data):
+        """Restore area annotations from captured data."""
+        for entry in list(getattr(self, 'areas', [])):
+            try:
+                item = entry.get('item')
+                if item is not None and item.scene() is self.scene:
+                    self.scene.removeItem(item)
+            except Exception:
+                pass
+        self.areas = []
+        for entry in areas_data or []:
+            try:
+                self.createArea([tuple(p) for p in entry['points']], entry.get('kind', 'polygon'),
+                                entry.get('area_m2'), from_restore=True)
+            except Exception:
+                continue
+
     def _captureState(self):
-        """Capture current text, dimensions, and lines for undo/redo/restores."""
+        """Capture current text, dimensions, lines, and areas for undo/redo/restores."""
         scale = getattr(self, 'pixels_per_cell', 1) or 1
         text_data = self._captureTextAnnotations(scale)
         dims_data, selected_idx = self._captureDimensions(scale)
@@ -1720,6 +2605,7 @@ class MapEditor(QtWidgets.QMainWindow):
             'dimensions': dims_data,
             'selected_dimension_index': selected_idx,
             'lines': lines_data,
+            'areas': self._captureAreas(),
         }
 
     def _restoreState(self, state):
@@ -1768,6 +2654,7 @@ class MapEditor(QtWidgets.QMainWindow):
         self._restoreDimensions(dims, sel_idx)
         self._restoreTextAnnotations(state.get('text', []))
         self._restoreLines(state.get('lines', []))
+        self._restoreAreas(state.get('areas', []))
 
     def _stateChanged(self, a, b):
         try:
@@ -1907,9 +2794,9 @@ class MapEditor(QtWidgets.QMainWindow):
         #
         # Resolution order:
         # 1. Exactly `fn` (path as given)
-        # 2. `fn + '.pgm'` (same dir)
+        # 2. `fn` + each known map suffix (.pgm, .pgm.gz, .png) (same dir)
         # 3. `maps/fn` (maps directory)
-        # 4. `maps/fn + '.pgm'`
+        # 4. `maps/fn` + each known map suffix
         #
         # Create maps dir path relative to repository root (parent of src)
         repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -1922,53 +2809,47 @@ class MapEditor(QtWidgets.QMainWindow):
             pass
 
         tried_paths = []
+        decode_errors = []
 
         def try_open(path):
             tried_paths.append(path)
             try:
-                im = Image.open(path)
-                return im, path
-            except Exception:
+                if is_store(path):
+                    # Native tiled map: tiles are decoded lazily as they are needed
+                    store = MapStore.open(path)
+                    data = np.full((store.height, store.width), 205, dtype=np.uint8)
+                    return (data, {'format': 'rmap', 'store': store}), path
+                if not os.path.isfile(path):
+                    return None, None
+                data, info = read_map(path, self.depth_mapping)
+                return (data, info), path
+            except MapFormatError as e:
+                decode_errors.append(e)
                 return None, None
 
-        # 1) try as provided
-        im, used = try_open(fn)
+        candidates = [fn] + [fn + suffix for suffix in MAP_SUFFIXES + (STORE_SUFFIX,)]
+        candidates += [os.path.join(maps_dir, c) for c in candidates]
+        loaded, used = None, None
+        for path in candidates:
+            loaded, used = try_open(path)
+            if loaded is not None:
+                break
 
-        # 2) try with .pgm extension next
-        if im is None:
-            fnpgm = fn + '.pgm'
-            im, used = try_open(fnpgm)
-
-        # 3) try in maps/ directory
-        if im is None:
-            maps_path = os.path.join(maps_dir, fn)
-            im, used = try_open(maps_path)
-
-        # 4) try maps/<name>.pgm
-        if im is None:
-            maps_path_pgm = os.path.join(maps_dir, fn + '.pgm')
-            im, used = try_open(maps_path_pgm)
-
-        if im is None:
+        if loaded is None:
             print("Tried the following paths:")
             for p in tried_paths:
                 print("  ", p)
+            for e in decode_errors:
+                print("ERROR: ", e)
             print("ERROR:  Cannot open file", fn)
             sys.exit(1)
 
-        self.im = im
+        self.map_data, self.map_info = loaded
         self.fn = used
 
-        if self.im.format != 'PPM':
-            print("ERROR:  This is not a PGM formatted file.")
-            sys.exit(1)
-
-        if self.im.mode != 'L':
-            print("ERROR:  This PGM file is not of mode L.")
-            sys.exit(1)   
-
-        self.map_width_cells = self.im.size[0]
-        self.map_height_cells = self.im.size[1]
+        self.map_height_cells, self.map_width_cells = self.map_data.shape
+        self.map_store = self.map_info.pop('store', None)
+        self._initTileTracking()
 
         self.ui.filename_lbl.setText(os.path.basename(self.fn)) 
         self.ui.width_lbl.setText(f"{self.map_width_cells} pixels")
@@ -1986,14 +2867,14 @@ class MapEditor(QtWidgets.QMainWindow):
 
         # 1) same directory as the image we actually opened
         try:
-            base_used = os.path.splitext(self.fn)[0]
+            base_used = os.path.join(os.path.dirname(self.fn), map_basename(self.fn))
             candidates.append(base_used + '.yaml')
         except Exception:
             pass
 
         # 2) if the user passed a simple name like 'floor', try that next
         try:
-            candidates.append(os.path.splitext(fn)[0] + '.yaml')
+            candidates.append(os.path.join(os.path.dirname(fn), map_basename(fn)) + '.yaml')
         except Exception:
             pass
 
@@ -2001,12 +2882,21 @@ class MapEditor(QtWidgets.QMainWindow):
         try:
             repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
             maps_dir = os.path.join(repo_root, 'maps')
-            candidates.append(os.path.join(maps_dir, os.path.splitext(fn)[0] + '.yaml'))
+            candidates.append(os.path.join(maps_dir, map_basename(fn) + '.yaml'))
         except Exception:
             pass
 
         yaml_found = False
         yaml_error = None
+        if self.map_store is not None:
+            # Native maps carry their YAML metadata in the store index
+            try:
+                self._applyMapMetadata(self.map_store.metadata)
+                yaml_found = True
+                self.yaml_path = None
+                candidates = []
+            except Exception as e:
+                yaml_error = e
         for fn_yaml in candidates:
             if not fn_yaml:
                 continue
@@ -2014,12 +2904,7 @@ class MapEditor(QtWidgets.QMainWindow):
                 with open(fn_yaml, 'r') as stream:
                     docs = yaml.load_all(stream, Loader=yaml.FullLoader)
                     for doc in docs:
-                        # Validate expected keys
-                        self.occupied_thresh = doc['occupied_thresh']  # probability its occupied
-                        self.free_thresh = doc['free_thresh']  # probability its uncertain or occupied
-                        self.resolution = doc['resolution']    # in meters per cell
-                        self.origin_x = doc['origin'][0]
-                        self.origin_y = doc['origin'][1]
+                        self._applyMapMetadata(doc)
                     yaml_found = True
                     self.yaml_path = fn_yaml
                     break
@@ -2035,6 +2920,218 @@ class MapEditor(QtWidgets.QMainWindow):
                 print("ERROR:  Corresponding YAML file is missing or incorrectly formatted.")
             sys.exit(1)
 
+        self._buildLuts()
+        self._syncThresholdControls()
+
+    def _buildLuts(self):
+        """Rebuild the 256-entry value tables from the thresholds, mode and negate.
+
+        Everything that interprets cell values (rendering, classification for
+        the cleanup tools, paint values) goes through these tables, so each
+        is one vectorized lookup whatever the map's mode.
+        """
+        args = (self.occupied_thresh, self.free_thresh, self.map_mode, self.map_negate)
+        self.occupancy_lut = occupancy_lut(*args)
+        self.class_lut = class_lut(*args)
+        self.paint_values = paint_values(self.class_lut, self.map_mode, self.map_negate)
+        if self.map_mode == 'trinary':
+            self.color_table = [QtGui.QColor(CLASS_COLORS[c]).rgb() for c in self.class_lut]
+        else:
+            # Scale/raw maps show the occupancy gradient (free white .. occupied black)
+            unknown = GRADIENT_UNKNOWN.rgb()
+            self.color_table = [unknown if occ < 0 else QtGui.qRgb(*(3 * (255 - (int(occ) * 255 + 50) // 100,)))
+                                for occ in self.occupancy_lut]
+
+    def _applyMapMetadata(self, doc):
+        """Take resolution, origin and thresholds from a map YAML document."""
+        # Validate expected keys
+        self.occupied_thresh = doc['occupied_thresh']  # probability its occupied
+        self.free_thresh = doc['free_thresh']  # probability its uncertain or occupied
+        self.resolution = doc['resolution']    # in meters per cell
+        # How pixel values map to occupancy (map_server semantics)
+        self.map_mode = doc.get('mode', 'trinary')
+        if self.map_mode not in MAP_MODES:
+            print(f"WARNING: unknown map mode '{self.map_mode}', using trinary")
+            self.map_mode = 'trinary'
+        self.map_negate = 1 if doc.get('negate', 0) else 0
+        self.origin_x = doc['origin'][0]
+        self.origin_y = doc['origin'][1]
+        self.origin_yaw = doc['origin'][2] if len(doc['origin']) > 2 else 0.0
+        # Keep the whole document so keys we do not edit survive a save
+        self.map_yaml = dict(doc)
+
+    def _mapMetadata(self):
+        """Return the map YAML document reflecting the current editor state."""
+        meta = dict(getattr(self, 'map_yaml', {}))
+        meta.pop('image', None)
+        meta['resolution'] = self.resolution
+        meta['origin'] = [self.origin_x, self.origin_y, self.origin_yaw]
+        meta['occupied_thresh'] = self.occupied_thresh
+        meta['free_thresh'] = self.free_thresh
+        meta['mode'] = self.map_mode
+        meta['negate'] = self.map_negate
+        return meta
+
+    # --- Tile bookkeeping for the map model ---
+    def _initTileTracking(self):
+        """Reset per-tile version counters after a map is loaded."""
+        tiles_y = (self.map_height_cells + TILE_SIZE - 1) // TILE_SIZE
+        tiles_x = (self.map_width_cells + TILE_SIZE - 1) // TILE_SIZE
+        # Every edit bumps the version of the tiles it touches; consumers that
+        # cache per-tile results remember the versions they last saw.
+        self.tile_versions = np.zeros((tiles_y, tiles_x), dtype=np.int64)
+        self.map_version = 0
+        # Tiles of a native store are decoded on demand
+        self.tiles_loaded = np.full((tiles_y, tiles_x), self.map_store is None, dtype=bool)
+        # Versions last written to the output store (None: never saved)
+        self.output_store = None
+        self.output_store_versions = None
+        # The autosave store holds tiles changed relative to the file we just
+        # opened, so a fresh load has nothing to autosave yet
+        self._autosave_base = os.path.abspath(self.fn)
+        self._autosave_versions = np.zeros_like(self.tile_versions)
+        self._autosave_annotations = None
+        self._autosave_metadata = None
+        # A store left by an earlier session is replaced, not appended to, by
+        # the first autosave (until then it can still be restored)
+        self._autosave_fresh = True
+        # Caches keyed on map_version must not outlive the map they were built for
+        self._annotated_cache = None
+        self._minimap_version = None
+        if getattr(self, '_snap_index', None) is not None:
+            self._snap_index.clear()
+        if getattr(self, '_clearance', None) is not None:
+            self._clearance.clear()
+            self._distance_dirty = set()
+        if getattr(self, '_lazy_timer', None) is not None:
+            self._lazy_timer.stop()
+            self._lazy_timer = None
+        if self.map_store is not None:
+            self._lazy_timer = QtCore.QTimer(self)
+            self._lazy_timer.timeout.connect(self._loadPendingTiles)
+            self._lazy_timer.start(0)
+
+    def _ensureTilesLoaded(self, x0, y0, x1, y1):
+        """Decode any not-yet-loaded store tiles covering cells [x0, x1) x [y0, y1)."""
+        if self.map_store is None or self.tiles_loaded.all():
+            return
+        tx0, ty0, tx1, ty1 = tile_range(x0, y0, x1, y1)
+        for ty in range(ty0, min(ty1 + 1, self.tiles_loaded.shape[0])):
+            for tx in range(tx0, min(tx1 + 1, self.tiles_loaded.shape[1])):
+                if not self.tiles_loaded[ty, tx]:
+                    bx0, by0, bx1, by1 = self.map_store.tile_bounds(ty, tx)
+                    self.map_data[by0:by1, bx0:bx1] = self.map_store.read_tile(ty, tx)
+                    self.tiles_loaded[ty, tx] = True
+
+    def _ensureMapLoaded(self):
+        """Make sure every tile is decoded before a whole-map operation."""
+        self._ensureTilesLoaded(0, 0, self.map_width_cells, self.map_height_cells)
+
+    def _loadPendingTiles(self):
+        """Decode a few remaining store tiles per timer tick while the UI is idle."""
+        pending = np.argwhere(~self.tiles_loaded)
+        if len(pending) == 0:
+            self._lazy_timer.stop()
+            return
+        loaded = []
+        for ty, tx in pending[:8]:
+            ty, tx = int(ty), int(tx)
+            x0, y0, x1, y1 = self.map_store.tile_bounds(ty, tx)
+            self._ensureTilesLoaded(x0, y0, x1, y1)
+            loaded.append((ty, tx))
+        self.map_version += 1
+        if getattr(self, 'map_layer', None) is not None:
+            self.map_layer.invalidate(loaded)
+
+    def _mapChanged(self, x0, y0, x1, y1):
+        """Record an edit of cells [x0, x1) x [y0, y1) and redraw the touched tiles."""
+        x0, y0 = max(0, x0), max(0, y0)
+        x1, y1 = min(self.map_width_cells, x1), min(self.map_height_cells, y1)
+        if x0 >= x1 or y0 >= y1:
+            return
+        tx0, ty0, tx1, ty1 = tile_range(x0, y0, x1, y1)
+        self._tilesChanged([(ty, tx) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)])
+
+    def _tilesChanged(self, tiles):
+        """Record one edit touching the given (ty, tx) tiles and redraw them."""
+        if not tiles:
+            return
+        for ty, tx in tiles:
+            self.tile_versions[ty, tx] += 1
+        self.map_version += 1
+        if getattr(self, 'autosaver', None) is not None:
+            self.autosaver.note_edit()
+        if getattr(self, 'map_layer', None) is not None:
+            self.map_layer.invalidate(tiles)
+        if self._morph_steps:
+            self._morph_timer.start()
+        if any(name in self.overlay_sources for name in DISTANCE_OVERLAYS):
+            self._distance_dirty.update(tiles)
+            self._distance_timer.start()
+        if 'reachability' in self.overlay_sources:
+            # Relabeling is a whole-map pass; wait for the stroke to settle
+            self._reach_timer.start()
+        if 'straighten' in self.overlay_sources:
+            self._straighten_timer.start()
+        if 'diff' in self.overlay_sources:
+            self._invalidateOverlay('diff', tiles)
+            self._diff_timer.start()
+        if self.path_start is not None:
+            self._path_timer.start()
+        if self._wall_vectors is not None:
+            self._wall_timer.start()
+
+    def _mapTileImage(self, x0, y0, x1, y1):
+        """Tile source for the map layer."""
+        self._ensureTilesLoaded(x0, y0, x1, y1)
+        return indexed_image(self.map_data[y0:y1, x0:x1], self.color_table)
+
+    def _visibleCellRect(self):
+        """Return the (x0, y0, x1, y1) cell rectangle currently shown in the view."""
+        view = self.ui.graphicsView
+        rect = view.mapToScene(view.viewport().rect()).boundingRect()
+        ppc = self.pixels_per_cell or 1
+        x0 = max(0, int(math.floor(rect.left() / ppc)))
+        y0 = max(0, int(math.floor(rect.top() / ppc)))
+        x1 = min(self.map_width_cells, int(math.ceil(rect.right() / ppc)) + 1)
+        y1 = min(self.map_height_cells, int(math.ceil(rect.bottom() / ppc)) + 1)
+        return x0, y0, x1, y1
+
+    def _updateVisibleTiles(self):
+        if getattr(self, 'map_layer', None) is None:
+            return
+        rect = self._visibleCellRect()
+        self.map_layer.update_visible(*rect)
+        for layer in self.overlay_layers.values():
+            layer.update_visible(*rect)
+        if self._morph_steps:
+            self._morph_timer.start()
+
+    def _setOverlay(self, name, tile_source, z=1):
+        """Show (or replace) a tiled overlay above the map; `tile_source` as for TiledLayer."""
+        self.overlay_sources[name] = (tile_source, z)
+        old = self.overlay_layers.pop(name, None)
+        if old is not None:
+            old.clear()
+        if getattr(self, 'scene', None) is None:
+            return
+        layer = TiledLayer(self.scene, self.map_width_cells, self.map_height_cells, tile_source, z=z)
+        layer.set_scale(self.pixels_per_cell)
+        self.overlay_layers[name] = layer
+        if getattr(self, 'map_layer', None) is not None:
+            layer.update_visible(*self._visibleCellRect())
+
+    def _invalidateOverlay(self, name, tiles=None):
+        layer = self.overlay_layers.get(name)
+        if layer is not None:
+            layer.invalidate(tiles)
+
+    def _removeOverlay(self, name):
+        self.overlay_sources.pop(name, None)
+        layer = self.overlay_layers.pop(name, None)
+        if layer is not None:
+            layer.clear()
+
 
     def mapClick(self, event):
         # Ensure the viewport has focus on click so that subsequent key
@@ -2043,6 +3140,16 @@ class MapEditor(QtWidgets.QMainWindow):
             self.ui.graphicsView.viewport().setFocus()
         except Exception:
             pass
+        # A pending pick consumes the click, whatever the tool
+        if self._map_pick is not None:
+            callback, self._map_pick = self._map_pick, None
+            self.ui.graphicsView.viewport().unsetCursor()
+            if event.button() == QtCore.Qt.LeftButton:
+                pos = event.scenePos()
+                callback(pos.x() / self.pixels_per_cell, pos.y() / self.pixels_per_cell)
+            else:
+                self.ui.statusInfo.setText("Pick cancelled")
+            return
         # Selection tool: let the scene handle selection/dragging
         if self.tool_mode == 'select':
             try:
@@ -2091,6 +3198,7 @@ class MapEditor(QtWidgets.QMainWindow):
                 return
 
             # Otherwise handle measurement creation
+            scene_pos = self._snapScenePos(scene_pos, event.modifiers())
             if not self.measuring:
                 # First click - start measurement
                 self.measuring = True
@@ -2117,7 +3225,7 @@ class MapEditor(QtWidgets.QMainWindow):
             return
 
         if self.tool_mode == 'line':
-            scene_pos = event.scenePos()
+            scene_pos = self._snapScenePos(event.scenePos(), event.modifiers())
             if not self.drawing_line:
                 # First click - start line drawing
                 self.drawing_line = True
@@ -2144,6 +3252,53 @@ class MapEditor(QtWidgets.QMainWindow):
                 self.ui.statusInfo.setText("➖ Line Mode: Click two points")
             return
         
+        if self.tool_mode == 'area':
+            if self.area_mode == 'region':
+                if event.button() == QtCore.Qt.LeftButton:
+                    pos = event.scenePos()
+                    self.addRegionArea(pos.x() / self.pixels_per_cell, pos.y() / self.pixels_per_cell)
+                return
+            if event.button() != QtCore.Qt.LeftButton:
+                # Right click closes the polygon
+                if len(self.area_points) >= 3:
+                    self.finishAreaPolygon()
+                else:
+                    self.cancelAreaPolygon()
+                    self.ui.statusInfo.setText("🔷 Area cancelled - Click to start")
+                return
+            scene_pos = self._snapScenePos(event.scenePos(), event.modifiers())
+            first = self.area_points[0] if self.area_points else None
+            if first is not None and len(self.area_points) >= 3 and \
+                    math.hypot(scene_pos.x() - first.x(), scene_pos.y() - first.y()) <= 8:
+                # Clicking the first corner closes the polygon
+                self.finishAreaPolygon()
+                return
+            self.area_points.append(QtCore.QPointF(scene_pos))
+            self.updateAreaPreview()
+            if len(self.area_points) < 3:
+                self.ui.statusInfo.setText("🔷 Click the next corner (ESC to cancel)")
+            return
+
+        if self.tool_mode == 'path':
+            pos = event.scenePos()
+            x, y = pos.x() / self.pixels_per_cell, pos.y() / self.pixels_per_cell
+            if event.button() != QtCore.Qt.LeftButton:
+                # Right click starts over
+                self.clearPath()
+                self.ui.statusInfo.setText("🧭 Path cleared - Click a start point")
+            elif self.path_start is None:
+                self.setPathStart(x, y)
+            else:
+                self.setPathGoal(x, y)
+            return
+
+        if self.tool_mode == 'fill':
+            if event.button() == QtCore.Qt.LeftButton:
+                x = math.floor(event.scenePos().x() / self.pixels_per_cell)
+                y = math.floor(event.scenePos().y() / self.pixels_per_cell)
+                self.fillAt(x, y)
+            return
+
         # Paint tool mode
         # get current model value
         x = math.floor(event.scenePos().x() / self.pixels_per_cell)
@@ -2155,54 +3310,22 @@ class MapEditor(QtWidgets.QMainWindow):
             self.paint_area(x, y, self.cursor_size)
         else:
             # Original alternate behavior for single click
-            val = self.im.getpixel((x,y))
+            if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells):
+                return
+            self._ensureTilesLoaded(x, y, x + 1, y + 1)
             # determine next value in sequence white->black->gray
-            if val <= (255.0 * (1.0 - self.occupied_thresh)):  # if black, become gray
-                val = 200
-            elif val <= (255.0 * (1.0 - self.free_thresh)):  # else if gray, become white
-                val = 255
-            else:  # else its white, become black
-                val = 0    
+            val = self.paint_values[ALTERNATE_NEXT[self.class_lut[self.map_data[y, x]]]]
 
             # update model with new value
-            self.im.putpixel((x,y), val)    
+            self.map_data[y, x] = val
 
             # redraw cell in new color
-            color = self.value2color(val)
-            self.color_cell(x, y, color)
+            self._mapChanged(x, y, x + 1, y + 1)
 
 
     def value2color(self, val):
-        if val > (255.0 * (1.0 - self.free_thresh)):
-            return Qt.white
-        elif val > (255.0 * (1.0 - self.occupied_thresh)):
-            return Qt.gray
-        else:
-            return Qt.black
+        return QtGui.QColor(self.color_table[val])
 
-    def color_cell(self, x, y, color):
-        pen = QPen(color)
-        pen.setWidth(1)
-        if self.pixels_per_cell > 10:
-            pen = QPen(Qt.lightGray)
-        brush = QBrush(color)
-        #x = x * self.pixels_per_cell
-        #y = y * self.pixels_per_cell
-  
-        qrect = self.grids[x][y]
-        qrect.setBrush(brush)
-        qrect.setPen(pen)
-
-        
-    def add_cell(self, x, y, color):
-        pen = QPen(color)
-        pen.setWidth(1)
-        if self.pixels_per_cell > 10:
-            pen = QPen(Qt.lightGray)
-        brush = QBrush(color)
-        x = x * self.pixels_per_cell
-        y = y * self.pixels_per_cell
-        return self.scene.addRect(x, y, self.pixels_per_cell, self.pixels_per_cell, pen, brush)
     def draw_map(self, previous_pixels_per_cell=None):        
         prev_scale = previous_pixels_per_cell if previous_pixels_per_cell else getattr(self, 'pixels_per_cell', 1)
         if prev_scale <= 0:
@@ -2212,6 +3335,7 @@ class MapEditor(QtWidgets.QMainWindow):
         preserved_dims, selected_dim_index = self._captureDimensions(prev_scale)
         # Preserve drawn lines across scene rebuild
         preserved_lines = self._captureLines(prev_scale)
+        preserved_areas = self._captureAreas()
 
         # Drop any lingering overlay tied to the old scene
         if hasattr(self, 'current_text_overlay') and self.current_text_overlay:
@@ -2229,49 +3353,1202 @@ class MapEditor(QtWidgets.QMainWindow):
         except Exception:
             pass
         self.scene.mousePressEvent = self.mapClick
-        self.grids = []
-
-        # draw the cells
-        for x in range(0,self.map_width_cells):
-            grid_col = []
-            for y in range(0, self.map_height_cells):
-                val = self.im.getpixel((x,y))
-                color = self.value2color(val)
-                qrect = self.add_cell(x,y,color)
-                grid_col.append(qrect)
-            self.grids.append(grid_col)
+
+        # draw the cells as lazily rendered image tiles
+        pixel_width = self.map_width_cells * self.pixels_per_cell
+        pixel_height = self.map_height_cells * self.pixels_per_cell
+        self.scene.setSceneRect(0, 0, pixel_width, pixel_height)
+        self.map_layer = TiledLayer(self.scene, self.map_width_cells, self.map_height_cells,
+                                    self._mapTileImage, z=0)
+        self.map_layer.set_scale(self.pixels_per_cell)
+        # Overlays (previews, analysis results) are rebuilt on the new scene
+        self.overlay_layers = {}
+        for name, (source, z) in list(self.overlay_sources.items()):
+            self._setOverlay(name, source, z)
+        self._updateVisibleTiles()
 
         # draw the grid lines
         if self.pixels_per_cell > 10:
             pen = QPen(Qt.lightGray)
             pen.setWidth(1)
-            pixel_width = self.map_width_cells * self.pixels_per_cell
-            pixel_height = self.map_height_cells * self.pixels_per_cell
-            for x in range(0, pixel_width, self.pixels_per_cell):
-                self.scene.addLine(x, 0, x, pixel_height, pen)
-            for y in range(0, pixel_height, self.pixels_per_cell):
-                self.scene.addLine(0, y, pixel_width, y, pen)
+            for x in range(0, self.map_width_cells + 1):
+                self.scene.addLine(x * self.pixels_per_cell, 0, x * self.pixels_per_cell, pixel_height, pen)
+            for y in range(0, self.map_height_cells + 1):
+                self.scene.addLine(0, y * self.pixels_per_cell, pixel_width, y * self.pixels_per_cell, pen)
 
         # Restore dimensions, lines, and text annotations after rebuilding the grid
         self.dimensions = []
         self.selected_dimension = None
         self._restoreDimensions(preserved_dims, selected_dim_index)
         self._restoreLines(preserved_lines)
+        # The old area items went away with the old scene
+        self.areas = []
+        self._restoreAreas(preserved_areas)
         self._restoreTextAnnotations(preserved_text)
+        # The path items went away with the old scene
+        self._path_items = []
+        self._drawPath(self._path_cells)
+        self._wall_item = None
+        self._drawWalls()
 
         # Recreate cursor indicator after redrawing scene if it previously existed
         recreate_cursor = bool(self.cursor_indicator)
         if recreate_cursor:
             self.cursor_indicator = None
             self.createCursorIndicator()
+
+    # --- Classification thresholds ---
+    def _syncThresholdControls(self):
+        try:
+            for w, v in ((self.ui.occupiedThreshSpin, self.occupied_thresh),
+                         (self.ui.freeThreshSpin, self.free_thresh)):
+                w.blockSignals(True)
+                w.setValue(v)
+                w.blockSignals(False)
+            for w, v in ((self.ui.occupiedThreshSlider, self.occupied_thresh),
+                         (self.ui.freeThreshSlider, self.free_thresh)):
+                w.blockSignals(True)
+                w.setValue(int(round(v * 100)))
+                w.blockSignals(False)
+        except Exception:
+            pass
+
+    def handleOccupiedThresh(self, value):
+        self.setThresholds(occupied_thresh=value)
+
+    def handleFreeThresh(self, value):
+        self.setThresholds(free_thresh=value)
+
+    def resetThresholds(self):
+        doc = getattr(self, 'map_yaml', {})
+        self.setThresholds(doc.get('occupied_thresh', 0.65), doc.get('free_thresh', 0.196))
+
+    def setThresholds(self, occupied_thresh=None, free_thresh=None):
+        """Re-classify the map with new thresholds; only the lookup tables and tile images change."""
+        occ = self.occupied_thresh if occupied_thresh is None else float(occupied_thresh)
+        free = self.free_thresh if free_thresh is None else float(free_thresh)
+        # Keep free < occupied so the three classes stay ordered
+        if free >= occ:
+            if occupied_thresh is None:
+                occ = min(1.0, free + 0.01)
+            else:
+                free = max(0.0, occ - 0.01)
+        self.occupied_thresh, self.free_thresh = occ, free
+        self._buildLuts()
+        self._syncThresholdControls()
+        if getattr(self, 'map_layer', None) is not None:
+            self.map_layer.invalidate()
+        self._minimap_version = None
+        self.scrollChanged(0)
+        if getattr(self, 'speckle_dialog', None) is not None and self.speckle_dialog.isVisible():
+            self.previewSpeckles(*self.speckle_dialog.params())
+        if getattr(self, 'straighten_dialog', None) is not None and self.straighten_dialog.isVisible():
+            self.previewStraighten(self.straighten_dialog.params())
+        if 'diff' in self.overlay_sources:
+            self._invalidateOverlay('diff')
+            self._updateDiffStats()
+        # The obstacle set changed everywhere; distance tiles recompute as they are redrawn
+        for name in DISTANCE_OVERLAYS:
+            self._invalidateOverlay(name)
+        self.analyzeReachability()
+        self._startPathSearch()
+        if getattr(self, 'autosaver', None) is not None:
+            self.autosaver.note_edit()
+        self.ui.statusInfo.setText(f"🎚️ Thresholds: occupied {occ:.3f}, free {free:.3f}")
+
+    # --- Clearance heatmap ---
+    def showClearanceDialog(self):
+        if getattr(self, 'clearance_dialog', None) is None:
+            self.clearance_dialog = ClearanceDialog(self)
+            self.clearance_dialog.previewChanged.connect(self.previewClearance)
+            self.clearance_dialog.closed.connect(lambda: self._removeOverlay('clearance'))
+        self.clearance_dialog.show()
+        self.clearance_dialog.raise_()
+
+    def _clearanceField(self, max_range):
+        """The distance field, grown if it does not reach `max_range` meters (capped at MAX_CLEARANCE cells)."""
+        needed = min(MAX_CLEARANCE, int(math.ceil(max_range / self.resolution)) + 1)
+        if needed > self._clearance.max_dist:
+            # Grow in steps so dragging a range control does not rebuild every tile each time
+            self._clearance = ClearanceField(min(MAX_CLEARANCE, max(needed, self._clearance.max_dist * 2)))
+        return self._clearance
+
+    def _distanceTile(self, field, x0, y0, x1, y1):
+        """Squared clearances of the tile with cell bounds (x0, y0, x1, y1)."""
+        halo = field.max_dist
+        self._ensureTilesLoaded(x0 - halo, y0 - halo, x1 + halo, y1 + halo)
+        return field.tile(self.map_data, self.class_lut, self.tile_versions, y0 // TILE_SIZE, x0 // TILE_SIZE)
+
+    def previewClearance(self, threshold, max_range):
+        """Show every free cell's distance to the nearest obstacle; cells below `threshold` m stand out."""
+        field = self._clearanceField(max(threshold, max_range))
+        levels = clearance_levels(field.max_dist, self.resolution, threshold, max_range)
+        # 0: hidden, 1: too narrow, 2..254: red (close) to blue (far), 255: beyond the range
+        table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgba(255, 0, 255, 220)]
+        for i in range(253):
+            color = QtGui.QColor.fromHsv(int(240 * i / 252), 255, 255)
+            table.append(QtGui.qRgba(color.red(), color.green(), color.blue(), 150))
+        table.append(QtGui.qRgba(0, 0, 0, 0))
+
+        def source(x0, y0, x1, y1):
+            cells = levels[self._distanceTile(field, x0, y0, x1, y1)]
+            cells[self.class_lut[self.map_data[y0:y1, x0:x1]] != FREE] = 0
+            if not cells.any():
+                return None
+            return indexed_image(cells, table)
+        # New colors only re-render the tiles on screen; the field itself stays cached
+        self._setOverlay('clearance', source, z=2)
+        capped = field.max_dist * self.resolution
+        note = f" Distances are capped at {capped:.2f} m." if capped < max(threshold, max_range) else ""
+        self.clearance_dialog.setSummary(f"Distance from each free cell to the nearest occupied cell, "
+                                         f"center to center.{note}")
+        self.ui.statusInfo.setText(f"📶 Clearance below {threshold:.2f} m is highlighted")
+
+    # --- Inflation cost preview ---
+    def showInflationDialog(self):
+        if getattr(self, 'inflation_dialog', None) is None:
+            self.inflation_dialog = InflationDialog(self)
+            self.inflation_dialog.previewChanged.connect(self.previewInflation)
+            self.inflation_dialog.closed.connect(lambda: self._removeOverlay('inflation'))
+        # Size the distance field for the whole radius range up front, so
+        # scrubbing the radius only swaps the cost lookup table
+        self._clearanceField(InflationDialog.MAX_RADIUS)
+        self.inflation_dialog.show()
+        self.inflation_dialog.raise_()
+
+    def previewInflation(self, inflation_radius, cost_scaling_factor, inscribed_radius):
+        """Show the nav2 inflation cost of every known cell for the given parameters."""
+        field = self._clearanceField(inflation_radius)
+        costs = inflation_cost_lut(field.max_dist, self.resolution, inflation_radius,
+                                   cost_scaling_factor, inscribed_radius)
+        # 0: not inflated, 1..252: blue (low) to red (high), then inscribed and lethal
+        table = [QtGui.qRgba(0, 0, 0, 0)]
+        for c in range(1, INSCRIBED_INFLATED_OBSTACLE):
+            color = QtGui.QColor.fromHsv(int(240 * (1 - c / 252.0)), 255, 255)
+            table.append(QtGui.qRgba(color.red(), color.green(), color.blue(), 60 + int(140 * c / 252.0)))
+        table.append(QtGui.qRgba(0, 220, 255, 200))
+        table.append(QtGui.qRgba(160, 0, 200, 220))
+        table.append(QtGui.qRgba(0, 0, 0, 0))
+
+        def source(x0, y0, x1, y1):
+            cells = costs[self._distanceTile(field, x0, y0, x1, y1)]
+            # nav2 leaves unknown cells alone unless inflate_unknown is set
+            cells[self.class_lut[self.map_data[y0:y1, x0:x1]] == UNKNOWN] = 0
+            if not cells.any():
+                return None
+            return indexed_image(cells, table)
+        self._setOverlay('inflation', source, z=2)
+        capped = field.max_dist * self.resolution
+        note = f" Distances are capped at {capped:.2f} m." if capped < inflation_radius else ""
+        edge = costs[:-1][costs[:-1] > 0]
+        self.inflation_dialog.setSummary(f"Inflated costs reach down to {int(edge.min()) if len(edge) else 0} "
+                                         f"at the inflation radius.{note}")
+        self.ui.statusInfo.setText(f"🛡️ Inflation radius {inflation_radius:.2f} m, "
+                                   f"cost_scaling_factor {cost_scaling_factor:g}")
+        if self.path_start is not None and self.ui.pathInflationCheck.isChecked():
+            # The path checker plans over these costs; search again with the new parameters
+            self._startPathSearch()
+
+    def _refreshDistanceOverlays(self):
+        """Re-render distance overlay tiles near the cells edited since the last refresh."""
+        tiles, self._distance_dirty = self._distance_dirty, set()
+        if not tiles:
+            return
+        affected = self._clearance.affected(tiles, self.tile_versions.shape)
+        for name in DISTANCE_OVERLAYS:
+            self._invalidateOverlay(name, affected)
+
+    # --- Reachability ---
+    def showReachabilityDialog(self):
+        if getattr(self, 'reachability_dialog', None) is None:
+            self.reachability_dialog = ReachabilityDialog(self)
+            self.reachability_dialog.pickRequested.connect(
+                lambda: self._requestMapPick("🚩 Click the robot's start cell (ESC to cancel)", self.setReachabilityStart))
+            self.reachability_dialog.markRequested.connect(self.markUnreachable)
+            self.reachability_dialog.pocketActivated.connect(
+                lambda x, y: self.ui.graphicsView.centerOn(x * self.pixels_per_cell, y * self.pixels_per_cell))
+            self.reachability_dialog.closed.connect(lambda: self._removeOverlay('reachability'))
+        self.reachability_dialog.show()
+        self.reachability_dialog.raise_()
+        if self._reach_start is None:
+            self.reachability_dialog.pickRequested.emit()
+        else:
+            self.analyzeReachability()
+
+    def setReachabilityStart(self, px, py):
+        x, y = int(math.floor(px)), int(math.floor(py))
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells):
+            return
+        self._reach_start = (x, y)
+        self.analyzeReachability()
+
+    def _unreachableTable(self):
+        """Return (labels, areas, unreachable) for the free space not 8-connected to the start cell.
+
+        `unreachable` is a boolean table over region ids, None when the start
+        cell is not free.
+        """
+        labels, areas = self._freeRegionTable(8)
+        x, y = self._reach_start
+        start = labels[y, x]
+        if start == 0:
+            return labels, areas, None
+        unreachable = np.ones(len(areas), dtype=bool)
+        unreachable[[0, start]] = False
+        return labels, areas, unreachable
+
+    def analyzeReachability(self):
+        """Highlight the free regions a robot at the start cell cannot reach, and list them by area."""
+        dialog = getattr(self, 'reachability_dialog', None)
+        if dialog is None or not dialog.isVisible() or self._reach_start is None:
+            return
+        labels, areas, unreachable = self._unreachableTable()
+        if unreachable is None:
+            self._removeOverlay('reachability')
+            dialog.setPockets([], "⚠️ The start cell is not free space. Pick another one.")
+            return
+        table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgba(255, 60, 0, 190)]
+        def source(x0, y0, x1, y1):
+            mask = unreachable[labels[y0:y1, x0:x1]]
+            if not mask.any():
+                return None
+            return indexed_image(mask.view(np.uint8), table)
+        self._setOverlay('reachability', source, z=1)
+
+        ids = np.flatnonzero(unreachable)
+        ids = ids[np.argsort(areas[ids])[::-1]]
+        cell_area = self.resolution ** 2
+        listed = ids[:ReachabilityDialog.MAX_LISTED]
+        pockets = [(float(areas[i]) * cell_area, int(areas[i]), cx, cy)
+                   for i, (cx, cy) in zip(listed, region_centroids(labels, listed))]
+        total = int(areas[ids].sum())
+        x, y = self._reach_start
+        dialog.setPockets(pockets, f"Start cell ({x}, {y}): {len(ids)} unreachable free regions, "
+                                   f"{total} cells ({total * cell_area:.2f} m²)")
+        self.ui.statusInfo.setText(f"🚩 {len(ids)} unreachable free regions ({total * cell_area:.2f} m²)")
+
+    def markUnreachable(self, kind):
+        """Paint every unreachable free cell as `kind` ('uncertain' or 'occupied') in one undo step."""
+        if self._reach_start is None:
+            return
+        labels, areas, unreachable = self._unreachableTable()
+        if unreachable is None or not unreachable.any():
+            return
+        mask = unreachable[labels]
+        changed = self._commitCells("Mark Unreachable", 0, 0,
+                                    np.where(mask, np.uint8(self.paint_values[kind]), self.map_data))
+        name = 'unknown' if kind == 'uncertain' else kind
+        print(f"Marked {changed} unreachable cells as {name}")
+        self.ui.statusInfo.setText(f"🚩 Marked {changed} unreachable cells as {name}")
+        self.analyzeReachability()
+
+    # --- Path checker ---
+    def _inflationParams(self):
+        """(inflation_radius, cost_scaling_factor, inscribed_radius) from the inflation preview controls."""
+        if getattr(self, 'inflation_dialog', None) is None:
+            return InflationDialog.DEFAULTS
+        return self.inflation_dialog.params()
+
+    def setPathStart(self, px, py):
+        x, y = int(math.floor(px)), int(math.floor(py))
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells):
+            return
+        self.path_start = (x, y)
+        self.path_goal = None
+        self._path_tree = None
+        self._drawPath()
+        self._startPathSearch()
+
+    def setPathGoal(self, px, py):
+        x, y = int(math.floor(px)), int(math.floor(py))
+        if not (0 <= x < self.map_width_cells and 0 <= y < self.map_height_cells) or (x, y) == self.path_goal:
+            return
+        self.path_goal = (x, y)
+        self._updatePath()
+
+    def clearPath(self):
+        self.path_start = None
+        self.path_goal = None
+        self._path_tree = None
+        self._path_timer.stop()
+        if self._path_job is not None:
+            self._path_job.cancel()
+        self._drawPath()
+
+    def _startPathSearch(self):
+        """Refresh the cost grid (dirty tiles only) and build the search tree from the start on a worker."""
+        if self.path_start is None:
+            return
+        if self._path_job is not None:
+            # The running search is out of date; start again once it returns
+            self._path_job.cancel()
+            self._path_pending = True
+            return
+        # The grid and its distance field belong to the worker; it gets a
+        # snapshot of the map and decodes any tiles still waiting in the store
+        data, lut, versions = self.map_data.copy(), self.class_lut.copy(), self.tile_versions.copy()
+        store = self.map_store
+        missing = [] if store is None else [(int(ty), int(tx)) for ty, tx in np.argwhere(~self.tiles_loaded)]
+        grid = self._path_grid
+        inflation, key, reach = None, None, 0
+        if self.ui.pathInflationCheck.isChecked():
+            params = self._inflationParams()
+            needed = min(MAX_CLEARANCE, int(math.ceil(params[0] / self.resolution)) + 1)
+            if needed > self._path_field.max_dist:
+                self._path_field = ClearanceField(min(MAX_CLEARANCE, max(needed, self._path_field.max_dist * 2)))
+            field = self._path_field
+            costs = inflation_cost_lut(field.max_dist, self.resolution, *params)
+
+            def inflation(ty, tx):
+                return costs[field.tile(data, lut, versions, ty, tx)]
+            key, reach = (tuple(params), field.max_dist, self.resolution), field.reach
+        graph, tree, start = self._path_graph, self._path_tree, self.path_start
+
+        def search(progress, cancelled):
+            for ty, tx in missing:
+                x0, y0, x1, y1 = store.tile_bounds(ty, tx)
+                data[y0:y1, x0:x1] = store.read_tile(ty, tx)
+            grid.update(data, lut, versions, inflation, key, reach)
+            if cancelled():
+                return None
+            version = grid.version
+            built = graph if graph is not None and graph[0] == version else (version,) + grid_graph(grid.cost)
+            if tree is not None and tree[:2] == (version, start):
+                return built, tree[2]
+            if cancelled():
+                return None
+            node = built[2][start[1], start[0]]
+            if node < 0:
+                return built, None
+            return built, path_tree(built[1], node)
+        job = MapJob(search, self)
+        job.finished_job.connect(lambda result, error: self._onPathTree(job, result, error, start))
+        self._path_job = job
+        self.ui.statusInfo.setText("🧭 Computing paths from the start…")
+        job.start()
+
+    def _onPathTree(self, job, result, error, start):
+        self._path_job = None
+        job.deleteLater()
+        if self._path_pending:
+            self._path_pending = False
+            self._startPathSearch()
+            return
+        if error:
+            self.ui.statusInfo.setText(f"❌ Path search failed: {error}")
+            return
+        if result is None or start != self.path_start:
+            return
+        built, pred = result
+        self._path_graph = built
+        if pred is None:
+            self._path_tree = None
+            self._drawPath()
+            self.ui.statusInfo.setText("⚠️ The start is blocked (not free space, or inside the inscribed radius). "
+                                       "Right-click and pick another one.")
+            return
+        self._path_tree = (built[0], start, pred)
+        self._updatePath()
+
+    def _updatePath(self):
+        """Trace the path to the goal through the current search tree and show its length."""
+        if self.path_goal is None or self._path_tree is None or self._path_tree[1] != self.path_start:
+            self._drawPath()
+            if self.path_goal is None and self._path_tree is not None:
+                self.ui.statusInfo.setText("🧭 Click or drag to place the goal")
+            return
+        _, _, node_of, cells = self._path_graph
+        pred = self._path_tree[2]
+        gx, gy = self.path_goal
+        sx, sy = self.path_start
+        goal_node = node_of[gy, gx]
+        path = None if goal_node < 0 else trace_path(pred, cells, self.map_width_cells, node_of[sy, sx], goal_node)
+        self._drawPath(path)
+        if goal_node < 0:
+            self.ui.statusInfo.setText("🧭 The goal is blocked (not free space, or inside the inscribed radius)")
+        elif path is None:
+            self.ui.statusInfo.setText("❌ No path: the goal cannot be reached from the start")
+        else:
+            meters = path_length(path) * self.resolution
+            self.ui.statusInfo.setText(f"🧭 Path length: {meters:.2f} m ({len(path)} cells)")
+
+    def _drawPath(self, path=None):
+        """Show the start/goal markers and the path (cell coordinates); None draws the markers only."""
+        for item in self._path_items:
+            try:
+                self.scene.removeItem(item)
+            except Exception:
+                pass
+        self._path_items = []
+        self._path_cells = path
+        if getattr(self, 'scene', None) is None:
+            return
+        ppc = self.pixels_per_cell
+        if path is not None and len(path) > 1:
+            pp = QtGui.QPainterPath(QtCore.QPointF((path[0][0] + 0.5) * ppc, (path[0][1] + 0.5) * ppc))
+            for x, y in path[1:]:
+                pp.lineTo((x + 0.5) * ppc, (y + 0.5) * ppc)
+            pen = QPen(QtGui.QColor(255, 140, 0))
+            pen.setWidth(3)
+            pen.setCosmetic(True)
+            item = self.scene.addPath(pp, pen)
+            item.setZValue(880)
+            self._path_items.append(item)
+        for cell, color in ((self.path_start, Qt.green), (self.path_goal, Qt.red)):
+            if cell is None:
+                continue
+            cx, cy = (cell[0] + 0.5) * ppc, (cell[1] + 0.5) * ppc
+            item = self.scene.addEllipse(cx - 6, cy - 6, 12, 12, QPen(Qt.black), QBrush(color))
+            item.setZValue(881)
+            self._path_items.append(item)
+
+    # --- Vector walls ---
+    def showWallVectorDialog(self):
+        if getattr(self, 'wall_vector_dialog', None) is None:
+            self.wall_vector_dialog = WallVectorDialog(self)
+            self.wall_vector_dialog.toleranceChanged.connect(lambda _: self._startWallExtraction())
+            self.wall_vector_dialog.exportRequested.connect(self.exportWallVectors)
+            self.wall_vector_dialog.closed.connect(self.clearWalls)
+        self.wall_vector_dialog.show()
+        self.wall_vector_dialog.raise_()
+
+    def _startWallExtraction(self):
+        """Simplify the occupied outlines on a worker, tracing them first unless this map version is traced."""
+        dialog = getattr(self, 'wall_vector_dialog', None)
+        if dialog is None or not dialog.isVisible():
+            return
+        if self._wall_job is not None:
+            # Start again once the running job (for an older map version or tolerance) has stopped
+            self._wall_job.cancel()
+            self._wall_pending = True
+            return
+        version, tolerance = self.map_version, dialog.tolerance()
+        cells = tolerance / self.resolution
+        contours, occupied = None, None
+        if self._wall_contours is not None and self._wall_contours[0] == version:
+            contours = self._wall_contours[1]
+        else:
+            self._ensureMapLoaded()
+            occupied = self.class_lut[self.map_data] == OCCUPIED
+
+        def extract(progress, cancelled):
+            # Tolerance 0 only drops collinear points; the traced contours are cached for other tolerances
+            traced = contours if contours is not None else wall_contours(occupied, 0.0, progress=progress,
+                                                                         cancelled=cancelled)
+            if traced is None or cancelled():
+                return None
+            return traced, simplify_polylines(traced, cells)
+        job = MapJob(extract, self)
+        if contours is None:
+            job.progress.connect(
+                lambda done, total: dialog.setSummary(f"Tracing walls… {100 * done // max(1, total)}%"))
+        job.finished_job.connect(lambda result, error: self._onWallsTraced(job, result, error, version, tolerance))
+        self._wall_job = job
+        job.start()
+
+    def _onWallsTraced(self, job, result, error, version, tolerance):
+        self._wall_job = None
+        job.deleteLater()
+        if self._wall_pending:
+            self._wall_pending = False
+            self._startWallExtraction()
+            return
+        if error:
+            self.ui.statusInfo.setText(f"❌ Wall tracing failed: {error}")
+            return
+        if result is None:
+            return
+        self._wall_contours = (version, result[0])
+        if version != self.map_version:
+            # Edited while tracing: trace again if the dialog is still open
+            self._startWallExtraction()
+            return
+        if self.wall_vector_dialog.isVisible():
+            self._wall_vectors = result[1]
+            self._showWalls(tolerance)
+
+    def _showWalls(self, tolerance):
+        """Draw the simplified walls and summarize them."""
+        self._drawWalls()
+        vertices = sum(len(p) for p in self._wall_vectors)
+        length = sum(np.hypot(*np.diff(p, axis=0).T).sum() for p in self._wall_vectors) * self.resolution
+        self.wall_vector_dialog.setSummary(f"{len(self._wall_vectors)} polylines, {vertices} vertices, "
+                                           f"{length:.1f} m of wall outline.")
+        self.ui.statusInfo.setText(f"📐 Walls simplified to {tolerance:.3f} m: {vertices} vertices")
+
+    def clearWalls(self):
+        self._wall_vectors = None
+        self._wall_timer.stop()
+        self._drawWalls()
+
+    def _drawWalls(self):
+        """Show the simplified wall polylines (cell coordinates) as one path item."""
+        if self._wall_item is not None:
+            try:
+                self.scene.removeItem(self._wall_item)
+            except Exception:
+                pass
+            self._wall_item = None
+        if self._wall_vectors is None or getattr(self, 'scene', None) is None:
+            return
+        ppc = self.pixels_per_cell
+        pp = QtGui.QPainterPath()
+        for points in self._wall_vectors:
+            pp.moveTo(points[0][0] * ppc, points[0][1] * ppc)
+            for x, y in points[1:]:
+                pp.lineTo(x * ppc, y * ppc)
+        pen = QPen(QtGui.QColor(0, 170, 255))
+        pen.setWidth(2)
+        pen.setCosmetic(True)
+        self._wall_item = self.scene.addPath(pp, pen)
+        self._wall_item.setZValue(870)
+
+    def _cellsToWorld(self, points):
+        """Vectorized _mapToWorld for an (n, 2) array of cell positions."""
+        mx = points[:, 0] * self.resolution
+        my = (self.map_height_cells - points[:, 1]) * self.resolution
+        c, s = math.cos(self.origin_yaw), math.sin(self.origin_yaw)
+        return np.stack([self.origin_x + mx * c - my * s, self.origin_y + mx * s + my * c], axis=1)
+
+    def exportWallVectors(self):
+        """Write the simplified walls and the dimensions to `output/` as SVG and DXF, in world meters."""
+        if not self._wall_vectors:
+            self.ui.statusInfo.setText("⚠️ No walls traced yet")
+            return
+        walls = [self._cellsToWorld(p) for p in self._wall_vectors]
+        dimensions = []
+        for dim in getattr(self, 'dimensions', []):
+            try:
+                dimensions.append((self._mapToWorld(*dim['start_cell']), self._mapToWorld(*dim['end_cell']),
+                                   f"{dim['distance']:.2f} m"))
+            except Exception:
+                pass
+        repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        out_dir = os.path.join(repo_root, 'output')
+        base = os.path.join(out_dir, map_basename(self.fn) + '_walls')
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            write_svg(base + '.svg', walls, dimensions)
+            write_dxf(base + '.dxf', walls, dimensions)
+        except Exception as e:
+            self.ui.statusInfo.setText("❌ Error exporting walls!")
+            self.ui.statusbar.showMessage(f"Error exporting walls: {str(e)}", 5000)
+            print(f"Error exporting walls: {e}")
+            return
+        print(f"Walls exported to: {base}.svg and {base}.dxf ({len(walls)} polylines, {len(dimensions)} dimensions)")
+        self.ui.statusInfo.setText(f"📐 Exported {len(walls)} wall polylines and {len(dimensions)} dimensions")
+        self.ui.statusbar.showMessage(f"Exported: {os.path.basename(base)}.svg and .dxf", 5000)
+
+    # --- Map diff ---
+    def showCompareDialog(self):
+        if getattr(self, 'compare_dialog', None) is None:
+            self.compare_dialog = CompareDialog(self)
+            self.compare_dialog.loadRequested.connect(self.chooseReferenceMap)
+            self.compare_dialog.openedRequested.connect(lambda: self.loadReferenceMap(self.fn))
+            self.compare_dialog.closed.connect(self._closeCompare)
+        self.compare_dialog.show()
+        self.compare_dialog.raise_()
+        if self._diff_source is not None:
+            self._alignReference()
+
+    def _closeCompare(self):
+        self._diff_timer.stop()
+        self._diff_ref = None
+        self._removeOverlay('diff')
+
+    def chooseReferenceMap(self):
+        patterns = ' '.join('*' + suffix for suffix in MAP_SUFFIXES)
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, "Reference map", os.path.dirname(self.fn),
+                                                        f"Maps ({patterns});;All files (*)")
+        if path:
+            self.loadReferenceMap(path)
+
+    def loadReferenceMap(self, path):
+        """Load `path` (image + YAML, or .rmap) as the reference the open map is compared with.
+
+        Without a YAML the reference must have the open map's size and is
+        taken to share its resolution and origin.
+        """
+        try:
+            if is_store(path):
+                store = MapStore.open(path)
+                data, doc = store.read_all(), store.metadata
+            else:
+                data, _ = read_map(path, self.depth_mapping)
+                doc = None
+                yaml_path = os.path.join(os.path.dirname(path), map_basename(path)) + '.yaml'
+                if os.path.isfile(yaml_path):
+                    with open(yaml_path, 'r') as stream:
+                        doc = yaml.safe_load(stream)
+            if not doc:
+                if data.shape != self.map_data.shape:
+                    raise MapFormatError(f"no YAML next to it and its size {data.shape[1]}x{data.shape[0]} "
+                                         f"differs from the open map")
+                doc = self._mapMetadata()
+            lut = class_lut(doc['occupied_thresh'], doc['free_thresh'], doc.get('mode', 'trinary'),
+                            1 if doc.get('negate', 0) else 0)
+            origin = tuple(doc['origin']) + (0.0,) * (3 - len(doc['origin']))
+            self._diff_source = (os.path.basename(path), lut[data], float(doc['resolution']), origin[:3])
+        except Exception as e:
+            self.ui.statusInfo.setText(f"❌ Cannot load reference map: {e}")
+            print(f"Error loading reference map {path}: {e}")
+            return
+        self._alignReference()
+
+    def _alignReference(self):
+        """Resample the reference onto the current grid and show the diff overlay."""
+        if self._diff_source is None:
+            return
+        name, classes, resolution, origin = self._diff_source
+        self._diff_ref = align_classes(classes, resolution, origin, self.map_data.shape, self.resolution,
+                                       (self.origin_x, self.origin_y, self.origin_yaw))
+        table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgba(0, 192, 64, 220), QtGui.qRgba(255, 40, 40, 220),
+                 QtGui.qRgba(255, 200, 0, 170)]
+
+        def source(x0, y0, x1, y1):
+            self._ensureTilesLoaded(x0, y0, x1, y1)
+            codes = class_diff(self._diff_ref[y0:y1, x0:x1], self.class_lut[self.map_data[y0:y1, x0:x1]])
+            if not codes.any():
+                return None
+            return indexed_image(codes, table)
+        self._setOverlay('diff', source, z=2)
+        note = ""
+        if not np.isclose(resolution, self.resolution):
+            note = f" Its resolution ({resolution:g} m) differs; cells are matched nearest-neighbor."
+        self.compare_dialog.setReference(f"Reference: {name} ({classes.shape[1]}x{classes.shape[0]}, "
+                                         f"origin {origin[0]:g}, {origin[1]:g}).{note}")
+        self._updateDiffStats()
+
+    def _updateDiffStats(self):
+        """Summarize the diff over the whole map in m²."""
+        if self._diff_ref is None:
+            return
+        self._ensureMapLoaded()
+        counts = diff_counts(self._diff_ref, self.class_lut[self.map_data])
+        cell_m2 = self.resolution ** 2
+        compared = int((self._diff_ref != OUTSIDE).sum())
+        total = self.map_data.size
+        self.compare_dialog.setStats(
+            f"Added obstacles: {counts[DIFF_ADDED] * cell_m2:.2f} m² ({counts[DIFF_ADDED]} cells)\n"
+            f"Removed obstacles: {counts[DIFF_REMOVED] * cell_m2:.2f} m² ({counts[DIFF_REMOVED]} cells)\n"
+            f"Free ↔ unknown: {counts[DIFF_CHANGED] * cell_m2:.2f} m² ({counts[DIFF_CHANGED]} cells)\n"
+            f"Compared: {compared * cell_m2:.2f} m² ({100.0 * compared / max(1, total):.0f}% of the open map)")
+        changed = int(counts[DIFF_ADDED] + counts[DIFF_REMOVED] + counts[DIFF_CHANGED])
+        self.ui.statusInfo.setText(f"🔍 {changed * cell_m2:.2f} m² differ from the reference")
+
+    # --- Speckle removal ---
+    def showSpeckleDialog(self):
+        if getattr(self, 'speckle_dialog', None) is None:
+            self.speckle_dialog = SpeckleDialog(self)
+            self.speckle_dialog.previewChanged.connect(self.previewSpeckles)
+            self.speckle_dialog.applyRequested.connect(self.removeSpeckles)
+            self.speckle_dialog.closed.connect(lambda: self._removeOverlay('speckles'))
+        self.speckle_dialog.show()
+        self.speckle_dialog.raise_()
+
+    def _speckleTable(self, threshold, unit, connectivity):
+        """Return (labels, small) for occupied blobs below the threshold (labels cached per map version)."""
+        self._ensureMapLoaded()
+        key = (self.map_version, connectivity, self.class_lut.tobytes())
+        cached = getattr(self, '_speckle_labels', None)
+        if cached is None or cached[0] != key:
+            labels, areas = component_areas(self.class_lut[self.map_data] == OCCUPIED, connectivity)
+            cached = (key, labels, areas)
+            self._speckle_labels = cached
+        _, labels, areas = cached
+        max_cells = threshold if unit == 'cells' else threshold / (self.resolution ** 2)
+        small = small_components(areas, max_cells)
+        return labels, areas, small
+
+    def previewSpeckles(self, threshold, unit, connectivity):
+        """Highlight the blobs that removeSpeckles would erase."""
+        labels, areas, small = self._speckleTable(threshold, unit, connectivity)
+        table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgba(255, 40, 40, 200)]
+        def source(x0, y0, x1, y1):
+            mask = small[labels[y0:y1, x0:x1]]
+            if not mask.any():
+                return None
+            return indexed_image(mask.view(np.uint8), table)
+        self._setOverlay('speckles', source, z=1)
+        cells = int(areas[small].sum())
+        self.speckle_dialog.setSummary(int(small.sum()), cells, cells * self.resolution ** 2)
+
+    def removeSpeckles(self, threshold, unit, connectivity):
+        """Recolor occupied blobs below the threshold as free (one undo step)."""
+        labels, areas, small = self._speckleTable(threshold, unit, connectivity)
+        if not small.any():
+            return
+        mask = small[labels]
+        changed = self._commitCells("Remove Speckles", 0, 0,
+                                    np.where(mask, np.uint8(self.paint_values['unoccupied']), self.map_data))
+        print(f"Removed {int(small.sum())} speckles ({changed} cells)")
+        self.ui.statusInfo.setText(f"✨ Removed {int(small.sum())} speckles ({changed} cells)")
+        if getattr(self, 'speckle_dialog', None) is not None and self.speckle_dialog.isVisible():
+            self.previewSpeckles(threshold, unit, connectivity)
+
+    # --- Wall straightening ---
+    def showStraightenDialog(self):
+        if getattr(self, 'straighten_dialog', None) is None:
+            self.straighten_dialog = StraightenDialog(self)
+            self.straighten_dialog.previewChanged.connect(self.previewStraighten)
+            self.straighten_dialog.applyRequested.connect(self.applyStraighten)
+            self.straighten_dialog.closed.connect(self._closeStraighten)
+        self.straighten_dialog.show()
+        self.straighten_dialog.raise_()
+
+    def _closeStraighten(self):
+        self._straighten_timer.stop()
+        self._straighten_pending = None
+        self._straighten_result = None
+        if self._straighten_job is not None:
+            self._straighten_job.cancel()
+        self._removeOverlay('straighten')
+
+    def _straightenKey(self, params):
+        return (self.map_version, self.class_lut.tobytes(), tuple(sorted(params.items())))
+
+    def previewStraighten(self, params):
+        """Detect straight walls on a worker and show which cells the redraw would clear or fill."""
+        key = self._straightenKey(params)
+        if self._straighten_result is not None and self._straighten_result[0] == key:
+            self._showStraighten()
+            return
+        if self._straighten_job is not None:
+            # Run again with the latest parameters once the current job has stopped
+            self._straighten_job.cancel()
+            self._straighten_pending = params
+            return
+        self._ensureMapLoaded()
+        data = self.map_data.copy()
+        classes = self.class_lut[data]
+        values = dict(self.paint_values)
+        res = self.resolution
+        min_length = max(2.0, params['min_length'] / res)
+        band = max(1.0, params['band'] / res)
+        thickness = max(1, int(round(params['thickness'] / res)))
+        snap_deg = params['snap_deg']
+
+        def run(progress, cancelled):
+            angle = dominant_wall_angle(classes == OCCUPIED)[0] if snap_deg is not None else None
+            found = detect_wall_lines(classes, min_length, band=band, max_gap=band + 1, snap_angle=angle,
+                                      snap_deg=snap_deg or 0.0, progress=progress, cancelled=cancelled)
+            if found is None:
+                return None
+            segments, sides = found
+            return segments, straighten_walls(data, classes, segments, sides, thickness, band, values)
+        job = MapJob(run, self)
+        job.progress.connect(lambda done, total: self.straighten_dialog.setSummary(
+            f"Detecting walls… {100 * done // max(1, total)}%", False))
+        job.finished_job.connect(lambda result, error: self._onStraightenFinished(job, result, error, key))
+        self._straighten_job = job
+        self._straighten_result = None
+        job.start()
+
+    def _onStraightenFinished(self, job, result, error, key):
+        self._straighten_job = None
+        job.deleteLater()
+        if self._straighten_pending is not None:
+            params, self._straighten_pending = self._straighten_pending, None
+            self.previewStraighten(params)
+            return
+        if error:
+            self.ui.statusInfo.setText(f"❌ Wall straightening failed: {error}")
+            return
+        if result is None or not self.straighten_dialog.isVisible():
+            return
+        self._straighten_result = (key,) + tuple(result)
+        self._showStraighten()
+
+    def _showStraighten(self):
+        _, segments, after = self._straighten_result
+        before = self.map_data
+        old = self.class_lut[before]
+        new = self.class_lut[after]
+        # 0: unchanged, 1: occupied noise cleared, 2: filled in as wall
+        table = [QtGui.qRgba(0, 0, 0, 0), QtGui.qRgba(255, 40, 40, 200), QtGui.qRgba(0, 120, 255, 220)]
+        def source(x0, y0, x1, y1):
+            o, n = old[y0:y1, x0:x1], new[y0:y1, x0:x1]
+            cells = np.where(o == n, 0, np.where(n == OCCUPIED, 2, 1)).astype(np.uint8)
+            if not cells.any():
+                return None
+            return indexed_image(cells, table)
+        self._setOverlay('straighten', source, z=1)
+        cleared = int(((old == OCCUPIED) & (new != OCCUPIED)).sum())
+        filled = int(((old != OCCUPIED) & (new == OCCUPIED)).sum())
+        self.straighten_dialog.setSummary(f"{len(segments)} straight walls: {cleared} noise cells cleared (red), "
+                                          f"{filled} cells filled in (blue)", cleared + filled > 0)
+
+    def applyStraighten(self, params):
+        """Write the previewed redraw into the map (one undo step)."""
+        if self._straighten_result is None or self._straighten_result[0] != self._straightenKey(params):
+            self.ui.statusInfo.setText("⏳ The preview is not up to date yet; apply again when it is")
+            self.previewStraighten(params)
+            return
+        _, segments, after = self._straighten_result
+        changed = self._commitCells("Straighten Walls", 0, 0, after)
+        print(f"Straightened {len(segments)} walls ({changed} cells)")
+        self.ui.statusInfo.setText(f"📏 Straightened {len(segments)} walls ({changed} cells)")
+        self._straighten_timer.stop()
+        self.previewStraighten(params)
+
+    # --- Morphology ---
+    def showMorphologyPanel(self):
+        if getattr(self, 'morphology_panel', None) is None:
+            self.morphology_panel = MorphologyPanel(self)
+            self.morphology_panel.pipelineChanged.connect(self.previewMorphology)
+            self.morphology_panel.applyRequested.connect(self.applyMorphology)
+            self.morphology_panel.cancelRequested.connect(self.cancelMorphology)
+            self.morphology_panel.closed.connect(lambda: self.previewMorphology([]))
+            self.addDockWidget(Qt.RightDockWidgetArea, self.morphology_panel)
+        self.morphology_panel.show()
+        self.morphology_panel.raise_()
+
+    def previewMorphology(self, steps):
+        """Preview `steps` on the visible part of the map (empty list hides the preview)."""
+        self._morph_steps = [tuple(step) for step in steps]
+        if not self._morph_steps:
+            self._morph_timer.stop()
+            self._removeOverlay('morphology')
+            return
+        self._updateMorphologyPreview()
+
+    def _updateMorphologyPreview(self):
+        if not self._morph_steps:
+            return
+        x0, y0, x1, y1 = self._visibleCellRect()
+        if x0 >= x1 or y0 >= y1:
+            return
+        # Compute on the viewport plus enough context for exact results at its edges
+        halo = pipeline_halo(self._morph_steps)
+        hx0, hy0 = max(0, x0 - halo), max(0, y0 - halo)
+        hx1, hy1 = min(self.map_width_cells, x1 + halo), min(self.map_height_cells, y1 + halo)
+        self._ensureTilesLoaded(hx0, hy0, hx1, hy1)
+        before = self.map_data[hy0:hy1, hx0:hx1]
+        after = run_pipeline(before, self.class_lut, self._morph_steps, self.paint_values, band=hy1 - hy0)
+        after = after[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+        changed = after != before[y0 - hy0:y1 - hy0, x0 - hx0:x1 - hx0]
+        # Show the result in map colors with changed cells tinted orange
+        rgba = color_table_rgba(self.color_table)[after]
+        tint = np.array([255, 140, 0, 255], dtype=np.uint16)
+        rgba[changed] = ((rgba[changed].astype(np.uint16) + tint) // 2).astype(np.uint8)
+        def source(tx0, ty0, tx1, ty1):
+            ix0, iy0, ix1, iy1 = max(tx0, x0), max(ty0, y0), min(tx1, x1), min(ty1, y1)
+            if ix0 >= ix1 or iy0 >= iy1:
+                return None
+            tile = np.zeros((ty1 - ty0, tx1 - tx0, 4), dtype=np.uint8)
+            tile[iy0 - ty0:iy1 - ty0, ix0 - tx0:ix1 - tx0] = rgba[iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0]
+            return rgba_image(tile)
+        self._setOverlay('morphology', source, z=1)
+        self.ui.statusbar.showMessage(f"Morphology preview: {int(changed.sum())} visible cells change", 3000)
+
+    def applyMorphology(self, steps):
+        """Run the pipeline over the whole map on a worker thread."""
+        steps = [tuple(step) for step in steps]
+        if not steps or self._morph_job is not None:
+            return
+        self._ensureMapLoaded()
+        data = self.map_data.copy()
+        lut = self.class_lut.copy()
+        values = dict(self.paint_values)
+        start_version = self.map_version
+        job = MapJob(lambda progress, cancelled: run_pipeline(data, lut, steps, values, progress=progress,
+                                                              cancelled=cancelled), self)
+        job.progress.connect(self.morphology_panel.setProgress)
+        job.finished_job.connect(lambda result, error: self._onMorphologyFinished(job, result, error, start_version))
+        self._morph_job = job
+        self.morphology_panel.setRunning(True)
+        self.ui.statusInfo.setText("🧹 Applying morphology…")
+        job.start()
+
+    def cancelMorphology(self):
+        if self._morph_job is not None:
+            self._morph_job.cancel()
+
+    def _onMorphologyFinished(self, job, result, error, start_version):
+        self._morph_job = None
+        job.deleteLater()
+        self.morphology_panel.setRunning(False)
+        if error:
+            self.ui.statusInfo.setText(f"❌ Morphology failed: {error}")
+            return
+        if result is None:
+            self.ui.statusInfo.setText("Morphology cancelled")
+            return
+        if self.map_version != start_version or result.shape != self.map_data.shape:
+            # Committing would overwrite edits made while the job ran
+            self.ui.statusInfo.setText("⚠️ Map changed while morphology ran; apply again")
+            return
+        changed = self._commitCells("Morphology", 0, 0, result)
+        print(f"Morphology changed {changed} cells")
+        self.ui.statusInfo.setText(f"🧹 Morphology changed {changed} cells")
+
+    # --- Map library ---
+    def showMapBrowser(self):
+        """Show (creating on first use) the map library dock."""
+        if getattr(self, 'map_browser', None) is None:
+            repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+            self.map_browser = MapBrowserPanel([os.path.join(repo_root, 'maps')], self)
+            self.map_browser.mapActivated.connect(self.openMap)
+            self.addDockWidget(Qt.LeftDockWidgetArea, self.map_browser)
+        self.map_browser.show()
+        self.map_browser.raise_()
+
+    def openMap(self, path):
+        """Replace the open map with `path` (annotations and undo history are dropped)."""
+        entry = None
+        if getattr(self, 'map_browser', None) is not None:
+            entry = self.map_browser.library.entries.get(path)
+        # read() exits on unreadable maps, so only hand it ones the index vetted
+        if entry is not None and (entry.get('error') or (not entry.get('yaml') and entry.get('format') != 'rmap')):
+            self.ui.statusInfo.setText(f"⚠️ Cannot open {entry['name']}: {describe_entry(entry)}")
+            return
+        if self.undo_stack.count() or self.tile_versions.any():
+            reply = QtWidgets.QMessageBox.question(
+                self, "Open map",
+                f"Close {os.path.basename(self.fn)} and open {os.path.basename(path)}? "
+                "Unsaved edits stay available through File → Restore autosave.",
+                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+            if reply != QtWidgets.QMessageBox.Yes:
+                return
+        # Flush pending autosave and save work for the current map first
+        try:
+            self.autosaver.trigger()
+            self.autosaver.wait()
+            if getattr(self, '_save_job', None) is not None:
+                self._save_job.wait()
+        except Exception:
+            pass
+        self.cancelMeasurement()
+        self.cancelLineDrawing()
+        if getattr(self, 'speckle_dialog', None) is not None:
+            self.speckle_dialog.close()
+        if getattr(self, 'clearance_dialog', None) is not None:
+            self.clearance_dialog.close()
+        if getattr(self, 'inflation_dialog', None) is not None:
+            self.inflation_dialog.close()
+        if getattr(self, 'reachability_dialog', None) is not None:
+            self.reachability_dialog.close()
+        if getattr(self, 'straighten_dialog', None) is not None:
+            self.straighten_dialog.close()
+        if self._morph_job is not None:
+            self._morph_job.cancel()
+            self._morph_job.wait()
+        if self._analysis_job is not None:
+            self._analysis_job.cancel()
+            self._analysis_job.wait()
+        if self._path_job is not None:
+            self._path_job.cancel()
+            self._path_job.wait()
+        if self._wall_job is not None:
+            self._wall_job.cancel()
+            self._wall_job.wait()
+        if self._straighten_job is not None:
+            self._straighten_job.cancel()
+            self._straighten_job.wait()
+        if getattr(self, 'wall_vector_dialog', None) is not None:
+            self.wall_vector_dialog.close()
+        self._wall_contours = None
+        if getattr(self, 'compare_dialog', None) is not None:
+            self.compare_dialog.close()
+        self._diff_source = None
+        self.clearPath()
+        self._path_grid.clear()
+        self._path_field.clear()
+        for name in list(self.overlay_sources):
+            self._removeOverlay(name)
+        self._speckle_labels = None
+        self._region_labels = {}
+        self._reach_start = None
+        self.text_items = []
+        self.dimensions = []
+        self.selected_dimension = None
+        self.lines = []
+        self.areas = []
+        self.area_points = []
+        self.temp_area = None
+
+        self.read(path)
+
+        view_width = self.ui.graphicsView.viewport().width() or self.frameGeometry().width()
+        self.min_multiplier = math.ceil(view_width / self.map_width_cells)
+        self.pixels_per_cell = self.min_multiplier * self.zoom
+        self.draw_map()
+        self.undo_stack.clear()
+        try:
+            self.ui.actionSaveNative.setChecked(self.map_store is not None)
+            self.autosaver.store_path = self._autosaveStorePath()
+            self.autosaver.edits = 0
+            self.ui.actionRestoreAutosave.setEnabled(self._autosaveMatchesMap())
+        except Exception:
+            pass
+        self.ui.statusInfo.setText(f"📂 Opened {os.path.basename(self.fn)}")
+
     def closeEvent(self, event):
+        # Let background writers finish before the window goes away
+        try:
+            if getattr(self, 'map_browser', None) is not None:
+                self.map_browser.shutdown()
+            if self._morph_job is not None:
+                self._morph_job.cancel()
+                self._morph_job.wait()
+            if self._analysis_job is not None:
+                self._analysis_job.cancel()
+                self._analysis_job.wait()
+            if self._path_job is not None:
+                self._path_job.cancel()
+                self._path_job.wait()
+            if self._wall_job is not None:
+                self._wall_job.cancel()
+                self._wall_job.wait()
+            if self._straighten_job is not None:
+                self._straighten_job.cancel()
+                self._straighten_job.wait()
+            self.autosaver.wait()
+            if getattr(self, '_save_job', None) is not None:
+                self._save_job.wait()
+        except Exception:
+            pass
         self.close()
 
+    # --- Autosave ---
+    def _autosaveStorePath(self):
+        repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        return os.path.join(repo_root, 'output', '.autosave', map_basename(self.fn) + STORE_SUFFIX)
+
+    def _setupAutosave(self):
+        self.autosaver = Autosaver(self._autosaveStorePath(), self._autosaveSnapshot, self._onAutosaveDone, parent=self)
+        # Every annotation edit (and undo/redo) goes through the undo stack
+        self.undo_stack.indexChanged.connect(self.autosaver.note_edit)
+        try:
+            self.ui.actionAutosave.toggled.connect(lambda on: self.autosaver.configure(enabled=on))
+            self.ui.actionAutosaveSettings.triggered.connect(self.showAutosaveSettings)
+            self.ui.actionRestoreAutosave.triggered.connect(self.restoreAutosave)
+            self.ui.actionRestoreAutosave.setEnabled(self._autosaveMatchesMap())
+            if self.ui.actionRestoreAutosave.isEnabled():
+                self.ui.statusbar.showMessage("Autosaved edits found for this map: File → Restore autosave", 8000)
+        except Exception:
+            pass
+
+    def _autosaveSnapshot(self):
+        """Copy the tiles and annotations changed since the last autosave (GUI thread)."""
+        full = self._autosave_versions is None or self._autosave_versions.shape != self.tile_versions.shape
+        if full:
+            self._ensureMapLoaded()
+            dirty = np.argwhere(np.ones_like(self.tile_versions, dtype=bool))
+        else:
+            dirty = np.argwhere(self.tile_versions != self._autosave_versions)
+        annotations = self._captureState()
+        metadata = self._mapMetadata()
+        if not full and len(dirty) == 0 and annotations == self._autosave_annotations \
+                and metadata == self._autosave_metadata:
+            return None
+        tiles = []
+        for ty, tx in dirty:
+            ty, tx = int(ty), int(tx)
+            x0, y0 = tx * TILE_SIZE, ty * TILE_SIZE
+            tiles.append((ty, tx, self.map_data[y0:y0 + TILE_SIZE, x0:x0 + TILE_SIZE].copy()))
+        metadata = dict(metadata)
+        metadata['base_map'] = None if full else self._autosave_base
+        return {
+            'shape': self.map_data.shape,
+            'full': full,
+            'fresh': self._autosave_fresh,
+            'tiles': tiles,
+            'metadata': metadata,
+            'annotations': annotations,
+            'versions': self.tile_versions.copy(),
+        }
+
+    def _onAutosaveDone(self, snapshot, result):
+        if result['error']:
+            print(f"Autosave failed: {result['error']}")
+            self.ui.statusbar.showMessage(f"Autosave failed: {result['error']}", 5000)
+            return
+        self._autosave_versions = snapshot['versions']
+        self._autosave_annotations = snapshot['annotations']
+        self._autosave_metadata = {k: v for k, v in snapshot['metadata'].items() if k != 'base_map'}
+        self._autosave_fresh = False
+        if snapshot['full']:
+            self._autosave_base = None
+        self.ui.statusbar.showMessage(f"Autosaved ({result['tiles']} tiles)", 3000)
+
+    def _autosaveMatchesMap(self):
+        """True if the autosave store holds edits made to the currently opened map."""
+        try:
+            if not is_store(self.autosaver.store_path):
+                return False
+            store = MapStore.open(self.autosaver.store_path)
+            if (store.height, store.width) != self.map_data.shape:
+                return False
+            base = store.metadata.get('base_map')
+            return base is None or base == os.path.abspath(self.fn)
+        except Exception:
+            return False
+
+    def restoreAutosave(self):
+        """Apply the autosaved tiles and annotations to the open map."""
+        if not self._autosaveMatchesMap():
+            self.ui.statusInfo.setText("⚠️ No autosave for this map")
+            return
+        self.autosaver.wait()
+        try:
+            store = MapStore.open(self.autosaver.store_path)
+            for ty, tx in store.stored_tiles():
+                x0, y0, x1, y1 = store.tile_bounds(ty, tx)
+                self._ensureTilesLoaded(x0, y0, x1, y1)
+                self.map_data[y0:y1, x0:x1] = store.read_tile(ty, tx)
+                self._mapChanged(x0, y0, x1, y1)
+            meta = store.metadata
+            if 'occupied_thresh' in meta and 'free_thresh' in meta:
+                self.setThresholds(meta['occupied_thresh'], meta['free_thresh'])
+            state = read_annotations(self.autosaver.store_path)
+            if state is not None:
+                self._pushSnapshotAction("Restore Autosave", lambda: self._restoreState(state))
+        except Exception as e:
+            self.ui.statusInfo.setText("❌ Error restoring autosave!")
+            print(f"Error restoring autosave: {e}")
+            return
+        self.ui.statusInfo.setText("♻️ Autosaved edits restored")
+
+    def showAutosaveSettings(self):
+        """Let the user tune the idle interval and edit budget."""
+        dlg = QtWidgets.QDialog(self)
+        dlg.setWindowTitle("Autosave settings")
+        form = QtWidgets.QFormLayout(dlg)
+        idle = QtWidgets.QSpinBox(dlg)
+        idle.setRange(1, 3600)
+        idle.setSuffix(" s")
+        idle.setValue(int(self.autosaver.idle_seconds))
+        budget = QtWidgets.QSpinBox(dlg)
+        budget.setRange(1, 100000)
+        budget.setValue(int(self.autosaver.edit_budget))
+        form.addRow("Save after idle for:", idle)
+        form.addRow("Or after this many edits:", budget)
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, parent=dlg)
+        buttons.accepted.connect(dlg.accept)
+        buttons.rejected.connect(dlg.reject)
+        form.addRow(buttons)
+        if dlg.exec_() == QtWidgets.QDialog.Accepted:
+            self.autosaver.configure(idle_seconds=idle.value(), edit_budget=budget.value())
+            self.ui.statusInfo.setText(f"Autosave: {idle.value()} s idle or {budget.value()} edits")
+
     def saveEvent(self, event):
-        """Save two outputs into an `output/` folder at the repo root:
-        - raw PGM (current map model without annotations)
+        """Save the map into an `output/` folder at the repo root:
+        - raw PGM (current map model without annotations) plus the matching
+          map_server YAML, or the native tiled store `<name>.rmap` when
+          native saving is enabled
         - annotated PNG (renders the QGraphicsScene including annotations)
+
+        Files are written on a worker thread through temporary files that are
+        atomically renamed; outputs whose content is unchanged since the last
+        save are skipped.
         """
+        if getattr(self, '_save_job', None) is not None:
+            # A save is still running; save again once it finishes
+            self._save_again = True
+            self.ui.statusInfo.setText("💾 Save queued…")
+            return
+
         repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         out_dir = os.path.join(repo_root, 'output')
         try:
@@ -2279,55 +4556,174 @@ class MapEditor(QtWidgets.QMainWindow):
         except Exception:
             pass
 
-        base_name = os.path.splitext(os.path.basename(self.fn))[0]
+        base_name = map_basename(self.fn)
+        outputs = []
+        self._ensureMapLoaded()
 
-        # 1) Save raw PGM (the model image without annotations)
-        raw_path = os.path.join(out_dir, base_name + '.pgm')
+        # 1) Raw map (the model without annotations) + YAML, or the native store
+        if self.ui.actionSaveNative.isChecked():
+            store_path = os.path.join(out_dir, base_name + STORE_SUFFIX)
+            try:
+                store, dirty, versions = self._planNativeSave(store_path)
+            except Exception as e:
+                self.ui.statusInfo.setText("❌ Error saving raw map!")
+                self.ui.statusbar.showMessage(f"Error saving raw map: {str(e)}", 5000)
+                print(f"Error saving raw map: {e}")
+                return
+            data = self.map_data.copy()
+            metadata = self._mapMetadata()
+
+            def save_store():
+                if dirty is not None and not dirty and store.metadata == metadata:
+                    return 0
+                return store.save(data, dirty, metadata=metadata)
+            outputs.append(SaveOutput(store_path, 'store', save_store))
+        else:
+            raw_path = os.path.join(out_dir, base_name + '.pgm')
+            versions = None
+            outputs.append(SaveOutput(raw_path, 'pgm', self.map_data.copy()))
+            outputs.append(SaveOutput(os.path.join(out_dir, base_name + '.yaml'), 'yaml',
+                                      yaml_text(self._mapMetadata(), base_name + '.pgm')))
+
+        # 2) Render annotated scene to an image (must happen on the GUI thread)
+        annotated_path = os.path.join(out_dir, base_name + '_annotated.png')
         try:
-            self.im.save(raw_path)
-            print(f"Raw map saved to: {raw_path}")
+            outputs.append(SaveOutput(annotated_path, 'png', self._renderAnnotated()))
         except Exception as e:
-            self.ui.statusInfo.setText("❌ Error saving raw map!")
-            self.ui.statusbar.showMessage(f"Error saving raw map: {str(e)}", 5000)
-            print(f"Error saving raw map: {e}")
+            self.ui.statusInfo.setText("❌ Error saving annotated map!")
+            self.ui.statusbar.showMessage(f"Error saving annotated map: {str(e)}", 5000)
+            print(f"Error saving annotated map: {e}")
             return
 
-        # 2) Render annotated scene to an image and save as PNG
+        job = SaveJob(outputs, getattr(self, 'saved_hashes', {}), self)
+        job.finished_save.connect(lambda result: self._onSaveFinished(job, result, versions, out_dir))
+        self._save_job = job
+        self.ui.statusInfo.setText("💾 Saving…")
+        job.start()
+
+    def _renderAnnotated(self):
+        """Render the whole scene at 1:1 scale; reuse the last render if nothing changed."""
+        key = (self.map_version, self.pixels_per_cell, tuple(self.color_table),
+               repr(self._captureState()))
+        cached = getattr(self, '_annotated_cache', None)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        self.map_layer.update_visible(0, 0, self.map_width_cells, self.map_height_cells)
+        pixel_width = int(self.map_width_cells * self.pixels_per_cell)
+        pixel_height = int(self.map_height_cells * self.pixels_per_cell)
+
+        # Create QImage canvas with alpha for annotations
+        qim = QtGui.QImage(pixel_width, pixel_height, QtGui.QImage.Format_ARGB32)
+        qim.fill(QtGui.QColor(0, 0, 0, 0))
+
+        painter = QtGui.QPainter(qim)
+        # Render the scene at 1:1 scale, without previews and analysis overlays
+        for layer in self.overlay_layers.values():
+            layer.set_visible(False)
         try:
-            pixel_width = int(self.map_width_cells * self.pixels_per_cell)
-            pixel_height = int(self.map_height_cells * self.pixels_per_cell)
-
-            # Create QImage canvas with alpha for annotations
-            qim = QtGui.QImage(pixel_width, pixel_height, QtGui.QImage.Format_ARGB32)
-            qim.fill(QtGui.QColor(0, 0, 0, 0))
-
-            painter = QtGui.QPainter(qim)
-            # Render the scene at 1:1 scale
             self.scene.render(painter)
+        finally:
             painter.end()
+            for layer in self.overlay_layers.values():
+                layer.set_visible(True)
+        self._annotated_cache = (key, qim)
+        return qim
+
+    def _onSaveFinished(self, job, result, versions, out_dir):
+        self._save_job = None
+        job.deleteLater()
+        if not hasattr(self, 'saved_hashes'):
+            self.saved_hashes = {}
+        self.saved_hashes.update(result['hashes'])
+        if result['error']:
+            self.ui.statusInfo.setText("❌ Error saving map!")
+            self.ui.statusbar.showMessage(f"Error saving {result['error']}", 5000)
+            print(f"Error saving {result['error']}")
+        else:
+            if versions is not None:
+                self.output_store_versions = versions
+            for path in result['written']:
+                tiles = result['tiles'].get(path)
+                extra = f" ({tiles} tiles written)" if tiles is not None else ""
+                print(f"Saved: {path}{extra}")
+            for path in result['skipped']:
+                print(f"Unchanged, not rewritten: {path}")
+            written = ', '.join(os.path.basename(p) for p in result['written']) or 'nothing changed'
+            self.ui.statusInfo.setText(f"💾 Saved to {out_dir}")
+            self.ui.statusbar.showMessage(f"Saved: {written}", 5000)
+        if getattr(self, '_save_again', False):
+            self._save_again = False
+            self.saveEvent(None)
+
+    def _planNativeSave(self, store_path):
+        """Pick the output store and the tiles that differ from what it holds.
+
+        Returns (store, dirty_tiles or None for all, tile versions after the save).
+        """
+        store = self.output_store
+        if store is None or store.path != store_path or \
+                (store.height, store.width) != self.map_data.shape:
+            if self.map_store is not None and os.path.abspath(self.map_store.path) == os.path.abspath(store_path) \
+                    and (self.map_store.height, self.map_store.width) == self.map_data.shape:
+                # Saving back over the store we opened: unchanged tiles are already on disk
+                store = self.map_store
+                self.output_store_versions = np.zeros_like(self.tile_versions)
+            else:
+                self._ensureMapLoaded()
+                store = MapStore.create(store_path, self.map_width_cells, self.map_height_cells)
+                self.output_store_versions = None
+            self.output_store = store
+        if self.output_store_versions is None:
+            dirty = None
+        else:
+            # Only edited tiles are written, and edits always load their tiles first
+            dirty = [(int(ty), int(tx)) for ty, tx in np.argwhere(self.tile_versions != self.output_store_versions)]
+        return store, dirty, self.tile_versions.copy()
+
+    def exportRosMap(self):
+        """Export the map as a ROS map_server PGM + YAML pair into `output/`.
 
-            annotated_path = os.path.join(out_dir, base_name + '_annotated.png')
-            saved = qim.save(annotated_path)
-            if not saved:
-                raise IOError('Failed to save annotated image')
-            print(f"Annotated map saved to: {annotated_path}")
+        Written straight from the map in memory; the native store is only
+        written by an explicit save.
+        """
+        repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        out_dir = os.path.join(repo_root, 'output')
+        base_name = map_basename(self.fn)
+        if getattr(self, '_save_job', None) is not None:
+            # Do not race a background save writing the same PGM
+            self._save_job.wait()
+            QtWidgets.QApplication.processEvents()
+        self._ensureMapLoaded()
+        pgm_path = os.path.join(out_dir, base_name + '.pgm')
+        yaml_path = os.path.join(out_dir, base_name + '.yaml')
+        try:
+            os.makedirs(out_dir, exist_ok=True)
+            SaveOutput(pgm_path, 'pgm', np.ascontiguousarray(self.map_data)).write()
+            SaveOutput(yaml_path, 'yaml', yaml_text(self._mapMetadata(), base_name + '.pgm')).write()
         except Exception as e:
-            self.ui.statusInfo.setText("❌ Error saving annotated map!")
-            self.ui.statusbar.showMessage(f"Error saving annotated map: {str(e)}", 5000)
-            print(f"Error saving annotated map: {e}")
+            self.ui.statusInfo.setText("❌ Error exporting ROS map!")
+            self.ui.statusbar.showMessage(f"Error exporting ROS map: {str(e)}", 5000)
+            print(f"Error exporting ROS map: {e}")
             return
-
-        # Success
-        self.ui.statusInfo.setText(f"💾 Saved raw and annotated maps to {out_dir}")
-        self.ui.statusbar.showMessage(f"Saved: {os.path.basename(raw_path)} and {os.path.basename(annotated_path)}", 5000)
+        print(f"ROS map exported to: {pgm_path} and {yaml_path}")
+        self.ui.statusInfo.setText(f"📤 Exported ROS map to {out_dir}")
+        self.ui.statusbar.showMessage(f"Exported: {os.path.basename(pgm_path)} and {os.path.basename(yaml_path)}", 5000)
 
 
 if __name__ == '__main__':
     if len(sys.argv) < 2:
         print('ERROR:  Must provide map file name - with or without .pgm extension.')
         print()
-        print('     $ python MapEditor.py map_file_name')
+        print('     $ python MapEditor.py map_file_name [--depth-mapping=scale|shift|window:LOW:HIGH]')
         print()
+    depth_mapping = None
+    for arg in sys.argv[2:]:
+        if arg.startswith('--depth-mapping='):
+            try:
+                depth_mapping = DepthMapping.parse(arg.split('=', 1)[1])
+            except ValueError as e:
+                print('ERROR: ', e)
+                sys.exit(1)
     # On Linux without a graphical display, fallback to offscreen platform to avoid Qt crashes.
     try:
         if sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
@@ -2336,7 +4732,7 @@ if __name__ == '__main__':
     except Exception:
         pass
     app = QtWidgets.QApplication(sys.argv)
-    window = MapEditor(sys.argv[1])
+    window = MapEditor(sys.argv[1], depth_mapping=depth_mapping)
     window.show()
     try:
         sys.exit(app.exec_())
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+# Debounced background autosave.
+#
+# The editor reports every edit through `Autosaver.note_edit`. An autosave
+# fires after `idle_seconds` without edits, or right away once `edit_budget`
+# edits have piled up. The editor's snapshot callback copies only the tiles
+# edited since the previous autosave (plus the annotation state), so the cost
+# of an autosave is proportional to the work done since the last one. The
+# copies are written on a worker thread into a delta store:
+#
+#   output/.autosave/<name>.rmap/
+#   ├─ index.json        # metadata incl. `base_map`; only edited tiles listed
+#   ├─ tiles/...
+#   └─ annotations.json  # text, dimensions, lines and areas in cell coordinates
+#
+# A delta store with `base_map` set is restored by loading the base map and
+# overlaying the stored tiles.
+
+import json
+import os
+import shutil
+
+from PyQt5 import QtCore
+
+from map_io import write_atomic
+from map_store import MapStore, is_store
+
+
+ANNOTATIONS_NAME = 'annotations.json'
+
+
+def read_annotations(store_path):
+    try:
+        with open(os.path.join(store_path, ANNOTATIONS_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class AutosaveJob(QtCore.QThread):
+    """Writes one autosave snapshot into the delta store on a worker thread."""
+    finished_autosave = QtCore.pyqtSignal(object)
+
+    def __init__(self, store_path, snapshot, parent=None):
+        super(AutosaveJob, self).__init__(parent)
+        self.store_path = store_path
+        self.snapshot = snapshot
+
+    def run(self):
+        snap = self.snapshot
+        result = {'tiles': 0, 'error': None}
+        try:
+            height, width = snap['shape']
+            store = None
+            if not snap['full'] and not snap.get('fresh') and is_store(self.store_path):
+                store = MapStore.open(self.store_path)
+                if (store.height, store.width) != (height, width) or \
+                        store.metadata.get('base_map') != snap['metadata'].get('base_map'):
+                    store = None
+            if store is None:
+                # Start a fresh delta store (stale tiles, e.g. from an earlier
+                # session, must not leak into it)
+                shutil.rmtree(self.store_path, ignore_errors=True)
+                store = MapStore.create(self.store_path, width, height, snap['metadata'])
+            for ty, tx, cells in snap['tiles']:
+                store.write_tile(ty, tx, cells)
+            write_atomic(os.path.join(self.store_path, ANNOTATIONS_NAME),
+                         json.dumps(snap['annotations']).encode('utf-8'))
+            store.flush_index(snap['metadata'])
+            result['tiles'] = len(snap['tiles'])
+        except Exception as e:
+            result['error'] = str(e)
+        self.finished_autosave.emit(result)
+
+
+class Autosaver(QtCore.QObject):
+    """Schedules autosaves after idle time or an edit budget.
+
+    `snapshot_fn()` runs on the GUI thread and returns a snapshot dict (see
+    AutosaveJob) or None when there is nothing to save. `done_fn(snapshot,
+    result)` is called on the GUI thread after the snapshot was written.
+    """
+
+    def __init__(self, store_path, snapshot_fn, done_fn, idle_seconds=30, edit_budget=200, parent=None):
+        super(Autosaver, self).__init__(parent)
+        self.store_path = store_path
+        self.snapshot_fn = snapshot_fn
+        self.done_fn = done_fn
+        self.idle_seconds = idle_seconds
+        self.edit_budget = edit_budget
+        self.enabled = True
+        self.edits = 0
+        self._job = None
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.trigger)
+
+    def configure(self, idle_seconds=None, edit_budget=None, enabled=None):
+        if idle_seconds is not None:
+            self.idle_seconds = max(1, int(idle_seconds))
+        if edit_budget is not None:
+            self.edit_budget = max(1, int(edit_budget))
+        if enabled is not None:
+            self.enabled = bool(enabled)
+            if not self.enabled:
+                self._timer.stop()
+        if self.enabled and self.edits:
+            self._timer.start(int(self.idle_seconds * 1000))
+
+    def note_edit(self, *args):
+        """Record one edit; restarts the idle countdown (extra args from Qt signals are ignored)."""
+        if not self.enabled:
+            return
+        self.edits += 1
+        if self.edits >= self.edit_budget:
+            # Budget reached: save on the next event loop turn
+            self._timer.start(0)
+        else:
+            self._timer.start(int(self.idle_seconds * 1000))
+
+    @property
+    def busy(self):
+        return self._job is not None
+
+    def trigger(self):
+        """Take a snapshot and write it in the background (no-op if one is running)."""
+        if self._job is not None:
+            # Try again once the current write is done
+            self._timer.start(int(self.idle_seconds * 1000))
+            return
+        snapshot = self.snapshot_fn()
+        self.edits = 0
+        if snapshot is None:
+            return
+        job = AutosaveJob(self.store_path, snapshot, self)
+        job.finished_autosave.connect(lambda result: self._finished(job, snapshot, result))
+        self._job = job
+        job.start()
+
+    def wait(self):
+        if self._job is not None:
+            self._job.wait()
+
+    def _finished(self, job, snapshot, result):
+        self._job = None
+        job.deleteLater()
+        self.done_fn(snapshot, result)
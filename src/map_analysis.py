@@ -0,0 +1,778 @@
+# -*- coding: utf-8 -*-
+
+# Read-only analyses of the occupancy grid.
+#
+# Like map_ops, these work on numpy arrays (row 0 = top) and never touch Qt;
+# the editor turns their results into overlays, proposals and statistics.
+
+from collections import OrderedDict
+
+import numpy as np
+from scipy import ndimage, sparse
+from scipy.sparse import csgraph
+
+from map_ops import FREE, OCCUPIED, UNKNOWN
+from tiled_view import TILE_SIZE
+
+
+def downsample_any(mask, max_side):
+    """Shrink a boolean mask by an integer factor so its longest side is <= max_side.
+
+    A coarse cell is set when any fine cell in its block is set, so thin
+    walls survive. Returns (small_mask, factor).
+    """
+    h, w = mask.shape
+    factor = max(1, int(np.ceil(max(h, w) / float(max_side))))
+    if factor == 1:
+        return mask, 1
+    ph, pw = -h % factor, -w % factor
+    padded = np.pad(mask, ((0, ph), (0, pw)))
+    small = padded.reshape((h + ph) // factor, factor, (w + pw) // factor, factor).any(axis=(1, 3))
+    return small, factor
+
+
+def _projection_score(xs, ys, angle_deg):
+    """Sharpness of the occupied-cell projections across and along `angle_deg`.
+
+    Points on a wall running at the angle all land in the same 1-cell bin of
+    the perpendicular projection, so the sum of squared bin counts peaks when
+    the angle matches the walls (and, modulo 90°, the walls across them).
+    """
+    a = np.radians(angle_deg)
+    c, s = np.cos(a), np.sin(a)
+    score = 0.0
+    for proj in (xs * c + ys * s, ys * c - xs * s):
+        counts = np.bincount((proj - proj.min()).astype(np.int64))
+        score += float(np.dot(counts, counts))
+    return score
+
+
+def dominant_wall_angle(occupied, max_side=1024, max_points=200000, step_deg=0.5, fine_deg=0.05):
+    """Estimate the dominant wall direction of a map from its occupied cells.
+
+    Searches the angle in [0, 90) whose projections of the occupied cells
+    (downsampled so the longest side is <= max_side) are sharpest: a coarse
+    sweep in `step_deg` steps refined in `fine_deg` steps around the best
+    one. Angles are measured like QTransform.rotate (image x right, y down).
+    Returns (angle_deg, confidence) where confidence in [0, 1) says how much
+    the peak stands out from the median angle, or (None, 0.0) for an empty map.
+    """
+    small, _ = downsample_any(occupied, max_side)
+    ys, xs = np.nonzero(small)
+    if len(xs) < 2:
+        return None, 0.0
+    if len(xs) > max_points:
+        pick = np.random.default_rng(0).choice(len(xs), max_points, replace=False)
+        xs, ys = xs[pick], ys[pick]
+    xs = xs.astype(np.float64)
+    ys = ys.astype(np.float64)
+    coarse = np.arange(0.0, 90.0, step_deg)
+    scores = np.array([_projection_score(xs, ys, a) for a in coarse])
+    best = coarse[int(np.argmax(scores))]
+    fine = np.arange(best - step_deg, best + step_deg + fine_deg / 2, fine_deg)
+    fine_scores = [_projection_score(xs, ys, a) for a in fine]
+    angle = round(float(fine[int(np.argmax(fine_scores))]), 6) % 90.0
+    peak = max(fine_scores)
+    confidence = 1.0 - float(np.median(scores)) / peak if peak > 0 else 0.0
+    return angle, confidence
+
+
+def alignment_rotation(wall_angle):
+    """View rotation (degrees, in (-45, 45]) that turns walls at `wall_angle` axis-parallel."""
+    rotation = -wall_angle % 90.0
+    if rotation > 45.0:
+        rotation -= 90.0
+    return rotation
+
+
+def polygon_area(points):
+    """Area of a simple polygon [(x, y), ...] by the shoelace formula (in squared input units)."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 3:
+        return 0.0
+    x, y = pts[:, 0], pts[:, 1]
+    return abs(float(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1)))) / 2.0
+
+
+def polygon_centroid(points):
+    """Centroid (x, y) of a simple polygon; the vertex mean for degenerate ones."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    x, y = pts[:, 0], pts[:, 1]
+    cross = x * np.roll(y, -1) - np.roll(x, -1) * y
+    signed = cross.sum() / 2.0
+    if abs(signed) < 1e-9:
+        return float(x.mean()), float(y.mean())
+    return (float(((x + np.roll(x, -1)) * cross).sum() / (6.0 * signed)),
+            float(((y + np.roll(y, -1)) * cross).sum() / (6.0 * signed)))
+
+
+def region_centroids(labels, ids):
+    """Centroids [(x, y), ...] of the labelled regions `ids`, in continuous cell coordinates."""
+    if len(ids) == 0:
+        return []
+    centers = ndimage.center_of_mass(np.ones(labels.shape, dtype=np.uint8), labels, ids)
+    return [(float(cx) + 0.5, float(cy) + 0.5) for cy, cx in centers]
+
+
+def wall_edges(classes):
+    """Occupied cells with at least one free 4-neighbour (the visible faces of walls)."""
+    free = np.pad(classes == FREE, 1)
+    near_free = free[:-2, 1:-1] | free[2:, 1:-1] | free[1:-1, :-2] | free[1:-1, 2:]
+    return (classes == OCCUPIED) & near_free
+
+
+class WallSnapIndex(object):
+    """Nearest wall edge for every cell, computed per map tile on demand.
+
+    For each tile the distance transform of the wall-edge cells (with a halo
+    of `tolerance` cells around it) stores the coordinates of the nearest
+    edge cell, so a snap query is a single array lookup. Tiles are keyed by
+    the versions of the 3x3 tiles around them (the halo reaches into the
+    neighbours), so after a paint edit only the tiles it touched, and their
+    neighbours, are recomputed on the next query. At most `max_tiles` tiles
+    are kept.
+    """
+
+    def __init__(self, tolerance=6, tile_size=TILE_SIZE, max_tiles=64):
+        self.tolerance = tolerance
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+
+    def clear(self):
+        self._tiles.clear()
+
+    def _tileKey(self, ty, tx, tile_versions, lut):
+        versions = tile_versions[max(0, ty - 1):ty + 2, max(0, tx - 1):tx + 2]
+        return versions.tobytes(), lut.tobytes(), self.tolerance
+
+    def _buildTile(self, data, lut, ty, tx):
+        ts, halo = self.tile_size, self.tolerance + 1
+        h, w = data.shape
+        x0, y0 = max(0, tx * ts - halo), max(0, ty * ts - halo)
+        x1, y1 = min(w, (tx + 1) * ts + halo), min(h, (ty + 1) * ts + halo)
+        edges = wall_edges(lut[data[y0:y1, x0:x1]])
+        if not edges.any():
+            return None
+        dist, (iy, ix) = ndimage.distance_transform_edt(~edges, return_indices=True)
+        r0, c0 = ty * ts - y0, tx * ts - x0
+        r1, c1 = min(y1, (ty + 1) * ts) - y0, min(x1, (tx + 1) * ts) - x0
+        return (dist[r0:r1, c0:c1].astype(np.float32),
+                (iy[r0:r1, c0:c1] + y0).astype(np.int32),
+                (ix[r0:r1, c0:c1] + x0).astype(np.int32))
+
+    def nearest(self, data, lut, tile_versions, x, y):
+        """(ex, ey) of the nearest wall-edge cell within the tolerance of cell (x, y), or None."""
+        h, w = data.shape
+        if not (0 <= x < w and 0 <= y < h):
+            return None
+        ty, tx = y // self.tile_size, x // self.tile_size
+        key = self._tileKey(ty, tx, tile_versions, lut)
+        cached = self._tiles.get((ty, tx))
+        if cached is None or cached[0] != key:
+            cached = (key, self._buildTile(data, lut, ty, tx))
+            self._tiles[(ty, tx)] = cached
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end((ty, tx))
+        tile = cached[1]
+        if tile is None:
+            return None
+        dist, iy, ix = tile
+        r, c = y - ty * self.tile_size, x - tx * self.tile_size
+        if dist[r, c] > self.tolerance:
+            return None
+        return int(ix[r, c]), int(iy[r, c])
+
+    def snap(self, data, lut, tile_versions, px, py):
+        """Snap a continuous cell position to the face of the nearest wall; None if none is close.
+
+        The result lies on the border between the edge cell and a free
+        neighbour (on the corner when free cells are on two sides). For thin
+        walls with free cells on both sides the face towards (px, py) wins.
+        """
+        hit = self.nearest(data, lut, tile_versions, int(np.floor(px)), int(np.floor(py)))
+        if hit is None:
+            return None
+        ex, ey = hit
+        h, w = data.shape
+
+        def face(dx, dy, toward):
+            before = 0 <= ex - dx < w and 0 <= ey - dy < h and lut[data[ey - dy, ex - dx]] == FREE
+            after = 0 <= ex + dx < w and 0 <= ey + dy < h and lut[data[ey + dy, ex + dx]] == FREE
+            if before and after:
+                return 0.5 if toward >= 0 else -0.5
+            return 0.5 * (int(after) - int(before))
+        cx, cy = ex + 0.5, ey + 0.5
+        return cx + face(1, 0, px - cx), cy + face(0, 1, py - cy)
+
+
+# Squared clearances are stored as uint16, so the cap is at most 255 cells
+MAX_CLEARANCE = 255
+
+
+class ClearanceField(object):
+    """Squared distance from every cell to the nearest occupied cell, per map tile on demand.
+
+    Distances are measured between cell centers and capped at `max_dist`
+    cells, so a tile's distance transform only needs a halo of that width;
+    cells farther from any obstacle read max_dist**2 + 1. The values are
+    exact integers, which lets overlays color them with a lookup table
+    indexed by the squared distance. Tiles are keyed like WallSnapIndex, on
+    the versions of every tile the halo reaches, so an edit only costs the
+    tiles within `max_dist` of it.
+    """
+
+    def __init__(self, max_dist=64, tile_size=TILE_SIZE, max_tiles=256):
+        self.max_dist = max(1, min(int(max_dist), MAX_CLEARANCE))
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()
+
+    @property
+    def far(self):
+        """The value stored for cells with no obstacle within max_dist."""
+        return self.max_dist ** 2 + 1
+
+    @property
+    def reach(self):
+        """How many tiles away an edit can change the field."""
+        return (self.max_dist + self.tile_size - 1) // self.tile_size
+
+    def clear(self):
+        self._tiles.clear()
+
+    def affected(self, tiles, tiles_shape):
+        """The (ty, tx) tiles whose field may change when the given tiles are edited."""
+        r = self.reach
+        out = set()
+        for ty, tx in tiles:
+            for y in range(max(0, ty - r), min(tiles_shape[0], ty + r + 1)):
+                for x in range(max(0, tx - r), min(tiles_shape[1], tx + r + 1)):
+                    out.add((y, x))
+        return out
+
+    def _tileKey(self, ty, tx, tile_versions, lut):
+        r = self.reach
+        versions = tile_versions[max(0, ty - r):ty + r + 1, max(0, tx - r):tx + r + 1]
+        return versions.tobytes(), lut.tobytes(), self.max_dist
+
+    def _buildTile(self, data, lut, ty, tx):
+        ts, halo = self.tile_size, self.max_dist
+        h, w = data.shape
+        x0, y0 = max(0, tx * ts - halo), max(0, ty * ts - halo)
+        x1, y1 = min(w, (tx + 1) * ts + halo), min(h, (ty + 1) * ts + halo)
+        r0, c0 = ty * ts - y0, tx * ts - x0
+        r1, c1 = min(y1, (ty + 1) * ts) - y0, min(x1, (tx + 1) * ts) - x0
+        occupied = lut[data[y0:y1, x0:x1]] == OCCUPIED
+        if not occupied.any():
+            return np.full((r1 - r0, c1 - c0), self.far, dtype=np.uint16)
+        dist = ndimage.distance_transform_edt(~occupied)[r0:r1, c0:c1]
+        d2 = np.rint(dist * dist)
+        return np.where(d2 > self.max_dist ** 2, self.far, d2).astype(np.uint16)
+
+    def tile(self, data, lut, tile_versions, ty, tx):
+        """Squared clearances (uint16) of the cells of tile (ty, tx)."""
+        key = self._tileKey(ty, tx, tile_versions, lut)
+        cached = self._tiles.get((ty, tx))
+        if cached is None or cached[0] != key:
+            cached = (key, self._buildTile(data, lut, ty, tx))
+            self._tiles[(ty, tx)] = cached
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+        else:
+            self._tiles.move_to_end((ty, tx))
+        return cached[1]
+
+
+def clearance_levels(max_dist, resolution, threshold, max_range, levels=253):
+    """Lookup table from squared clearance (as stored by ClearanceField) to a color level.
+
+    Level 1 marks clearances below `threshold` meters, levels 2..levels+1
+    grade the rest up to `max_range` meters and levels+2 is everything
+    farther. Level 0 is left for cells the caller hides.
+    """
+    meters = np.sqrt(np.arange(max_dist ** 2 + 2, dtype=np.float64)) * resolution
+    meters[-1] = np.inf
+    graded = 2 + np.minimum(levels - 1, meters / max(max_range, 1e-9) * levels).astype(np.int64)
+    out = np.where(meters < threshold, 1, np.where(meters >= max_range, levels + 2, graded))
+    return out.astype(np.uint8)
+
+
+# Cost values of nav2's costmap_2d
+LETHAL_OBSTACLE = 254
+INSCRIBED_INFLATED_OBSTACLE = 253
+
+
+def inflation_cost_lut(max_dist, resolution, inflation_radius, cost_scaling_factor, inscribed_radius):
+    """Lookup table from squared clearance (as stored by ClearanceField) to nav2 inflation cost.
+
+    Follows nav2's InflationLayer::computeCost: lethal on obstacles,
+    inscribed within `inscribed_radius`, then 252 * exp(-cost_scaling_factor
+    * (d - inscribed_radius)), and 0 past `inflation_radius` (all in meters;
+    the radius is rounded up to whole cells as nav2 does).
+    """
+    cells = np.sqrt(np.arange(max_dist ** 2 + 2, dtype=np.float64))
+    cells[-1] = np.inf
+    meters = cells * resolution
+    with np.errstate(over='ignore', invalid='ignore'):
+        decay = (INSCRIBED_INFLATED_OBSTACLE - 1) * np.exp(-cost_scaling_factor * (meters - inscribed_radius))
+    cost = np.where(meters <= inscribed_radius, INSCRIBED_INFLATED_OBSTACLE, np.nan_to_num(decay))
+    cost[0] = LETHAL_OBSTACLE
+    cost[cells > np.ceil(max(0.0, inflation_radius) / resolution)] = 0
+    return cost.astype(np.uint8)
+
+
+# Traversal cost of a cell the path checker may not enter
+BLOCKED = 255
+
+
+class PathGrid(object):
+    """Per-cell traversal costs for the path checker, refreshed tile by tile.
+
+    `cost` holds 0 on free cells (or their inflation cost, 1..252, when an
+    inflation tile source is given) and BLOCKED everywhere else. An update
+    only recomputes the tiles whose versions changed, grown by `reach` tiles
+    for inflation whose halo looks into the neighbours. `version` counts
+    updates that changed anything, so graphs and search trees built from an
+    older grid can be recognized.
+    """
+
+    def __init__(self, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.cost = None
+        self.version = 0
+        self._versions = None
+        self._key = None
+
+    def clear(self):
+        self.cost = None
+        self._versions = None
+        self.version += 1
+
+    def update(self, data, lut, tile_versions, inflation=None, key=None, reach=0):
+        """Bring `cost` up to date; True if it changed.
+
+        `inflation(ty, tx)` returns the nav2 costs (uint8) of a tile and `key`
+        identifies its parameters (a new key recomputes every tile).
+        """
+        if self.cost is None or self.cost.shape != data.shape or key != self._key \
+                or self._versions.shape != tile_versions.shape:
+            self.cost = np.full(data.shape, BLOCKED, dtype=np.uint8)
+            dirty = np.ones(tile_versions.shape, dtype=bool)
+        else:
+            dirty = tile_versions != self._versions
+            if reach and dirty.any():
+                dirty = ndimage.binary_dilation(dirty, structure=np.ones((3, 3), dtype=bool), iterations=reach)
+        if not dirty.any():
+            return False
+        ts = self.tile_size
+        h, w = data.shape
+        for ty, tx in zip(*np.nonzero(dirty)):
+            y0, x0 = ty * ts, tx * ts
+            y1, x1 = min(h, y0 + ts), min(w, x0 + ts)
+            free = lut[data[y0:y1, x0:x1]] == FREE
+            if inflation is None:
+                self.cost[y0:y1, x0:x1] = np.where(free, 0, BLOCKED)
+            else:
+                costs = inflation(ty, tx)
+                self.cost[y0:y1, x0:x1] = np.where(free & (costs < INSCRIBED_INFLATED_OBSTACLE), costs, BLOCKED)
+        self._versions = tile_versions.copy()
+        self._key = key
+        self.version += 1
+        return True
+
+
+def grid_graph(cost, cost_weight=1.0):
+    """8-connected graph over the enterable cells of a PathGrid cost array.
+
+    Returns (graph, node_of, cells): an upper-triangular CSR matrix for an
+    undirected search, the node id of every cell (-1 when blocked) and the
+    flat cell index of every node. A step weighs its length in cells times
+    1 + cost_weight * (mean cost of its two cells) / 252. Diagonal steps need
+    both orthogonal neighbours enterable, so paths never cut wall corners.
+    """
+    h, w = cost.shape
+    ok = cost != BLOCKED
+    cells = np.flatnonzero(ok)
+    node_of = np.full(h * w, -1, dtype=np.int32)
+    node_of[cells] = np.arange(len(cells), dtype=np.int32)
+    node_of = node_of.reshape(h, w)
+    penalty = 1.0 + cost_weight * cost.astype(np.float32) / (INSCRIBED_INFLATED_OBSTACLE - 1)
+    rows, cols, weights = [], [], []
+    every = slice(None)
+    head, tail = slice(0, -1), slice(1, None)
+    steps = (
+        ((every, head), (every, tail), 1.0, None),                                 # right
+        ((head, every), (tail, every), 1.0, None),                                 # down
+        ((head, head), (tail, tail), np.sqrt(2.0), ok[:-1, 1:] & ok[1:, :-1]),     # down-right
+        ((head, tail), (tail, head), np.sqrt(2.0), ok[:-1, :-1] & ok[1:, 1:]),     # down-left
+    )
+    for a, b, length, corners in steps:
+        m = ok[a] & ok[b]
+        if corners is not None:
+            m &= corners
+        rows.append(node_of[a][m])
+        cols.append(node_of[b][m])
+        weights.append(length * 0.5 * (penalty[a][m] + penalty[b][m]))
+    n = len(cells)
+    graph = sparse.csr_matrix((np.concatenate(weights).astype(np.float64),
+                               (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+    return graph, node_of, cells
+
+
+def path_tree(graph, start_node):
+    """Shortest-path tree from one node: the predecessor of every node (negative when unreachable)."""
+    _, pred = csgraph.dijkstra(graph, directed=False, indices=start_node, return_predecessors=True)
+    return pred
+
+
+def trace_path(pred, cells, width, start_node, goal_node):
+    """Cells [(x, y), ...] from the start to the goal along a path tree, or None if unreachable."""
+    nodes = [goal_node]
+    while nodes[-1] != start_node:
+        prev = pred[nodes[-1]]
+        if prev < 0:
+            return None
+        nodes.append(prev)
+    ys, xs = np.divmod(cells[np.asarray(nodes[::-1])], width)
+    return np.stack([xs, ys], axis=1)
+
+
+def path_length(points):
+    """Length of a polyline [(x, y), ...] in its own units."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 2:
+        return 0.0
+    return float(np.hypot(*np.diff(points, axis=0).T).sum())
+
+
+def _march(classes, ox, oy, angles_deg, max_len, through, step=0.5, max_samples=1 << 22):
+    """March rays while they stay in cells of class `through`.
+
+    Returns (dist, stop): the distance to the entry face of the first cell
+    of another class (NaN when there is none within `max_len`) and that
+    cell's class (UNKNOWN outside the map).
+    """
+    ox, oy, angles = np.broadcast_arrays(np.asarray(ox, dtype=np.float64), np.asarray(oy, dtype=np.float64),
+                                         np.radians(np.asarray(angles_deg, dtype=np.float64)))
+    ox, oy, angles = ox.ravel(), oy.ravel(), angles.ravel()
+    h, w = classes.shape
+    # A border of UNKNOWN lets positions outside the map be clipped onto it
+    padded = np.pad(classes, 1, constant_values=UNKNOWN).ravel()
+    t = (np.arange(1, int(np.ceil(max_len / step)) + 1) * step).astype(np.float32)
+    dist = np.full(len(ox), np.nan)
+    stop_cls = np.full(len(ox), UNKNOWN, dtype=classes.dtype)
+    chunk = max(1, max_samples // len(t))
+    for i0 in range(0, len(ox), chunk):
+        sl = slice(i0, i0 + chunk)
+        x, y = ox[sl], oy[sl]
+        dx, dy = np.cos(angles[sl]), np.sin(angles[sl])
+        dx[np.abs(dx) < 1e-12] = 0.0
+        dy[np.abs(dy) < 1e-12] = 0.0
+        # Padded coordinates are >= 0 inside the map, so truncation is floor there
+        px = np.clip((x + 1)[:, None].astype(np.float32) + t * dx[:, None].astype(np.float32), 0, w + 1)
+        py = np.clip((y + 1)[:, None].astype(np.float32) + t * dy[:, None].astype(np.float32), 0, h + 1)
+        flat = py.astype(np.int32) * (w + 2) + px.astype(np.int32)
+        cls = padded[flat]
+        other = cls != through
+        first = np.argmax(other, axis=1)
+        rows = np.arange(len(x))
+        found = other[rows, first]
+        # Exact entry into the stopping cell: the later of the two axis crossings
+        hy, hx = np.divmod(flat[rows, first], w + 2)
+        hx, hy = hx - 1, hy - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tx = np.where(dx != 0, (hx + (dx < 0) - x) / dx, -np.inf)
+            ty = np.where(dy != 0, (hy + (dy < 0) - y) / dy, -np.inf)
+        enter = np.maximum(np.maximum(tx, ty), 0.0)
+        found &= enter <= max_len
+        dist[sl] = np.where(found, enter, np.nan)
+        stop_cls[sl] = np.where(found, cls[rows, first], UNKNOWN)
+    return dist, stop_cls
+
+
+def cast_rays(classes, ox, oy, angles_deg, max_len, step=0.5):
+    """Cast rays from continuous cell positions (ox, oy) at angles_deg until they hit a wall.
+
+    Angles follow the view convention (0° = +x, 90° = +y, i.e. down). A ray
+    stops at the first cell that is not free; it hits when that cell is
+    occupied and lies within `max_len` cells. Returns (dist, hit) where dist
+    is the distance from the origin to the face of the occupied cell (NaN
+    when there is no hit). Any number of rays are cast in one vectorized
+    pass (internally in batches of bounded memory).
+    """
+    dist, stop = _march(classes, ox, oy, angles_deg, max_len, FREE, step)
+    hit = stop == OCCUPIED
+    dist[~hit] = np.nan
+    return dist, hit
+
+
+def detect_doorways(classes, min_width, max_width, angle_deg=0.0, depth=None, jamb=None, ratio=1.5,
+                    stride=None, progress=None, cancelled=None):
+    """Find doorway gaps in walls; returns a list of (x0, y0, x1, y1) jamb-to-jamb segments.
+
+    Works in the frame of `angle_deg` (the dominant wall angle); all sizes
+    are in cells. Seeds on a grid of free cells cast rays both ways along
+    each wall direction. A seed is in a doorway when
+      - the free span through it is between min_width and max_width,
+      - the wall goes on past both ends of the span for at least `jamb`
+        cells (so clutter standing near a wall does not count), and
+      - `depth` cells to either side, across the wall, the cells are free
+        and the span is at least `ratio` times wider or open (the rooms
+        the door connects).
+    Overlapping detections are merged, keeping the narrowest span.
+    `progress(done, total)` is called per wall direction; returns None when
+    `cancelled()` became true.
+    """
+    h, w = classes.shape
+    depth = depth if depth is not None else max_width / 2.0
+    jamb = jamb if jamb is not None else min_width / 2.0
+    stride = stride or max(1, int(round(min_width / 6.0)))
+    free = classes == FREE
+    # Door centers are at most max_width / 2 from a jamb
+    clearance = ndimage.distance_transform_edt(free[::stride, ::stride]) * stride
+    gy, gx = np.nonzero(free[::stride, ::stride] & (clearance <= max_width / 2.0 + stride))
+    sx, sy = gx * stride + 0.5, gy * stride + 0.5
+    found = []
+    for step, axis in enumerate((angle_deg, angle_deg + 90.0)):
+        if cancelled is not None and cancelled():
+            return None
+        if progress is not None:
+            progress(step, 2)
+        if len(sx) == 0:
+            break
+        a = np.radians(axis)
+        ux, uy = np.cos(a), np.sin(a)
+        vx, vy = -uy, ux
+        # Stage 1: span through every seed
+        fwd, fwd_hit = cast_rays(classes, sx, sy, axis, max_width + 1)
+        back, back_hit = cast_rays(classes, sx, sy, axis + 180.0, max_width + 1)
+        width = fwd + back
+        with np.errstate(invalid='ignore'):
+            idx = np.flatnonzero(fwd_hit & back_hit & (width >= min_width) & (width <= max_width))
+        if len(idx) == 0:
+            continue
+        x, y, f, b, wd = sx[idx], sy[idx], fwd[idx], back[idx], width[idx]
+        # Stage 2 (candidates only): the wall continues past both jambs ...
+        eps = 0.25
+        jx = np.concatenate([x + (f + eps) * ux, x - (b + eps) * ux])
+        jy = np.concatenate([y + (f + eps) * uy, y - (b + eps) * uy])
+        run, _ = _march(classes, jx, jy, np.concatenate([np.full(len(x), axis), np.full(len(x), axis + 180.0)]),
+                        jamb, OCCUPIED)
+        walls = np.isnan(run).reshape(2, -1).all(axis=0)
+        # ... and opens up on both sides across the wall
+        side_x = np.concatenate([x + depth * vx, x - depth * vx])
+        side_y = np.concatenate([y + depth * vy, y - depth * vy])
+        reach = ratio * max_width + 1
+        sf, sf_hit = cast_rays(classes, side_x, side_y, axis, reach)
+        sb, sb_hit = cast_rays(classes, side_x, side_y, axis + 180.0, reach)
+        cx = np.clip(np.floor(side_x).astype(np.int64), 0, w - 1)
+        cy = np.clip(np.floor(side_y).astype(np.int64), 0, h - 1)
+        with np.errstate(invalid='ignore'):
+            opens = free[cy, cx] & (~(sf_hit & sb_hit) | (sf + sb >= ratio * np.tile(wd, 2)))
+        door = walls & opens.reshape(2, -1).all(axis=0)
+        for i in np.flatnonzero(door):
+            found.append((wd[i], x[i] - b[i] * ux, y[i] - b[i] * uy, x[i] + f[i] * ux, y[i] + f[i] * uy))
+    # Merge: narrowest first, drop detections whose middle is near a kept one
+    found.sort()
+    kept = []
+    for wd, x0, y0, x1, y1 in found:
+        mx, my = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+        if all(np.hypot(mx - kx, my - ky) > max(wd, kw) / 2.0 for kw, kx, ky, _ in kept):
+            kept.append((wd, mx, my, (x0, y0, x1, y1)))
+    return [seg for _, _, _, seg in kept]
+
+
+def _normal(xs, ys):
+    """Unit normal of the total least squares line through points (xs, ys)."""
+    if len(xs) < 2:
+        return 0.0, 1.0
+    evals, evecs = np.linalg.eigh(np.cov(np.stack([xs - xs.mean(), ys - ys.mean()])))
+    return evecs[0, 0], evecs[1, 0]
+
+
+def _hough_votes(acc, px, py, cos_t, sin_t, offset, sign=1, chunk=1 << 14):
+    """Add (sign=1) or remove (sign=-1) the votes of points (px, py) in the (theta, rho) accumulator."""
+    n_theta, n_rho = acc.shape
+    cols = np.arange(n_theta) * n_rho
+    for i in range(0, len(px), chunk):
+        rho = px[i:i + chunk, None] * cos_t + py[i:i + chunk, None] * sin_t
+        flat = (np.floor(rho).astype(np.int64) + offset + cols).ravel()
+        acc += sign * np.bincount(flat, minlength=acc.size).reshape(acc.shape).astype(acc.dtype)
+
+
+def detect_wall_lines(classes, min_length, band=1.5, max_gap=3.0, snap_angle=None, snap_deg=10.0,
+                      theta_step=1.0, max_lines=5000, progress=None, cancelled=None):
+    """Find straight wall faces with a progressive Hough transform on the wall edge cells.
+
+    The strongest (theta, rho) bin is taken repeatedly; the remaining edge
+    cells within `band` of that line are split where they are more than
+    `max_gap` apart, and every run at least `min_length` long becomes a
+    segment fitted to its cells (all sizes in cells). The line's cells then
+    stop voting, so each pass consumes at least `min_length / 2` cells. When
+    `snap_angle` is given (degrees, like dominant_wall_angle), segments
+    within `snap_deg` of it or of its perpendicular are turned parallel to it.
+
+    Returns (segments, sides): segments is an (n, 4) array of x0, y0, x1, y1
+    cell positions along the face; sides says where the free space is: +1
+    on the (-dy, dx) side of the direction (dx, dy), -1 on the other side, 0
+    on both (a wall one cell thin). Returns None when `cancelled()` became
+    true.
+    """
+    edges = wall_edges(classes)
+    ys, xs = np.nonzero(edges)
+    px, py = xs + 0.5, ys + 0.5
+    h, w = classes.shape
+    # Direction of the free neighbours of each edge cell, for the sides
+    free = np.pad(classes == FREE, 1)
+    fx = free[ys + 1, xs + 2].astype(np.int8) - free[ys + 1, xs]
+    fy = free[ys + 2, xs + 1].astype(np.int8) - free[ys, xs + 1]
+
+    thetas = np.radians(np.arange(0.0, 180.0, theta_step))
+    cos_t, sin_t = np.cos(thetas), np.sin(thetas)
+    offset = w + 1
+    acc = np.zeros((len(thetas), int(np.hypot(h, w)) + w + 3), dtype=np.int32)
+    _hough_votes(acc, px, py, cos_t, sin_t, offset)
+    alive = np.ones(len(px), dtype=bool)
+    min_votes = max(2, int(min_length / 2))
+    snaps = None
+    if snap_angle is not None:
+        snaps = np.radians(np.array([snap_angle, snap_angle + 90.0]) % 180.0)
+
+    segments, sides = [], []
+    total = len(px)
+    while len(segments) < max_lines:
+        if cancelled is not None and cancelled():
+            return None
+        peak = int(np.argmax(acc))
+        ti, ri = divmod(peak, acc.shape[1])
+        if acc[ti, ri] < min_votes:
+            break
+        rho = ri - offset + 0.5
+        idx = np.flatnonzero(alive)
+        near = idx[np.abs(px[idx] * cos_t[ti] + py[idx] * sin_t[ti] - rho) <= band]
+        if len(near) < 2:
+            acc[ti, ri] = 0
+            continue
+        # The bin is coarse: refit the line to its cells and gather them again
+        nx, ny = _normal(px[near], py[near])
+        rho = np.median(px[near] * nx + py[near] * ny)
+        near = idx[np.abs(px[idx] * nx + py[idx] * ny - rho) <= band]
+        # Order along the line and split at gaps
+        along = -px[near] * ny + py[near] * nx
+        order = np.argsort(along)
+        near, along = near[order], along[order]
+        cuts = np.flatnonzero(np.diff(along) > max_gap) + 1
+        for run in np.split(np.arange(len(near)), cuts):
+            if along[run[-1]] - along[run[0]] + 1 < min_length:
+                continue
+            rx, ry = px[near[run]], py[near[run]]
+            cx, cy = rx.mean(), ry.mean()
+            nx, ny = _normal(rx, ry)
+            ux, uy = ny, -nx
+            phi = np.arctan2(uy, ux) % np.pi
+            if snaps is not None:
+                diff = np.abs((phi - snaps + np.pi / 2) % np.pi - np.pi / 2)
+                k = int(np.argmin(diff))
+                if np.degrees(diff[k]) <= snap_deg:
+                    phi = snaps[k]
+                    ux, uy = np.cos(phi), np.sin(phi)
+            nx, ny = -uy, ux
+            # The face sits at the median offset of the run's cells (robust to protrusions)
+            off = np.median((rx - cx) * nx + (ry - cy) * ny)
+            cx, cy = cx + off * nx, cy + off * ny
+            t = (rx - cx) * ux + (ry - cy) * uy
+            t0, t1 = t.min() - 0.5, t.max() + 0.5
+            segments.append((cx + t0 * ux, cy + t0 * uy, cx + t1 * ux, cy + t1 * uy))
+            # Which side of the face the free neighbours are on
+            facing = fx[near[run]] * nx + fy[near[run]] * ny
+            left, right = int((facing > 0.5).sum()), int((facing < -0.5).sum())
+            sides.append(1 if left > 3 * right else -1 if right > 3 * left else 0)
+        _hough_votes(acc, px[near], py[near], cos_t, sin_t, offset, sign=-1)
+        alive[near] = False
+        if progress is not None:
+            progress(total - int(alive.sum()), total)
+    return np.array(segments, dtype=np.float64).reshape(-1, 4), np.array(sides, dtype=np.int8)
+
+
+# Class of reference cells that fall outside the reference map
+OUTSIDE = 3
+# Per-cell diff codes, see class_diff
+DIFF_SAME, DIFF_ADDED, DIFF_REMOVED, DIFF_CHANGED = 0, 1, 2, 3
+DIFF_KINDS = {DIFF_ADDED: 'added', DIFF_REMOVED: 'removed', DIFF_CHANGED: 'changed'}
+
+
+def align_classes(classes, resolution, origin, shape, dst_resolution, dst_origin, max_cells=1 << 22):
+    """Sample a map's class array onto another grid through their YAML origins.
+
+    `classes` belongs to a map with `resolution` and `origin` (x, y, yaw);
+    the result has `shape` and the destination's resolution and origin. Each
+    destination cell takes the class under its center (nearest neighbor),
+    or OUTSIDE beyond the source map. Grids that only differ by a whole
+    number of cells are copied by slicing; others are sampled in bands of
+    about `max_cells` cells.
+    """
+    h, w = shape
+    sh, sw = classes.shape
+    ox, oy, oyaw = (tuple(origin) + (0.0,))[:3]
+    dx, dy, dyaw = (tuple(dst_origin) + (0.0,))[:3]
+    out = np.full(shape, OUTSIDE, dtype=np.uint8)
+    # Offset of the destination's bottom-left corner in source cells (source frame)
+    c, s = np.cos(oyaw), np.sin(oyaw)
+    ex, ey = dx - ox, dy - oy
+    shift_x = (ex * c + ey * s) / resolution
+    shift_y = (-ex * s + ey * c) / resolution
+    whole = np.round([shift_x, shift_y])
+    if (np.isclose(resolution, dst_resolution) and np.isclose((dyaw - oyaw) % (2 * np.pi), 0.0, atol=1e-9)
+            and np.allclose([shift_x, shift_y], whole, atol=1e-6)):
+        col0 = int(whole[0])
+        # Rows count from the top; the corners are at the bottom
+        row0 = sh - h - int(whole[1])
+        r0, r1 = max(0, -row0), min(h, sh - row0)
+        c0, c1 = max(0, -col0), min(w, sw - col0)
+        if r0 < r1 and c0 < c1:
+            out[r0:r1, c0:c1] = classes[r0 + row0:r1 + row0, c0 + col0:c1 + col0]
+        return out
+    band = max(1, max_cells // max(1, w))
+    dc, ds = np.cos(dyaw), np.sin(dyaw)
+    mx = (np.arange(w) + 0.5) * dst_resolution
+    for y0 in range(0, h, band):
+        y1 = min(h, y0 + band)
+        my = (h - (np.arange(y0, y1) + 0.5))[:, None] * dst_resolution
+        wx = dx + mx[None, :] * dc - my * ds - ox
+        wy = dy + mx[None, :] * ds + my * dc - oy
+        lx = (wx * c + wy * s) / resolution
+        ly = (-wx * s + wy * c) / resolution
+        cols = np.floor(lx).astype(np.int64)
+        rows = sh - 1 - np.floor(ly).astype(np.int64)
+        inside = (cols >= 0) & (cols < sw) & (rows >= 0) & (rows < sh)
+        block = out[y0:y1]
+        block[inside] = classes[rows[inside], cols[inside]]
+    return out
+
+
+# DIFF_* code for reference class * 3 + current class
+_DIFF_LUT = np.array([
+    # current: occupied, unknown, free
+    DIFF_SAME, DIFF_REMOVED, DIFF_REMOVED,    # reference occupied
+    DIFF_ADDED, DIFF_SAME, DIFF_CHANGED,      # reference unknown
+    DIFF_ADDED, DIFF_CHANGED, DIFF_SAME,      # reference free
+    DIFF_SAME, DIFF_SAME, DIFF_SAME,          # outside the reference
+], dtype=np.uint8)
+
+
+def class_diff(reference, current):
+    """Per-cell DIFF_* codes between two aligned class arrays.
+
+    Added and removed refer to occupied cells (new or gone obstacles);
+    changed is any other class change (free <-> unknown). Cells OUTSIDE the
+    reference are not compared.
+    """
+    return _DIFF_LUT[reference.astype(np.intp) * 3 + current]
+
+
+def diff_counts(reference, current):
+    """Cell counts per DIFF_* code (an array indexed by code)."""
+    return np.bincount(class_diff(reference, current).ravel(), minlength=4)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+# Map library browser panel.
+#
+# Shows the maps indexed by MapLibrary as a thumbnail grid. The persisted
+# index is displayed immediately; an incremental rescan and thumbnail
+# rendering then run on worker threads and update the grid as they finish.
+
+import os
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+from map_library import THUMB_SIZE, MapLibrary
+
+
+class LibraryScanJob(QtCore.QThread):
+    """Runs MapLibrary.scan_entries() off the GUI thread; the result is applied by the receiver."""
+    finished_scan = QtCore.pyqtSignal(object)
+
+    def __init__(self, library, parent=None):
+        super(LibraryScanJob, self).__init__(parent)
+        self.library = library
+
+    def run(self):
+        try:
+            result = self.library.scan_entries()
+        except Exception as e:
+            result = e
+        self.finished_scan.emit(result)
+
+
+class ThumbnailLoader(QtCore.QThread):
+    """Renders (or finds cached) thumbnails for a list of entries, in order."""
+    thumbnail_ready = QtCore.pyqtSignal(str, str)  # map path, thumbnail path
+
+    def __init__(self, library, entries, parent=None):
+        super(ThumbnailLoader, self).__init__(parent)
+        self.library = library
+        self.entries = list(entries)
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        for entry in self.entries:
+            if self._cancelled:
+                return
+            thumb = self.library.ensure_thumbnail(entry)
+            if thumb:
+                self.thumbnail_ready.emit(entry['path'], thumb)
+
+
+def describe_entry(entry):
+    """One-line summary of a library entry for labels and tooltips."""
+    parts = []
+    if entry.get('width'):
+        parts.append(f"{entry['width']}x{entry['height']}")
+    if entry.get('resolution'):
+        parts.append(f"{entry['resolution']} m/cell")
+    origin = entry.get('origin')
+    if origin:
+        parts.append("origin (" + ", ".join(f"{v:g}" for v in origin[:2]) + ")")
+    if entry.get('error'):
+        parts.append(f"⚠️ {entry['error']}")
+    elif not entry.get('yaml') and entry.get('format') != 'rmap':
+        parts.append("⚠️ no YAML")
+    return ' · '.join(parts)
+
+
+class MapBrowserPanel(QtWidgets.QDockWidget):
+    """Dock widget listing indexed maps; double-click emits `mapActivated(path)`."""
+    mapActivated = QtCore.pyqtSignal(str)
+
+    def __init__(self, directories, parent=None, library=None):
+        super(MapBrowserPanel, self).__init__("🗂️ Map Library", parent)
+        self.setObjectName("mapBrowserDock")
+        self.library = library or MapLibrary()
+        for d in directories:
+            self.library.add_directory(d)
+        self._items = {}
+        self._scan_job = None
+        self._thumb_job = None
+
+        body = QtWidgets.QWidget(self)
+        layout = QtWidgets.QVBoxLayout(body)
+        layout.setContentsMargins(6, 6, 6, 6)
+
+        self.filterEdit = QtWidgets.QLineEdit(body)
+        self.filterEdit.setPlaceholderText("Filter maps…")
+        self.filterEdit.textChanged.connect(self.applyFilter)
+
+        self.listWidget = QtWidgets.QListWidget(body)
+        self.listWidget.setViewMode(QtWidgets.QListView.IconMode)
+        self.listWidget.setIconSize(QtCore.QSize(THUMB_SIZE, THUMB_SIZE))
+        self.listWidget.setGridSize(QtCore.QSize(THUMB_SIZE + 24, THUMB_SIZE + 36))
+        self.listWidget.setResizeMode(QtWidgets.QListView.Adjust)
+        self.listWidget.setMovement(QtWidgets.QListView.Static)
+        self.listWidget.setUniformItemSizes(True)
+        self.listWidget.setLayoutMode(QtWidgets.QListView.Batched)
+        self.listWidget.setWordWrap(True)
+        self.listWidget.itemDoubleClicked.connect(self._onItemActivated)
+        self.listWidget.currentItemChanged.connect(self._onCurrentChanged)
+
+        self.infoLbl = QtWidgets.QLabel("", body)
+        self.infoLbl.setWordWrap(True)
+
+        btnRow = QtWidgets.QHBoxLayout()
+        self.addFolderBtn = QtWidgets.QPushButton("➕ Add Folder", body)
+        self.addFolderBtn.clicked.connect(self.addFolder)
+        self.rescanBtn = QtWidgets.QPushButton("🔄 Rescan", body)
+        self.rescanBtn.clicked.connect(self.rescan)
+        btnRow.addWidget(self.addFolderBtn)
+        btnRow.addWidget(self.rescanBtn)
+
+        layout.addWidget(self.filterEdit)
+        layout.addWidget(self.listWidget)
+        layout.addWidget(self.infoLbl)
+        layout.addLayout(btnRow)
+        self.setWidget(body)
+
+        # Show what we already know, then refresh in the background
+        self.populate()
+        self.rescan()
+
+    def populate(self):
+        """Rebuild the list from the library index (thumbnails are filled in later)."""
+        current = self.listWidget.currentItem()
+        current_path = current.data(Qt.UserRole) if current is not None else None
+        self.listWidget.setUpdatesEnabled(False)
+        try:
+            self.listWidget.clear()
+            self._items = {}
+            for entry in self.library.sorted_entries():
+                item = QtWidgets.QListWidgetItem(entry['name'])
+                item.setData(Qt.UserRole, entry['path'])
+                item.setToolTip(f"{entry['path']}\n{describe_entry(entry)}")
+                thumb = self.library.thumbnail_path(entry)
+                if os.path.exists(thumb):
+                    item.setIcon(QtGui.QIcon(thumb))
+                self.listWidget.addItem(item)
+                self._items[entry['path']] = item
+                if entry['path'] == current_path:
+                    self.listWidget.setCurrentItem(item)
+        finally:
+            self.listWidget.setUpdatesEnabled(True)
+        self.applyFilter(self.filterEdit.text())
+        self._loadThumbnails()
+
+    def applyFilter(self, text):
+        text = (text or '').lower()
+        for path, item in self._items.items():
+            item.setHidden(bool(text) and text not in path.lower())
+
+    def rescan(self):
+        if self._scan_job is not None:
+            return
+        self.infoLbl.setText(f"Scanning {len(self.library.directories)} folder(s)…")
+        job = LibraryScanJob(self.library, self)
+        job.finished_scan.connect(lambda result: self._onScanFinished(job, result))
+        self._scan_job = job
+        job.start()
+
+    def _onScanFinished(self, job, result):
+        self._scan_job = None
+        job.deleteLater()
+        if isinstance(result, Exception):
+            self.infoLbl.setText(f"❌ Scan failed: {result}")
+            return
+        # Swap the new index in here, on the GUI thread that reads it
+        try:
+            added, updated, removed = self.library.apply_scan(result)
+        except OSError as e:
+            self.infoLbl.setText(f"❌ Cannot save the map index: {e}")
+            return
+        if added or updated or removed or len(self._items) != len(self.library.entries):
+            self.populate()
+        self.infoLbl.setText(f"{len(self.library.entries)} maps "
+                             f"(+{added} new, {updated} changed, -{removed} removed)")
+
+    def _loadThumbnails(self):
+        if self._thumb_job is not None:
+            self._thumb_job.cancel()
+            self._thumb_job.wait()
+            self._thumb_job = None
+        missing = [e for e in self.library.sorted_entries()
+                   if e['path'] in self._items and self._items[e['path']].icon().isNull()]
+        if not missing:
+            return
+        job = ThumbnailLoader(self.library, missing, self)
+        job.thumbnail_ready.connect(self._onThumbnail)
+        self._thumb_job = job
+        job.start()
+
+    def _onThumbnail(self, path, thumb):
+        item = self._items.get(path)
+        if item is not None:
+            item.setIcon(QtGui.QIcon(thumb))
+
+    def _onCurrentChanged(self, item, previous):
+        if item is None:
+            return
+        entry = self.library.entries.get(item.data(Qt.UserRole))
+        if entry is not None:
+            self.infoLbl.setText(f"{entry['name']}: {describe_entry(entry)}")
+
+    def _onItemActivated(self, item):
+        self.mapActivated.emit(item.data(Qt.UserRole))
+
+    def addFolder(self):
+        path = QtWidgets.QFileDialog.getExistingDirectory(self, "Add map folder")
+        if path:
+            self.library.add_directory(path)
+            self.rescan()
+
+    def shutdown(self):
+        """Stop worker threads (call before the window closes)."""
+        if self._thumb_job is not None:
+            self._thumb_job.cancel()
+            self._thumb_job.wait()
+        if self._scan_job is not None:
+            self._scan_job.wait()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+# Map image readers for ROS Map Studio.
+#
+# Every reader decodes into the editor's internal model: a 2D numpy array of
+# uint8 cells (row 0 is the top of the image, like a PGM). Readers are looked
+# up by the magic bytes of the (possibly gzip-compressed) stream, so new
+# formats can be added with `register_reader` without touching the editor.
+
+import gzip
+import os
+
+import numpy as np
+import yaml
+from PIL import Image
+
+
+# Bytes decoded per chunk while streaming PNM data
+CHUNK_BYTES = 1 << 20
+
+# Suffixes tried (in order) when resolving a bare map name
+MAP_SUFFIXES = ('.pgm', '.pgm.gz', '.png')
+
+PNG_MAGIC = b'\x89PNG'
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class MapFormatError(Exception):
+    """Raised when a map file cannot be decoded."""
+
+
+class DepthMapping(object):
+    """Maps samples with a maxval other than 255 into the 8-bit model.
+
+    Modes:
+      - 'scale':  linear rescale of 0..maxval onto 0..255 (default)
+      - 'shift':  keep the most significant 8 bits (16-bit data only)
+      - 'window': linear rescale of low..high onto 0..255, clipped
+    """
+    MODES = ('scale', 'shift', 'window')
+
+    def __init__(self, mode='scale', low=None, high=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown depth mapping mode: {mode}")
+        if mode == 'window' and (low is None or high is None or high <= low):
+            raise ValueError("Window mapping needs low < high")
+        self.mode = mode
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def parse(cls, spec):
+        """Build a mapping from a spec such as 'scale', 'shift' or 'window:1000:4000'."""
+        parts = str(spec).split(':')
+        if parts[0] == 'window':
+            if len(parts) != 3:
+                raise ValueError("Window mapping spec must be 'window:low:high'")
+            return cls('window', float(parts[1]), float(parts[2]))
+        return cls(parts[0])
+
+    def apply(self, samples, maxval):
+        """Return `samples` (any integer array) mapped to uint8."""
+        if maxval == 255 and self.mode != 'window':
+            return samples.astype(np.uint8, copy=False)
+        if self.mode == 'shift' and maxval > 255:
+            bits = int(maxval).bit_length()
+            return (samples >> (bits - 8)).astype(np.uint8)
+        if self.mode == 'window':
+            low, high = self.low, self.high
+        else:
+            low, high = 0.0, float(maxval)
+        scaled = (samples.astype(np.float32) - low) * (255.0 / (high - low))
+        return np.clip(np.rint(scaled), 0, 255).astype(np.uint8)
+
+
+_READERS = []
+
+
+def register_reader(name, probe, reader):
+    """Register a reader.
+
+    `probe(magic)` receives the first bytes of the decompressed stream and
+    returns True if the reader handles it. `reader(stream, path, mapping)`
+    returns `(data, info)`.
+    """
+    _READERS.append((name, probe, reader))
+
+
+def _read_header_tokens(stream, count):
+    """Read `count` whitespace separated PNM header tokens, skipping comments.
+
+    Leaves the stream positioned on the single whitespace byte that ends the
+    last token (which the caller consumes for binary formats).
+    """
+    tokens = []
+    token = b''
+    while len(tokens) < count:
+        ch = stream.read(1)
+        if not ch:
+            raise MapFormatError("Unexpected end of file in PNM header")
+        if ch == b'#' and not token:
+            while ch not in (b'\n', b'\r', b''):
+                ch = stream.read(1)
+            continue
+        if ch.isspace():
+            if token:
+                tokens.append(token)
+                token = b''
+            continue
+        token += ch
+    return [int(t) for t in tokens]
+
+
+def _read_pnm_header(stream):
+    magic = stream.read(2)
+    if magic not in (b'P2', b'P5'):
+        raise MapFormatError("Not a grayscale PNM (P2/P5) file")
+    width, height, maxval = _read_header_tokens(stream, 3)
+    if width <= 0 or height <= 0 or not (0 < maxval < 65536):
+        raise MapFormatError(f"Invalid PNM header: {width}x{height} maxval {maxval}")
+    return magic.decode('ascii'), width, height, maxval
+
+
+def _read_p5(stream, path, mapping):
+    fmt, width, height, maxval = _read_pnm_header(stream)
+    dtype = np.dtype('>u2') if maxval > 255 else np.dtype(np.uint8)
+    row_bytes = width * dtype.itemsize
+    rows_per_chunk = max(1, CHUNK_BYTES // row_bytes)
+    data = np.empty((height, width), dtype=np.uint8)
+    row = 0
+    while row < height:
+        n = min(rows_per_chunk, height - row)
+        buf = stream.read(n * row_bytes)
+        if len(buf) != n * row_bytes:
+            raise MapFormatError(f"Truncated PGM data in {path}")
+        samples = np.frombuffer(buf, dtype=dtype).reshape(n, width)
+        data[row:row + n] = mapping.apply(samples, maxval)
+        row += n
+    return data, {'format': fmt, 'maxval': maxval}
+
+
+def _read_p2(stream, path, mapping):
+    fmt, width, height, maxval = _read_pnm_header(stream)
+    total = width * height
+    flat = np.empty(total, dtype=np.uint8)
+    filled = 0
+    carry = b''
+    while filled < total:
+        chunk = stream.read(CHUNK_BYTES)
+        if not chunk:
+            if carry:
+                chunk, carry = carry, b''
+            else:
+                raise MapFormatError(f"Truncated ASCII PGM data in {path}")
+        else:
+            chunk = carry + chunk
+            # Keep a token that may continue in the next chunk
+            cut = len(chunk)
+            while cut > 0 and not chunk[cut - 1:cut].isspace():
+                cut -= 1
+            # Likewise a comment that may go on past the chunk: keep its whole line
+            if chunk.rfind(b'#', 0, cut) > chunk.rfind(b'\n', 0, cut):
+                cut = chunk.rfind(b'\n', 0, cut) + 1
+            chunk, carry = chunk[:cut], chunk[cut:]
+        if b'#' in chunk:
+            chunk = b'\n'.join(line.split(b'#', 1)[0] for line in chunk.split(b'\n'))
+        tokens = chunk.split()
+        if not tokens:
+            continue
+        samples = np.array(tokens).astype(np.int64)
+        take = min(len(samples), total - filled)
+        flat[filled:filled + take] = mapping.apply(samples[:take], maxval)
+        filled += take
+    return flat.reshape(height, width), {'format': fmt, 'maxval': maxval}
+
+
+def _read_with_pil(stream, path, mapping):
+    im = Image.open(stream)
+    im.load()
+    fmt = im.format or 'unknown'
+    if im.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        # Older Pillow opens 16-bit PNGs as 'I' rather than 'I;16'. Either way
+        # the range is the format's 16 bits, as read_map_header reports, and
+        # never the brightest sample, which would make occupancy depend on
+        # the image content.
+        maxval = 65535
+        samples = np.clip(np.asarray(im).astype(np.int64), 0, maxval)
+        return mapping.apply(samples, maxval), {'format': fmt, 'maxval': maxval}
+    if im.mode != 'L':
+        im = im.convert('L')
+    return np.array(im, dtype=np.uint8), {'format': fmt, 'maxval': 255}
+
+
+register_reader('pgm-binary', lambda magic: magic[:2] == b'P5', _read_p5)
+register_reader('pgm-ascii', lambda magic: magic[:2] == b'P2', _read_p2)
+register_reader('png', lambda magic: magic[:4] == PNG_MAGIC, _read_with_pil)
+
+
+def _open_stream(path):
+    """Open `path` for reading, transparently decompressing gzip files."""
+    raw = open(path, 'rb')
+    try:
+        magic = raw.read(2)
+        raw.seek(0)
+    except Exception:
+        raw.close()
+        raise
+    if magic == GZIP_MAGIC:
+        raw.close()
+        return gzip.open(path, 'rb'), True
+    return raw, False
+
+
+def read_map(path, mapping=None):
+    """Decode the map image at `path` into a uint8 array.
+
+    Returns `(data, info)` where `info` holds the source format, maxval and
+    whether the file was compressed.
+    """
+    mapping = mapping or DepthMapping()
+    stream, compressed = _open_stream(path)
+    try:
+        magic = stream.peek(8)[:8] if hasattr(stream, 'peek') else b''
+        if len(magic) < 8:
+            magic = stream.read(8)
+            stream.seek(0)
+        for name, probe, reader in _READERS:
+            if probe(magic):
+                data, info = reader(stream, path, mapping)
+                break
+        else:
+            # Anything else PIL understands (TIFF, BMP, ...)
+            data, info = _read_with_pil(stream, path, mapping)
+    except MapFormatError:
+        raise
+    except Exception as e:
+        raise MapFormatError(f"Cannot decode {path}: {e}")
+    finally:
+        stream.close()
+    info['compressed'] = compressed
+    info['width'] = data.shape[1]
+    info['height'] = data.shape[0]
+    return data, info
+
+
+def read_map_header(path):
+    """Return `{'format', 'width', 'height', 'maxval'}` without decoding the cells."""
+    stream, compressed = _open_stream(path)
+    try:
+        magic = stream.read(8)
+        stream.seek(0)
+        if magic[:2] in (b'P2', b'P5'):
+            fmt, width, height, maxval = _read_pnm_header(stream)
+        else:
+            # PIL only parses the header until the image is loaded
+            im = Image.open(stream)
+            fmt = im.format or 'unknown'
+            width, height = im.size
+            maxval = 65535 if im.mode.startswith('I') else 255
+    except MapFormatError:
+        raise
+    except Exception as e:
+        raise MapFormatError(f"Cannot read header of {path}: {e}")
+    finally:
+        stream.close()
+    return {'format': fmt, 'width': width, 'height': height, 'maxval': maxval,
+            'compressed': compressed}
+
+
+def write_atomic(path, chunks):
+    """Write `chunks` (bytes or an iterable of buffers) to `path` atomically.
+
+    Data goes to a temporary file in the same directory which is then renamed
+    over `path`, so readers never observe a half-written file.
+    """
+    if isinstance(chunks, (bytes, bytearray, memoryview)):
+        chunks = [chunks]
+    tmp = path + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def pgm_header(width, height):
+    return f"P5\n{width} {height}\n255\n".encode('ascii')
+
+
+def yaml_text(metadata, image_name):
+    """Return map_server YAML for `metadata`, pointing at `image_name`."""
+    doc = {'image': image_name}
+    doc.update((k, v) for k, v in metadata.items() if k != 'image')
+    return yaml.safe_dump(doc, default_flow_style=None, sort_keys=False)
+
+
+def map_basename(path):
+    """Return the map name without directory and image/compression suffixes."""
+    name = os.path.basename(path)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return os.path.splitext(name)[0]
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+# Worker thread for long-running whole-map computations.
+#
+# The GUI thread hands a MapJob a function that works on copies of the map
+# (never on `editor.map_data` itself). The function receives `progress(done,
+# total)` and `cancelled()` callbacks; its return value is delivered on the
+# GUI thread through `finished_job`, where the editor decides whether the
+# result still applies and commits it as an undoable edit.
+
+from PyQt5 import QtCore
+
+
+class MapJob(QtCore.QThread):
+    """Runs `fn(progress, cancelled)` on a worker thread.
+
+    Emits `progress(done, total)` while running and `finished_job(result,
+    error)` at the end; `result` is None when the job was cancelled or failed.
+    """
+    progress = QtCore.pyqtSignal(int, int)
+    finished_job = QtCore.pyqtSignal(object, object)
+
+    def __init__(self, fn, parent=None):
+        super(MapJob, self).__init__(parent)
+        self.fn = fn
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        result, error = None, None
+        try:
+            result = self.fn(lambda done, total: self.progress.emit(int(done), int(total)),
+                             self.is_cancelled)
+        except Exception as e:
+            error = str(e)
+        if self._cancelled:
+            result = None
+        self.finished_job.emit(result, error)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+# Indexed library of map files with an on-disk thumbnail cache.
+#
+# The index records, per map, only what can be learned cheaply: image size
+# from the file header and resolution/origin from the YAML. Entries are keyed
+# by path and revalidated with (mtime, size) on every scan, so rescans only
+# touch files that changed. Thumbnails are rendered once per (path, mtime,
+# size) and kept as small PNGs in the cache directory.
+#
+#   ~/.cache/ros-map-studio/
+#   ├─ library.json
+#   └─ thumbs/<key>.png
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import yaml
+from PIL import Image
+
+from map_io import MapFormatError, map_basename, read_map, read_map_header, write_atomic
+from map_store import INDEX_NAME, MapStore, STORE_SUFFIX, is_store
+
+
+THUMB_SIZE = 128
+LIBRARY_VERSION = 1
+
+
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ros-map-studio')
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _is_map_name(name):
+    return name.endswith(('.pgm', '.pgm.gz', '.png'))
+
+
+class MapLibrary(object):
+    """Index of the maps found under a set of directories."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.directories = []
+        self.entries = {}
+        self.load()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.cache_dir, 'library.json')
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r') as f:
+                doc = json.load(f)
+            if doc.get('version') == LIBRARY_VERSION:
+                self.directories = doc.get('directories', [])
+                self.entries = doc.get('entries', {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        doc = {'version': LIBRARY_VERSION, 'directories': self.directories, 'entries': self.entries}
+        write_atomic(self.index_path, json.dumps(doc).encode('utf-8'))
+
+    def add_directory(self, path):
+        path = os.path.abspath(path)
+        if path not in self.directories:
+            self.directories.append(path)
+
+    def remove_directory(self, path):
+        path = os.path.abspath(path)
+        if path in self.directories:
+            self.directories.remove(path)
+
+    def _find_maps(self, directories):
+        """Yield absolute paths of map images and native stores under `directories`."""
+        for root_dir in directories:
+            for dirpath, dirnames, filenames in os.walk(root_dir):
+                stores = [d for d in dirnames if d.endswith(STORE_SUFFIX)]
+                for d in stores:
+                    yield os.path.join(dirpath, d)
+                # Do not descend into stores or hidden folders (e.g. .autosave)
+                dirnames[:] = [d for d in dirnames if d not in stores and not d.startswith('.')]
+                for name in filenames:
+                    if _is_map_name(name):
+                        yield os.path.join(dirpath, name)
+
+    def _read_entry(self, path, key, yaml_path, yaml_key):
+        entry = {
+            'path': path,
+            'name': map_basename(path),
+            'stat': list(key),
+            'yaml': yaml_path,
+            'yaml_stat': list(yaml_key) if yaml_key else None,
+            'width': None, 'height': None, 'format': None,
+            'resolution': None, 'origin': None, 'error': None,
+        }
+        meta = None
+        try:
+            if path.endswith(STORE_SUFFIX):
+                store = MapStore.open(path)
+                entry.update(width=store.width, height=store.height, format='rmap')
+                meta = store.metadata
+            else:
+                header = read_map_header(path)
+                entry.update(width=header['width'], height=header['height'], format=header['format'])
+        except MapFormatError as e:
+            entry['error'] = str(e)
+        if yaml_path:
+            try:
+                with open(yaml_path, 'r') as f:
+                    meta = yaml.safe_load(f)
+            except Exception as e:
+                entry['error'] = entry['error'] or f"YAML: {e}"
+        if isinstance(meta, dict):
+            entry['resolution'] = meta.get('resolution')
+            entry['origin'] = meta.get('origin')
+        return entry
+
+    def scan_entries(self):
+        """Compute a refreshed index without touching this library.
+
+        Safe to run on a worker thread while the GUI reads `entries`: the
+        current index is only read, and the result is a new dict. Returns
+        (entries, added, updated, stale) where `stale` lists the replaced or
+        removed entries; hand the result to apply_scan() on the GUI thread.
+        """
+        current = dict(self.entries)
+        entries = {}
+        stale = []
+        added = updated = 0
+        for path in self._find_maps(list(self.directories)):
+            try:
+                key = _stat_key(os.path.join(path, INDEX_NAME) if path.endswith(STORE_SUFFIX) else path)
+            except OSError:
+                continue
+            yaml_path = None
+            yaml_key = None
+            if not path.endswith(STORE_SUFFIX):
+                candidate = os.path.join(os.path.dirname(path), map_basename(path) + '.yaml')
+                try:
+                    yaml_key = _stat_key(candidate)
+                    yaml_path = candidate
+                except OSError:
+                    if path.endswith('.png'):
+                        # PNGs without map metadata are renders, not maps
+                        continue
+            if path in entries:
+                continue
+            old = current.get(path)
+            if old is not None and old.get('stat') == list(key) and \
+                    old.get('yaml_stat') == (list(yaml_key) if yaml_key else None):
+                entries[path] = old
+                continue
+            if old is not None:
+                stale.append(old)
+            entries[path] = self._read_entry(path, key, yaml_path, yaml_key)
+            if old is None:
+                added += 1
+            else:
+                updated += 1
+        stale += [e for p, e in current.items() if p not in entries]
+        return entries, added, updated, stale
+
+    def apply_scan(self, result):
+        """Install a scan_entries() result. Returns (added, updated, removed) counts."""
+        entries, added, updated, stale = result
+        removed = len(stale) - updated
+        self.entries = entries
+        for entry in stale:
+            self._drop_thumbnail(entry)
+        if added or updated or removed:
+            self.save()
+        return added, updated, removed
+
+    def scan(self):
+        """Incrementally refresh the index. Returns (added, updated, removed) counts."""
+        return self.apply_scan(self.scan_entries())
+
+    def sorted_entries(self):
+        return sorted(self.entries.values(), key=lambda e: (e['name'].lower(), e['path']))
+
+    def thumbnail_path(self, entry):
+        key = f"{entry['path']}|{entry['stat'][0]}|{entry['stat'][1]}"
+        return os.path.join(self.cache_dir, 'thumbs', hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    def _drop_thumbnail(self, entry):
+        try:
+            os.remove(self.thumbnail_path(entry))
+        except (OSError, KeyError, IndexError, TypeError):
+            pass
+
+    def ensure_thumbnail(self, entry, size=THUMB_SIZE):
+        """Return the cached thumbnail path for `entry`, rendering it if needed (None on error)."""
+        thumb = self.thumbnail_path(entry)
+        if os.path.exists(thumb):
+            return thumb
+        if entry.get('error') or not entry.get('width'):
+            return None
+        try:
+            path = entry['path']
+            if is_store(path):
+                store = MapStore.open(path)
+                data = store.read_all()
+            else:
+                data, _ = read_map(path)
+            step = max(1, int(np.ceil(max(data.shape) / float(size))))
+            im = Image.fromarray(np.ascontiguousarray(data[::step, ::step]))
+            os.makedirs(os.path.dirname(thumb), exist_ok=True)
+            tmp = thumb + '.tmp'
+            im.save(tmp, 'PNG')
+            os.replace(tmp, thumb)
+            return thumb
+        except Exception:
+            return None
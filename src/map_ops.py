@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+
+# Whole-array editing operations on the occupancy grid.
+#
+# Functions here work on the editor's uint8 map array (row 0 = top) and
+# never touch Qt. They return the changed region so the editor can record a
+# tile delta for undo and redraw only the affected tiles.
+
+import numpy as np
+from scipy import ndimage
+
+from tiled_view import TILE_SIZE
+
+
+# Cell classes, matching how the editor colors values
+OCCUPIED, UNKNOWN, FREE = 0, 1, 2
+
+# Values written by the paint tools into a non-negated trinary/scale map
+PAINT_VALUES = {'occupied': 0, 'unoccupied': 255, 'uncertain': 200}
+CLASS_KEYS = {OCCUPIED: 'occupied', UNKNOWN: 'uncertain', FREE: 'unoccupied'}
+
+MAP_MODES = ('trinary', 'scale', 'raw')
+
+
+def occupancy_lut(occupied_thresh, free_thresh, mode='trinary', negate=0):
+    """256-entry table of the occupancy map_server publishes for each pixel value.
+
+    Entries are 100 (occupied), 0 (free), -1 (unknown) and, in scale and raw
+    mode, intermediate values 1..99.
+    """
+    values = np.arange(256, dtype=np.float64)
+    if negate:
+        values = 255.0 - values
+    occ = np.full(256, -1, dtype=np.int16)
+    if mode == 'raw':
+        # Pixel values are the occupancy itself; anything above 100 is unknown
+        raw = values.astype(np.int16)
+        occ[raw <= 100] = raw[raw <= 100]
+        return occ
+    p = (255.0 - values) / 255.0
+    occ[p > occupied_thresh] = 100
+    occ[p < free_thresh] = 0
+    if mode == 'scale':
+        band = (p >= free_thresh) & (p <= occupied_thresh)
+        span = max(occupied_thresh - free_thresh, 1e-9)
+        # map_server: value = 1 + 98 * ratio, stored in an int (truncated)
+        occ[band] = (1.0 + 98.0 * (p[band] - free_thresh) / span).astype(np.int16)
+    return occ
+
+
+def class_lut(occupied_thresh, free_thresh, mode='trinary', negate=0):
+    """256-entry table mapping cell values to OCCUPIED/UNKNOWN/FREE."""
+    occ = occupancy_lut(occupied_thresh, free_thresh, mode, negate)
+    lut = np.full(256, UNKNOWN, dtype=np.uint8)
+    if mode == 'raw':
+        lut[occ >= 100 * occupied_thresh] = OCCUPIED
+        lut[(occ >= 0) & (occ <= 100 * free_thresh)] = FREE
+    else:
+        lut[occ == 100] = OCCUPIED
+        lut[occ == 0] = FREE
+    return lut
+
+
+def paint_values(classes, mode='trinary', negate=0):
+    """Pixel value to write for each paint color so it reads back as the intended class.
+
+    Uses the usual values (0 / 255 / 200, mirrored when negated; 100 / 0 / 255
+    in raw mode) unless the thresholds put that value in another class, in
+    which case the nearest value of the right class is taken.
+    """
+    if mode == 'raw':
+        preferred = {OCCUPIED: 100, FREE: 0, UNKNOWN: 255}
+    else:
+        preferred = {c: PAINT_VALUES[k] for c, k in CLASS_KEYS.items()}
+    if negate:
+        preferred = {c: 255 - v for c, v in preferred.items()}
+    result = {}
+    for cls, value in preferred.items():
+        if classes[value] != cls:
+            candidates = np.flatnonzero(classes == cls)
+            if len(candidates):
+                value = int(candidates[np.argmin(np.abs(candidates - value))])
+        result[CLASS_KEYS[cls]] = int(value)
+    return result
+
+
+def structure(connectivity):
+    """Neighbourhood for labeling: 4 (edges only) or 8 (edges and corners)."""
+    return ndimage.generate_binary_structure(2, 2 if connectivity == 8 else 1)
+
+
+def flood_region(classes, x, y, connectivity=4):
+    """Return (mask, (x0, y0, x1, y1)) of the region of equal class containing (x, y).
+
+    `classes` is a class array (see `class_lut`). The mask covers only the
+    bounding box of the region (exclusive end).
+    """
+    target = classes == classes[y, x]
+    labels, _ = ndimage.label(target, structure=structure(connectivity))
+    region = labels == labels[y, x]
+    slices = ndimage.find_objects(region.astype(np.uint8))[0]
+    ys, xs = slices
+    return region[ys, xs], (xs.start, ys.start, xs.stop, ys.stop)
+
+
+def component_areas(mask, connectivity=8):
+    """Label the connected components of `mask`.
+
+    Returns (labels, areas) where areas[i] is the cell count of component i
+    (areas[0] counts the background).
+    """
+    labels, count = ndimage.label(mask, structure=structure(connectivity))
+    areas = np.bincount(labels.ravel(), minlength=count + 1)
+    return labels, areas
+
+
+def small_components(areas, max_cells):
+    """Boolean table over component ids: True for components smaller than `max_cells`."""
+    small = areas < max_cells
+    small[0] = False
+    return small
+
+
+# Morphology: each step works on the mask of one class. Cells joining the
+# class get its paint value; cells leaving it take the paint value of
+# VACATED_CLASS[class].
+MORPH_OPS = ('dilate', 'erode', 'open', 'close')
+CLASS_NAMES = {'occupied': OCCUPIED, 'unknown': UNKNOWN, 'free': FREE}
+VACATED_CLASS = {OCCUPIED: FREE, UNKNOWN: FREE, FREE: UNKNOWN}
+
+
+def _morph_mask(mask, op, size):
+    st = structure(8)
+    if op == 'dilate':
+        return ndimage.binary_dilation(mask, st, iterations=size)
+    if op == 'erode':
+        return ndimage.binary_erosion(mask, st, iterations=size, border_value=1)
+    if op == 'open':
+        return ndimage.binary_dilation(
+            ndimage.binary_erosion(mask, st, iterations=size, border_value=1), st, iterations=size)
+    if op == 'close':
+        return ndimage.binary_erosion(
+            ndimage.binary_dilation(mask, st, iterations=size), st, iterations=size, border_value=1)
+    raise ValueError(f"Unknown morphological operation: {op}")
+
+
+def morph_step(data, lut, op, cls, size, values=None):
+    """Apply one morphological step to a value array; returns a new array.
+
+    `values` maps paint color names to pixel values (see `paint_values`).
+    """
+    values = values or PAINT_VALUES
+    mask = lut[data] == cls
+    result = _morph_mask(mask, op, size)
+    out = data.copy()
+    out[result & ~mask] = values[CLASS_KEYS[cls]]
+    out[mask & ~result] = values[CLASS_KEYS[VACATED_CLASS[cls]]]
+    return out
+
+
+def step_halo(op, size):
+    """Cells of context needed around a region to compute a step exactly."""
+    return size * (2 if op in ('open', 'close') else 1) + 1
+
+
+def run_pipeline(data, lut, steps, values=None, band=1024, progress=None, cancelled=None):
+    """Run morphology `steps` [(op, class_name, size), ...] over `data` in row bands.
+
+    Returns the new array, or None when `cancelled()` became true.
+    `progress(done, total)` is called after every band.
+    """
+    height = data.shape[0]
+    bands = max(1, (height + band - 1) // band)
+    total = bands * len(steps)
+    done = 0
+    for op, cls_name, size in steps:
+        cls = CLASS_NAMES[cls_name]
+        halo = step_halo(op, size)
+        out = np.empty_like(data)
+        for y0 in range(0, height, band):
+            if cancelled is not None and cancelled():
+                return None
+            y1 = min(height, y0 + band)
+            h0, h1 = max(0, y0 - halo), min(height, y1 + halo)
+            out[y0:y1] = morph_step(data[h0:h1], lut, op, cls, size, values)[y0 - h0:y1 - h0]
+            done += 1
+            if progress is not None:
+                progress(done, total)
+        data = out
+    return data
+
+
+def pipeline_halo(steps):
+    return sum(step_halo(op, size) for op, _, size in steps)
+
+
+def rotated_shape(height, width, angle_deg):
+    """(height, width) of the bounding box of a height x width map rotated by angle_deg."""
+    a = np.radians(angle_deg)
+    c, s = abs(np.cos(a)), abs(np.sin(a))
+    # Round away float noise so 90° turns swap the sides exactly
+    w = int(np.ceil(round(width * c + height * s, 6)))
+    h = int(np.ceil(round(width * s + height * c, 6)))
+    return max(1, h), max(1, w)
+
+
+def rotate_point(x, y, angle_deg, src_shape, dst_shape):
+    """Map a continuous cell position through `rotate_map` (same sense as QTransform.rotate)."""
+    a = np.radians(angle_deg)
+    c, s = np.cos(a), np.sin(a)
+    dx, dy = x - src_shape[1] / 2.0, y - src_shape[0] / 2.0
+    return (dst_shape[1] / 2.0 + dx * c - dy * s,
+            dst_shape[0] / 2.0 + dx * s + dy * c)
+
+
+def rotate_map(data, angle_deg, fill, max_cells=1 << 20, progress=None):
+    """Rotate a value array about its center with nearest-neighbor sampling.
+
+    The result covers the whole rotated map; cells outside the source get
+    `fill`. Nearest-neighbor keeps the cell values (and so the classes)
+    intact. Output rows are computed in bands of about `max_cells` cells so
+    temporary memory stays bounded.
+    """
+    h, w = data.shape
+    out_h, out_w = rotated_shape(h, w, angle_deg)
+    out = np.empty((out_h, out_w), dtype=data.dtype)
+    a = np.radians(angle_deg)
+    c, s = np.cos(a), np.sin(a)
+    u = np.arange(out_w, dtype=np.float64) + 0.5 - out_w / 2.0
+    band = max(1, max_cells // out_w)
+    for v0 in range(0, out_h, band):
+        v1 = min(out_h, v0 + band)
+        v = (np.arange(v0, v1, dtype=np.float64) + 0.5 - out_h / 2.0)[:, None]
+        # Inverse rotation: where does each output cell center come from?
+        sx = np.floor(w / 2.0 + u * c + v * s).astype(np.int64)
+        sy = np.floor(h / 2.0 - u * s + v * c).astype(np.int64)
+        valid = (sx >= 0) & (sx < w) & (sy >= 0) & (sy < h)
+        rows = np.full((v1 - v0, out_w), fill, dtype=data.dtype)
+        rows[valid] = data[sy[valid], sx[valid]]
+        out[v0:v1] = rows
+        if progress is not None:
+            progress(v1, out_h)
+    return out
+
+
+def resampled_shape(height, width, factor):
+    """(height, width) of a map resampled to `factor` times coarser cells."""
+    # Round away float noise so e.g. 0.05 -> 0.1 m halves the sides exactly
+    return (max(1, int(np.ceil(round(height / factor, 6)))),
+            max(1, int(np.ceil(round(width / factor, 6)))))
+
+
+def resample_point(x, y, factor, src_shape, dst_shape):
+    """Map a continuous cell position through `resample_map` (bottom-left corner fixed)."""
+    return x / factor, dst_shape[0] - (src_shape[0] - y) / factor
+
+
+def resample_map(data, classes, factor, values=None, max_cells=1 << 22, progress=None):
+    """Resample a value array to cells `factor` times larger (factor < 1 upsamples).
+
+    The bottom-left corner stays in place so the YAML origin is unchanged.
+    Upsampling repeats cells (nearest neighbor). Downsampling, by integer
+    or fractional factors, aggregates each block of source cells: any
+    occupied cell makes the block occupied, otherwise it is free when at
+    least half of its cells are free and unknown else. Aggregated cells get
+    the paint value of their class (`values`, see `paint_values`). Work is
+    done in bands of about `max_cells` source cells.
+    """
+    values = values or PAINT_VALUES
+    h, w = data.shape
+    out_h, out_w = resampled_shape(h, w, factor)
+    # Rows are counted from the bottom so the origin corner lines up. The same
+    # float noise as in resampled_shape would start a block one cell early
+    # (e.g. 3 * 0.1 / 0.05 -> 5.999...), so nudge it before flooring.
+    flipped = data[::-1]
+    rows = np.floor(np.arange(out_h) * factor + 1e-9).astype(np.int64)
+    cols = np.floor(np.arange(out_w) * factor + 1e-9).astype(np.int64)
+    out = np.empty((out_h, out_w), dtype=data.dtype)
+    band = max(1, int(max_cells // (w * max(1.0, factor))))
+    for i0 in range(0, out_h, band):
+        i1 = min(out_h, i0 + band)
+        if factor <= 1:
+            out[i0:i1] = flipped[rows[i0:i1, None], cols[None, :]]
+        else:
+            s0, s1 = rows[i0], rows[i1] if i1 < out_h else h
+            cls = classes[flipped[s0:s1]]
+            starts = rows[i0:i1] - s0
+            occupied = np.maximum.reduceat(
+                np.maximum.reduceat((cls == OCCUPIED).view(np.uint8), starts, axis=0), cols, axis=1)
+            free = np.add.reduceat(
+                np.add.reduceat((cls == FREE).astype(np.int32), starts, axis=0), cols, axis=1)
+            sizes = np.outer(np.diff(np.append(starts, s1 - s0)), np.diff(np.append(cols, w)))
+            block = np.full(free.shape, values['uncertain'], dtype=data.dtype)
+            block[2 * free >= sizes] = values['unoccupied']
+            block[occupied.astype(bool)] = values['occupied']
+            out[i0:i1] = block
+        if progress is not None:
+            progress(i1, out_h)
+    return out[::-1].copy()
+
+
+def known_bbox(classes, margin=0):
+    """(x0, y0, x1, y1) of the cells that are not UNKNOWN, grown by `margin` and clipped.
+
+    The end is exclusive. Returns None when every cell is unknown.
+    """
+    known = classes != UNKNOWN
+    rows = np.flatnonzero(known.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(known.any(axis=0))
+    h, w = classes.shape
+    return (max(0, int(cols[0]) - margin), max(0, int(rows[0]) - margin),
+            min(w, int(cols[-1]) + 1 + margin), min(h, int(rows[-1]) + 1 + margin))
+
+
+def crop_pad(data, x0, y0, x1, y1, fill):
+    """Cut the window [x0, x1) x [y0, y1) out of `data`; parts outside the map get `fill`.
+
+    Coordinates may be negative or past the edge, so the same call crops,
+    pads or does both at once.
+    """
+    h, w = data.shape
+    out = np.full((y1 - y0, x1 - x0), fill, dtype=data.dtype)
+    sx0, sy0, sx1, sy1 = max(0, x0), max(0, y0), min(w, x1), min(h, y1)
+    if sx0 < sx1 and sy0 < sy1:
+        out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = data[sy0:sy1, sx0:sx1]
+    return out
+
+
+def _ranges(counts):
+    """Concatenated aranges: _ranges([2, 3]) -> [0, 1, 0, 1, 2]."""
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    return np.arange(int(counts.sum()), dtype=np.int64) - np.repeat(starts, counts)
+
+
+def _unique_sorted(values):
+    """np.unique for large int arrays via an in-place sort (faster than hashing here)."""
+    values = np.sort(values)
+    if len(values) > 1:
+        values = values[np.concatenate(([True], values[1:] != values[:-1]))]
+    return values
+
+
+def _stroke_cells(seg, t, shape):
+    """Flat indices of the cells covered by segments `seg` (N, 4) of thickness `t` (N,)."""
+    # One stroke per half-cell offset across the width
+    strokes = 2 * t - 1
+    idx = np.repeat(np.arange(len(seg)), strokes)
+    offset = (_ranges(strokes) - (t[idx] - 1)) * 0.5
+    x0, y0, x1, y1 = seg[idx].T
+    dx, dy = x1 - x0, y1 - y0
+    length = np.hypot(dx, dy)
+    safe = np.where(length > 0, length, 1.0)
+    x0 = x0 - dy / safe * offset
+    y0 = y0 + dx / safe * offset
+    # Samples every half cell along each stroke (both ends included)
+    samples = np.ceil(length * 2).astype(np.int64) + 1
+    sid = np.repeat(np.arange(len(x0)), samples)
+    step = _ranges(samples)
+    frac = step / np.maximum(samples - 1, 1)[sid]
+    cx = np.floor(x0[sid] + frac * dx[sid]).astype(np.int64)
+    cy = np.floor(y0[sid] + frac * dy[sid]).astype(np.int64)
+    # Fill the corner of diagonal steps
+    diag = np.flatnonzero((step[1:] > 0) & (cx[1:] != cx[:-1]) & (cy[1:] != cy[:-1])) + 1
+    cx = np.concatenate([cx, cx[diag]])
+    cy = np.concatenate([cy, cy[diag - 1]])
+    h, w = shape
+    inside = (cx >= 0) & (cx < w) & (cy >= 0) & (cy < h)
+    return _unique_sorted(cy[inside] * w + cx[inside])
+
+
+def rasterize_segments(segments, thickness, shape, max_samples=1 << 22):
+    """Cells covered by thick line segments, as (rows, cols) of unique cells inside `shape`.
+
+    `segments` is an (N, 4) array of continuous cell positions x0, y0, x1, y1
+    and `thickness` the width of each segment in cells. Every segment is
+    drawn as parallel strokes half a cell apart, each sampled every half
+    cell; where a stroke steps diagonally the corner cell is added too, so
+    the result is 4-connected and a flood fill cannot leak through it.
+    Segments are processed in vectorized batches of about `max_samples`
+    sample points.
+    """
+    seg = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+    t = np.maximum(1, np.broadcast_to(np.asarray(thickness, dtype=np.int64), (len(seg),)))
+    cost = (2 * t - 1) * (np.ceil(np.hypot(seg[:, 2] - seg[:, 0], seg[:, 3] - seg[:, 1]) * 2) + 1)
+    batch = np.cumsum(cost) // max_samples
+    flats = [_stroke_cells(seg[batch == b], t[batch == b], shape) for b in np.unique(batch)]
+    flat = _unique_sorted(np.concatenate(flats)) if flats else np.empty(0, dtype=np.int64)
+    w = shape[1]
+    return flat // w, flat % w
+
+
+def tile_deltas(before, after, x0, y0, tile_size=TILE_SIZE):
+    """Split the differences between two equally shaped regions by map tile.
+
+    `before`/`after` cover cells starting at (x0, y0). Returns a list of
+    (ty, tx, rows, cols, old_values, new_values) with absolute cell
+    coordinates, one entry per tile that actually changed.
+    """
+    changed = before != after
+    h, w = changed.shape
+    deltas = []
+    for ty in range(y0 // tile_size, (y0 + h - 1) // tile_size + 1):
+        r0, r1 = max(0, ty * tile_size - y0), min(h, (ty + 1) * tile_size - y0)
+        for tx in range(x0 // tile_size, (x0 + w - 1) // tile_size + 1):
+            c0, c1 = max(0, tx * tile_size - x0), min(w, (tx + 1) * tile_size - x0)
+            rows, cols = np.nonzero(changed[r0:r1, c0:c1])
+            if len(rows) == 0:
+                continue
+            rows += r0
+            cols += c0
+            deltas.append((ty, tx, (rows + y0).astype(np.int32), (cols + x0).astype(np.int32),
+                           before[rows, cols], after[rows, cols]))
+    return deltas
+
+
+def straighten_walls(data, classes, segments, sides, thickness, band, values=None):
+    """Redraw detected wall faces as crisp lines; returns a new array.
+
+    For each (x0, y0, x1, y1) face of `segments` (see
+    map_analysis.detect_wall_lines), occupied cells up to `band` cells into
+    the free side are cleared and a line `thickness` cells wide is drawn
+    from the face into the wall. Cells within `band` on the wall side of any
+    face are never cleared, so walls meeting at corners keep their bodies.
+    """
+    values = values or PAINT_VALUES
+    h, w = data.shape
+    clear = np.zeros((h, w), dtype=bool)
+    keep = np.zeros((h, w), dtype=bool)
+    draw = np.zeros((h, w), dtype=bool)
+    reach = max(band, thickness) + 1
+    for (x0, y0, x1, y1), side in zip(np.asarray(segments, dtype=np.float64).reshape(-1, 4), sides):
+        length = np.hypot(x1 - x0, y1 - y0)
+        if length <= 0:
+            continue
+        ux, uy = (x1 - x0) / length, (y1 - y0) / length
+        nx, ny = -uy, ux
+        bx0 = max(0, int(np.floor(min(x0, x1) - reach)))
+        bx1 = min(w, int(np.ceil(max(x0, x1) + reach)))
+        by0 = max(0, int(np.floor(min(y0, y1) - reach)))
+        by1 = min(h, int(np.ceil(max(y0, y1) + reach)))
+        if bx0 >= bx1 or by0 >= by1:
+            continue
+        cy, cx = np.mgrid[by0:by1, bx0:bx1]
+        dx, dy = cx + 0.5 - x0, cy + 0.5 - y0
+        t = dx * ux + dy * uy
+        # Signed distance from the face, positive towards the free space
+        d = (dx * nx + dy * ny) * (side if side else 1)
+        span = (t >= 0) & (t <= length)
+        if side:
+            line = span & (d <= 0.5) & (d > 0.5 - thickness)
+            clear[by0:by1, bx0:bx1] |= span & (d > 0.5) & (d <= band)
+            keep[by0:by1, bx0:bx1] |= span & (d <= 0.5) & (d >= -band)
+        else:
+            line = span & (np.abs(d) < max(0.5, thickness / 2.0))
+            clear[by0:by1, bx0:bx1] |= span & ~line & (np.abs(d) <= band)
+        draw[by0:by1, bx0:bx1] |= line
+    out = data.copy()
+    out[clear & ~keep & (classes == OCCUPIED)] = values['unoccupied']
+    out[draw] = values['occupied']
+    return out
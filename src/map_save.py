@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+# Background, change-aware saving of editor outputs.
+#
+# The GUI thread prepares immutable payloads (a copy of the map array, the
+# rendered annotation image, YAML text) and hands them to a SaveJob. The job
+# hashes each payload, skips outputs whose hash matches the last successful
+# save, and writes the rest through temporary files that are atomically
+# renamed into place.
+
+import hashlib
+import os
+
+from PyQt5 import QtCore
+
+from map_io import pgm_header, write_atomic
+
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part)
+    return h.hexdigest()
+
+
+class SaveOutput(object):
+    """One file to produce. `kind` is 'pgm', 'png', 'yaml' or 'store'.
+
+    payload by kind:
+      - 'pgm':   2D uint8 numpy array (must not be modified while saving)
+      - 'png':   QImage
+      - 'yaml':  str
+      - 'store': callable returning the number of tiles written (the store
+                 does its own change tracking)
+    """
+
+    def __init__(self, path, kind, payload):
+        self.path = path
+        self.kind = kind
+        self.payload = payload
+
+    def digest(self):
+        if self.kind == 'pgm':
+            h, w = self.payload.shape
+            return _digest(pgm_header(w, h), memoryview(self.payload).cast('B'))
+        if self.kind == 'png':
+            img = self.payload
+            bits = img.constBits()
+            bits.setsize(img.sizeInBytes())
+            meta = f"{img.width()}x{img.height()}:{int(img.format())}".encode('ascii')
+            return _digest(meta, bytes(bits))
+        if self.kind == 'yaml':
+            return _digest(self.payload.encode('utf-8'))
+        return None
+
+    def write(self):
+        if self.kind == 'pgm':
+            h, w = self.payload.shape
+            write_atomic(self.path, [pgm_header(w, h), memoryview(self.payload).cast('B')])
+        elif self.kind == 'png':
+            tmp = self.path + '.tmp'
+            if not self.payload.save(tmp, 'PNG'):
+                raise IOError(f"Failed to encode {os.path.basename(self.path)}")
+            os.replace(tmp, self.path)
+        elif self.kind == 'yaml':
+            write_atomic(self.path, self.payload.encode('utf-8'))
+        elif self.kind == 'store':
+            return self.payload()
+        return None
+
+
+class SaveJob(QtCore.QThread):
+    """Writes a list of SaveOutputs on a worker thread.
+
+    Emits `finished_save` with a dict: written/skipped path lists, the new
+    path -> hash map, store tile counts and an error message (or None).
+    """
+    finished_save = QtCore.pyqtSignal(object)
+
+    def __init__(self, outputs, known_hashes, parent=None):
+        super(SaveJob, self).__init__(parent)
+        self.outputs = outputs
+        self.known_hashes = dict(known_hashes)
+
+    def run(self):
+        result = {'written': [], 'skipped': [], 'hashes': {}, 'tiles': {}, 'error': None}
+        for out in self.outputs:
+            try:
+                digest = out.digest()
+                if digest is not None and digest == self.known_hashes.get(out.path) \
+                        and os.path.exists(out.path):
+                    result['skipped'].append(out.path)
+                    result['hashes'][out.path] = digest
+                    continue
+                tiles = out.write()
+                if out.kind == 'store':
+                    result['tiles'][out.path] = tiles
+                    if not tiles:
+                        result['skipped'].append(out.path)
+                        continue
+                result['written'].append(out.path)
+                if digest is not None:
+                    result['hashes'][out.path] = digest
+            except Exception as e:
+                result['error'] = f"{os.path.basename(out.path)}: {e}"
+                break
+        self.finished_save.emit(result)
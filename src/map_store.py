@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+# Native tiled map format for ROS Map Studio (`<name>.rmap`).
+#
+# A store is a directory holding an `index.json` plus one independently
+# compressed file per 256x256 tile:
+#
+#   office.rmap/
+#   ├─ index.json          # size, tile size, map metadata, per-tile entries
+#   └─ tiles/<ty>/<tx>.zst # raw uint8 cells of one tile (or .z for zlib)
+#
+# Tiles whose cells all share one value are stored in the index only, which
+# keeps the mostly-unknown border of SLAM maps free. Tiles are rewritten
+# individually, so saving after a small edit only touches the dirty tiles.
+
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+import yaml
+
+from map_io import MapFormatError, map_basename, pgm_header, read_map, write_atomic, yaml_text
+
+try:
+    import zstandard
+except ImportError:  # optional: fall back to zlib
+    zstandard = None
+
+
+TILE_SIZE = 256
+STORE_SUFFIX = '.rmap'
+INDEX_NAME = 'index.json'
+FORMAT_NAME = 'ros-map-studio-tiles'
+FORMAT_VERSION = 1
+
+_CODEC_SUFFIX = {'zstd': '.zst', 'zlib': '.z'}
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def _compress(raw, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(raw)
+    return zlib.compress(raw, 6)
+
+
+def _decompress(blob, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise MapFormatError("This map uses zstd tiles; install the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, INDEX_NAME))
+
+
+class MapStore(object):
+    """A tiled map on disk. Tiles are decoded on demand with `read_tile`."""
+
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self.width = index['width']
+        self.height = index['height']
+        self.tile_size = index['tile_size']
+        self.codec = index.get('codec', 'zlib')
+        self.metadata = index.get('metadata', {})
+
+    @property
+    def tiles_x(self):
+        return (self.width + self.tile_size - 1) // self.tile_size
+
+    @property
+    def tiles_y(self):
+        return (self.height + self.tile_size - 1) // self.tile_size
+
+    @classmethod
+    def open(cls, path):
+        try:
+            with open(os.path.join(path, INDEX_NAME), 'r') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            raise MapFormatError(f"Cannot read map store index in {path}: {e}")
+        if index.get('format') != FORMAT_NAME:
+            raise MapFormatError(f"{path} is not a {FORMAT_NAME} store")
+        if index.get('version', 0) > FORMAT_VERSION:
+            raise MapFormatError(f"{path} was written by a newer version (v{index['version']})")
+        return cls(path, index)
+
+    @classmethod
+    def create(cls, path, width, height, metadata=None, codec=None, tile_size=TILE_SIZE):
+        index = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'width': int(width),
+            'height': int(height),
+            'tile_size': int(tile_size),
+            'codec': codec or default_codec(),
+            'metadata': dict(metadata or {}),
+            'tiles': {},
+        }
+        os.makedirs(os.path.join(path, 'tiles'), exist_ok=True)
+        return cls(path, index)
+
+    def tile_bounds(self, ty, tx):
+        """Return (x0, y0, x1, y1) cell bounds (exclusive end) of a tile."""
+        ts = self.tile_size
+        return tx * ts, ty * ts, min(self.width, (tx + 1) * ts), min(self.height, (ty + 1) * ts)
+
+    def _tile_path(self, ty, tx, codec):
+        return os.path.join(self.path, 'tiles', str(ty), f"{tx}{_CODEC_SUFFIX[codec]}")
+
+    def read_tile(self, ty, tx):
+        """Decode one tile into a uint8 array."""
+        x0, y0, x1, y1 = self.tile_bounds(ty, tx)
+        entry = self.index['tiles'].get(f"{ty},{tx}")
+        if entry is None:
+            raise MapFormatError(f"Tile {ty},{tx} missing from {self.path}")
+        if 'fill' in entry:
+            return np.full((y1 - y0, x1 - x0), entry['fill'], dtype=np.uint8)
+        codec = entry.get('codec', self.codec)
+        with open(self._tile_path(ty, tx, codec), 'rb') as f:
+            raw = _decompress(f.read(), codec)
+        if len(raw) != (y1 - y0) * (x1 - x0):
+            raise MapFormatError(f"Tile {ty},{tx} in {self.path} has the wrong size")
+        return np.frombuffer(raw, dtype=np.uint8).reshape(y1 - y0, x1 - x0)
+
+    def read_all(self):
+        data = np.empty((self.height, self.width), dtype=np.uint8)
+        for ty in range(self.tiles_y):
+            for tx in range(self.tiles_x):
+                x0, y0, x1, y1 = self.tile_bounds(ty, tx)
+                data[y0:y1, x0:x1] = self.read_tile(ty, tx)
+        return data
+
+    def write_tile(self, ty, tx, cells):
+        """Compress and write one tile; uniform tiles are kept in the index."""
+        key = f"{ty},{tx}"
+        old = self.index['tiles'].get(key)
+        first = cells.flat[0]
+        if (cells == first).all():
+            entry = {'fill': int(first)}
+        else:
+            path = self._tile_path(ty, tx, self.codec)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, _compress(np.ascontiguousarray(cells).tobytes(), self.codec))
+            entry = {'codec': self.codec}
+        # Drop a stale file left behind by a tile that became uniform or changed codec
+        if old is not None and 'fill' not in old and old.get('codec') != entry.get('codec'):
+            try:
+                os.remove(self._tile_path(ty, tx, old.get('codec', self.codec)))
+            except OSError:
+                pass
+        self.index['tiles'][key] = entry
+
+    def save(self, data, dirty_tiles=None, metadata=None):
+        """Write `data` to the store.
+
+        `dirty_tiles` is an iterable of (ty, tx); when None every tile is
+        written. Returns the number of tiles written.
+        """
+        if data.shape != (self.height, self.width):
+            raise ValueError("Map size does not match the store; save to a new store instead")
+        if metadata is not None:
+            self.index['metadata'] = dict(metadata)
+            self.metadata = self.index['metadata']
+        if dirty_tiles is None:
+            dirty_tiles = [(ty, tx) for ty in range(self.tiles_y) for tx in range(self.tiles_x)]
+        written = 0
+        for ty, tx in dirty_tiles:
+            x0, y0, x1, y1 = self.tile_bounds(ty, tx)
+            self.write_tile(ty, tx, data[y0:y1, x0:x1])
+            written += 1
+        self.flush_index()
+        return written
+
+    def has_tile(self, ty, tx):
+        return f"{ty},{tx}" in self.index['tiles']
+
+    def stored_tiles(self):
+        """Return the (ty, tx) keys of all tiles present in the store."""
+        return [tuple(int(v) for v in key.split(',')) for key in self.index['tiles']]
+
+    def flush_index(self, metadata=None):
+        """Atomically rewrite the index (after `write_tile` calls)."""
+        if metadata is not None:
+            self.index['metadata'] = dict(metadata)
+            self.metadata = self.index['metadata']
+        write_atomic(os.path.join(self.path, INDEX_NAME),
+                     json.dumps(self.index, separators=(',', ':')).encode('utf-8'))
+
+    def export_ros(self, out_dir, name=None):
+        """Losslessly export the store to a ROS map_server PGM + YAML pair.
+
+        Rows are streamed one band of tiles at a time, so the whole map is
+        never decoded at once. Returns (pgm_path, yaml_path).
+        """
+        name = name or map_basename(self.path)
+        os.makedirs(out_dir, exist_ok=True)
+        pgm_path = os.path.join(out_dir, name + '.pgm')
+        yaml_path = os.path.join(out_dir, name + '.yaml')
+        def bands():
+            yield pgm_header(self.width, self.height)
+            for ty in range(self.tiles_y):
+                _, y0, _, y1 = self.tile_bounds(ty, 0)
+                band = np.empty((y1 - y0, self.width), dtype=np.uint8)
+                for tx in range(self.tiles_x):
+                    x0, _, x1, _ = self.tile_bounds(ty, tx)
+                    band[:, x0:x1] = self.read_tile(ty, tx)
+                yield band.tobytes()
+        write_atomic(pgm_path, bands())
+        write_atomic(yaml_path, yaml_text(self.metadata, os.path.basename(pgm_path)).encode('utf-8'))
+        return pgm_path, yaml_path
+
+
+def import_ros(pgm_path, yaml_path, store_path, codec=None):
+    """Convert a ROS PGM + YAML map into a new store."""
+    data, _ = read_map(pgm_path)
+    with open(yaml_path, 'r') as f:
+        meta = yaml.safe_load(f) or {}
+    meta.pop('image', None)
+    store = MapStore.create(store_path, data.shape[1], data.shape[0], meta, codec)
+    store.save(data)
+    return store
+
+
+if __name__ == '__main__':
+    usage = ('usage:\n'
+             '  python map_store.py import <map.pgm> <map.yaml> <out.rmap>\n'
+             '  python map_store.py export <map.rmap> <out_dir>')
+    if len(sys.argv) == 5 and sys.argv[1] == 'import':
+        s = import_ros(sys.argv[2], sys.argv[3], sys.argv[4])
+        print(f"Wrote {s.path} ({s.width}x{s.height}, {s.tiles_x * s.tiles_y} tiles, {s.codec})")
+    elif len(sys.argv) == 4 and sys.argv[1] == 'export':
+        pgm, yml = MapStore.open(sys.argv[2]).export_ros(sys.argv[3])
+        print(f"Wrote {pgm} and {yml}")
+    else:
+        print(usage)
+        sys.exit(1)
@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+# Vector walls: contour extraction, simplification and floor-plan export.
+#
+# The outline of the occupied class is traced with marching squares over
+# the cell centers, tile by tile on a thread pool. Each tile orders its
+# segments into chains and simplifies the outlines that close inside it with
+# array operations; chains that leave a tile are stitched to their
+# neighbours' by their shared end points and simplified afterwards.
+# Simplification is Douglas-Peucker, run on all polylines at once. The walls
+# can be written, together with dimension annotations, as SVG or DXF (R12,
+# ASCII). Like map_ops, nothing here touches Qt.
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from map_io import write_atomic
+from tiled_view import TILE_SIZE
+
+
+# Marching squares. Corners are weighted TL=8, TR=4, BR=2, BL=1 and square
+# edges numbered top=0, right=1, bottom=2, left=3. In the two saddle cases
+# (5, 10) the occupied corners are joined, matching 8-connected walls.
+_SEGMENTS = {
+    1: ((3, 2),), 2: ((2, 1),), 3: ((3, 1),), 4: ((0, 1),),
+    5: ((3, 0), (2, 1)), 6: ((0, 2),), 7: ((3, 0),), 8: ((3, 0),),
+    9: ((0, 2),), 10: ((0, 1), (3, 2)), 11: ((0, 1),), 12: ((3, 1),),
+    13: ((2, 1),), 14: ((3, 2),),
+}
+# Edge midpoints in doubled coordinates, relative to (2c, 2r) of square (r, c)
+_EDGE_X2 = np.array([0, 1, 0, -1])
+_EDGE_Y2 = np.array([-1, 0, 1, 0])
+# Corner offsets (doubled) by weight, and the corner a segment between two
+# adjacent edges cuts off
+_CORNERS = {8: (-1, -1), 4: (1, -1), 2: (1, 1), 1: (-1, 1)}
+_CUT = {frozenset((0, 1)): 4, frozenset((1, 2)): 2, frozenset((2, 3)): 1, frozenset((3, 0)): 8}
+
+
+def _segment_tables():
+    """(edge from, edge to) per case, oriented so the occupied side is always on the right (y down).
+
+    With every segment oriented the same way, each contour point has exactly
+    one segment arriving and one leaving, so chains are a successor lookup.
+    """
+    first = np.full((16, 2), -1, dtype=np.int64)
+    second = np.full((16, 2), -1, dtype=np.int64)
+    for case, segs in _SEGMENTS.items():
+        for table, (a, b) in zip((first, second), segs):
+            # No corner lies on a segment between opposite edges; use the top-left one
+            weight = _CUT.get(frozenset((a, b)), 8)
+            cx, cy = _CORNERS[weight]
+            dx, dy = _EDGE_X2[b] - _EDGE_X2[a], _EDGE_Y2[b] - _EDGE_Y2[a]
+            right = dx * (cy - _EDGE_Y2[a]) - dy * (cx - _EDGE_X2[a]) > 0
+            table[case] = (a, b) if right == bool(case & weight) else (b, a)
+    return first, second
+
+
+_FIRST, _SECOND = _segment_tables()
+
+
+def _tile_segments(padded, r0, r1, c0, c1):
+    """Contour segments of the squares with top-left corner in rows [r0, r1), columns [c0, c1).
+
+    `padded` is the occupied mask with a one-cell False border; square (r, c)
+    spans padded[r:r + 2, c:c + 2]. Returns an (n, 4) int array of oriented
+    segments (x2a, y2a, x2b, y2b) in doubled scene coordinates, so the end
+    points stay integers and can be matched exactly.
+    """
+    block = padded[r0:r1 + 1, c0:c1 + 1].astype(np.uint8)
+    case = (block[:-1, :-1] << 3) | (block[:-1, 1:] << 2) | (block[1:, 1:] << 1) | block[1:, :-1]
+    out = []
+    for table in (_FIRST, _SECOND):
+        edges = table[case]
+        rows, cols = np.nonzero(edges[..., 0] >= 0)
+        if len(rows) == 0:
+            continue
+        ea, eb = edges[rows, cols, 0], edges[rows, cols, 1]
+        # Padded corner (r, c) is the center of cell (r - 1, c - 1), so
+        # square (r, c) is centered on the scene point (c, r)
+        x2 = 2 * (cols + c0)
+        y2 = 2 * (rows + r0)
+        out.append(np.stack([x2 + _EDGE_X2[ea], y2 + _EDGE_Y2[ea], x2 + _EDGE_X2[eb], y2 + _EDGE_Y2[eb]], axis=1))
+    if not out:
+        return np.zeros((0, 4), dtype=np.int64)
+    return np.concatenate(out)
+
+
+def _chains(segments):
+    """Order oriented segments into chains.
+
+    Returns (points, starts, closed): the chain points one chain after
+    another, the index of each chain's first point and whether the chain is
+    closed (its last point then repeats the first). Chains are ranked by
+    pointer jumping, so the work is a few array passes per doubling of the
+    longest chain rather than a Python step per point.
+    """
+    n = len(segments)
+    if n == 0:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    x_min = segments[:, [0, 2]].min()
+    y_min = segments[:, [1, 3]].min()
+    span = segments[:, [0, 2]].max() - x_min + 1
+    start_key = (segments[:, 1] - y_min) * span + segments[:, 0] - x_min
+    end_key = (segments[:, 3] - y_min) * span + segments[:, 2] - x_min
+    order = np.argsort(start_key)
+    pos = np.minimum(np.searchsorted(start_key[order], end_key), n - 1)
+    succ = np.where(start_key[order[pos]] == end_key, order[pos], -1)
+    linked = np.flatnonzero(succ >= 0)
+    pred = np.full(n, -1, dtype=np.int64)
+    pred[succ[linked]] = linked
+    graph = sparse.coo_matrix((np.ones(len(linked), dtype=np.int8), (linked, succ[linked])), shape=(n, n))
+    count, labels = csgraph.connected_components(graph, directed=True, connection='weak')
+    # Loops have no first segment: cut each one before its lowest segment
+    closed = np.ones(count, dtype=bool)
+    closed[labels[pred < 0]] = False
+    by_label = np.argsort(labels, kind='stable')
+    lowest = by_label[np.searchsorted(labels[by_label], np.arange(count))]
+    cut = lowest[closed]
+    succ[pred[cut]] = -1
+    # Steps from every segment to the last one of its chain
+    rank = (succ >= 0).astype(np.int64)
+    nxt = succ.copy()
+    live = np.flatnonzero(nxt >= 0)
+    while len(live):
+        rank[live] += rank[nxt[live]]
+        nxt[live] = nxt[nxt[live]]
+        live = live[nxt[live] >= 0]
+    ordered = segments[np.lexsort((-rank, labels))]
+    sizes = np.bincount(labels, minlength=count)
+    ends = np.cumsum(sizes)
+    points = np.insert(ordered[:, :2], ends, ordered[ends - 1, 2:], axis=0)
+    return points, ends - sizes + np.arange(count), closed
+
+
+def _drop_collinear(points, starts):
+    """Remove the chain points where the outline goes straight on; ends stay."""
+    n = len(points)
+    if n < 3:
+        return points, starts
+    # Marching squares steps are unit moves, so going straight repeats the step
+    step = np.diff(points, axis=0)
+    keep = np.ones(n, dtype=bool)
+    keep[1:-1] = np.any(step[:-1] != step[1:], axis=1)
+    keep[starts] = True
+    keep[starts[1:] - 1] = True
+    return points[keep], np.cumsum(keep)[starts] - 1
+
+
+def _chain_lengths(points, starts):
+    """Length of every chain in `points` (see _chains)."""
+    step = np.hypot(*np.diff(points, axis=0).T) if len(points) > 1 else np.zeros(0)
+    step = np.append(step, 0.0)
+    step[starts[1:] - 1] = 0.0
+    return np.add.reduceat(step, starts) if len(starts) else np.zeros(0)
+
+
+def _split(points, starts):
+    """The chains of `points` (see _chains) as a list of arrays."""
+    ends = np.append(starts[1:], len(points)).tolist()
+    return [points[a:b] for a, b in zip(starts.tolist(), ends)]
+
+
+def _simplify(points, starts, tolerance):
+    """Douglas-Peucker over every polyline of `points` at once; returns the kept (points, starts).
+
+    All polylines are split one level per pass of array operations, so
+    thousands of short outlines cost about as much as a single long one.
+    """
+    if not len(starts):
+        return points, starts
+    lengths = np.diff(np.append(starts, len(points)))
+    ends = starts + lengths - 1
+    keep = np.zeros(len(points), dtype=bool)
+    keep[starts] = keep[ends] = True
+    closed = (lengths > 3) & np.all(points[starts] == points[ends], axis=1)
+    far = ends.copy()
+    if closed.any():
+        owner = np.repeat(np.arange(len(lengths)), lengths)
+        dist = np.hypot(*(points - points[starts][owner]).T)
+        # The first farthest vertex of every polyline, like argmax
+        best = np.flatnonzero(dist == np.maximum.reduceat(dist, starts)[owner])
+        best = best[np.r_[True, np.diff(owner[best]) != 0]]
+        far[closed] = best[closed]
+        keep[far] = True
+    lo = np.concatenate([starts, far[closed]])
+    hi = np.concatenate([far, ends[closed]])
+    while True:
+        inner = hi > lo + 1
+        lo, hi = lo[inner], hi[inner]
+        if not len(lo):
+            break
+        counts = hi - lo - 1
+        offsets = np.cumsum(counts) - counts
+        span = np.repeat(np.arange(len(lo)), counts)
+        idx = np.arange(counts.sum()) - offsets[span] + lo[span] + 1
+        a = points[lo][span]
+        d = points[hi][span] - a
+        rel = points[idx] - a
+        norm = np.hypot(d[:, 0], d[:, 1])
+        dist = np.where(norm < 1e-12, np.hypot(rel[:, 0], rel[:, 1]),
+                        np.abs(rel[:, 0] * d[:, 1] - rel[:, 1] * d[:, 0]) / np.maximum(norm, 1e-12))
+        peak = np.maximum.reduceat(dist, offsets)
+        best = np.flatnonzero(dist == peak[span])
+        best = idx[best[np.r_[True, np.diff(span[best]) != 0]]]
+        split = peak > tolerance
+        keep[best[split]] = True
+        lo, hi = np.concatenate([lo[split], best[split]]), np.concatenate([best[split], hi[split]])
+    # Loops down to a triangle or less are thinner than the tolerance
+    thin = closed & (np.add.reduceat(keep.astype(np.int64), starts) < 4)
+    if thin.any():
+        keep[np.repeat(thin, lengths)] = False
+        keep[starts[thin]] = keep[far[thin]] = True
+    kept = np.add.reduceat(keep.astype(np.int64), starts)
+    return points[keep], np.cumsum(kept) - kept
+
+
+def simplify_polylines(polylines, tolerance):
+    """Douglas-Peucker for a list of open or closed (first == last) polylines.
+
+    Keeps the vertices farther than `tolerance` from the simplified line. A
+    loop is split at the vertex farthest from its start so both halves have
+    distinct ends; a loop thinner than the tolerance collapses to a single
+    segment.
+    """
+    if not polylines:
+        return []
+    lengths = np.array([len(p) for p in polylines])
+    points = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polylines])
+    return _split(*_simplify(points, np.cumsum(lengths) - lengths, tolerance))
+
+
+def _stitch(chains):
+    """Join open chains whose end points meet (chains cut at tile borders).
+
+    Segments are oriented, so a chain always continues at the start of the
+    next one and never needs reversing.
+    """
+    by_start = {tuple(c[0]): i for i, c in enumerate(chains)}
+    continued = {by_start.get(tuple(c[-1])) for c in chains}
+    used = [False] * len(chains)
+    out = []
+    # Chains nothing leads into first, then the loops that are left
+    for i in [i for i in range(len(chains)) if i not in continued] + list(range(len(chains))):
+        if used[i]:
+            continue
+        used[i] = True
+        parts = [chains[i]]
+        j = by_start.get(tuple(chains[i][-1]))
+        while j is not None and not used[j]:
+            used[j] = True
+            parts.append(chains[j][1:])
+            j = by_start.get(tuple(chains[j][-1]))
+        out.append(np.concatenate(parts))
+    return out
+
+
+def _select(points, starts, chosen):
+    """Only the `chosen` chains of `points` (a bool per chain)."""
+    sizes = np.diff(np.append(starts, len(points)))
+    sizes_kept = sizes[chosen]
+    return points[np.repeat(chosen, sizes)], np.cumsum(sizes_kept) - sizes_kept
+
+
+def _polylines(points, starts, min_length, tolerance):
+    """Chains in doubled coordinates as simplified polylines in cells, dropping the short ones."""
+    points, starts = _drop_collinear(points, starts)
+    points, starts = _select(points, starts, _chain_lengths(points, starts) / 2.0 >= min_length)
+    points = points / 2.0
+    return _simplify(points, starts, tolerance) if tolerance > 0 else (points, starts)
+
+
+def _trace_tile(padded, tile, tolerance, min_length):
+    """The finished outlines that close inside a tile, and its open chains for stitching."""
+    points, starts, closed = _chains(_tile_segments(padded, *tile))
+    open_chains = []
+    if not closed.all():
+        open_chains = [c for c, done in zip(_split(points, starts), closed) if not done]
+        points, starts = _select(points, starts, closed)
+    return _polylines(points, starts, min_length, tolerance), open_chains
+
+
+def wall_contours(occupied, tolerance=0.5, min_length=4.0, tile_size=TILE_SIZE, workers=None,
+                  progress=None, cancelled=None):
+    """Outline the occupied cells as simplified polylines in cell coordinates.
+
+    Tiles are traced on a thread pool, each simplifying the outlines that
+    close inside it; chains crossing tile borders are stitched into whole
+    contours and simplified after. Douglas-Peucker simplifies to `tolerance`
+    cells (0 keeps every corner). Contours shorter than `min_length` cells
+    (isolated specks) are dropped. Returns a list of (n, 2) float arrays of
+    scene (x, y) points, closed ones repeating their first point, or None if
+    cancelled.
+    """
+    h, w = occupied.shape
+    padded = np.pad(occupied.astype(bool), 1)
+    # Squares have top-left corners in padded rows 0..h and columns 0..w
+    tiles = [(r0, min(h + 1, r0 + tile_size), c0, min(w + 1, c0 + tile_size))
+             for r0 in range(0, h + 1, tile_size) for c0 in range(0, w + 1, tile_size)]
+    out = []
+    crossing = []
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        for loops, open_chains in pool.map(lambda t: _trace_tile(padded, t, tolerance, min_length), tiles):
+            out.extend(_split(*loops))
+            crossing.extend(open_chains)
+            done += 1
+            if progress is not None:
+                progress(done, len(tiles) + 1)
+            if cancelled is not None and cancelled():
+                return None
+    if crossing:
+        chains = _stitch(crossing)
+        sizes = np.array([len(c) for c in chains])
+        out.extend(_split(*_polylines(np.concatenate(chains), np.cumsum(sizes) - sizes, min_length, tolerance)))
+    if progress is not None:
+        progress(len(tiles) + 1, len(tiles) + 1)
+    return out
+
+
+def _fmt(v):
+    text = f"{v:.4f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+
+def svg_document(walls, dimensions=(), stroke=0.05, text_height=0.2):
+    """SVG text for wall polylines and dimensions in world meters (y up).
+
+    `walls` is a list of (n, 2) arrays; `dimensions` a list of
+    ((x0, y0), (x1, y1), label). The SVG y axis points down, so y is negated.
+    """
+    pts = [np.asarray(p, dtype=np.float64) for p in walls if len(p)]
+    pts += [np.array([a, b], dtype=np.float64) for a, b, _ in dimensions]
+    if pts:
+        allp = np.concatenate(pts)
+        x0, y0 = allp.min(axis=0) - 1.0
+        x1, y1 = allp.max(axis=0) + 1.0
+    else:
+        x0 = y0 = 0.0
+        x1 = y1 = 1.0
+    width, height = x1 - x0, y1 - y0
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             f'<svg xmlns="http://www.w3.org/2000/svg" width="{_fmt(width)}m" height="{_fmt(height)}m" '
+             f'viewBox="{_fmt(x0)} {_fmt(-y1)} {_fmt(width)} {_fmt(height)}">',
+             f'<g id="walls" fill="none" stroke="black" stroke-width="{_fmt(stroke)}" '
+             f'stroke-linejoin="round" stroke-linecap="round">']
+    for p in walls:
+        if len(p) < 2:
+            continue
+        closed = len(p) > 3 and np.array_equal(p[0], p[-1])
+        ring = p[:-1] if closed else p
+        coords = ' '.join(f"{_fmt(x)},{_fmt(-y)}" for x, y in ring)
+        lines.append(f'<{"polygon" if closed else "polyline"} points="{coords}"/>')
+    lines.append('</g>')
+    lines.append(f'<g id="dimensions" stroke="#c08000" stroke-width="{_fmt(stroke / 2)}" fill="#c08000" '
+                 f'font-family="sans-serif" font-size="{_fmt(text_height)}" text-anchor="middle">')
+    for (ax, ay), (bx, by), label in dimensions:
+        lines.append(f'<line x1="{_fmt(ax)}" y1="{_fmt(-ay)}" x2="{_fmt(bx)}" y2="{_fmt(-by)}"/>')
+        mx, my = (ax + bx) / 2.0, -(ay + by) / 2.0
+        angle = np.degrees(np.arctan2(-(by - ay), bx - ax))
+        if angle > 90 or angle < -90:
+            angle -= 180 * np.sign(angle)
+        lines.append(f'<text x="{_fmt(mx)}" y="{_fmt(my - text_height / 3)}" stroke="none" '
+                     f'transform="rotate({_fmt(angle)} {_fmt(mx)} {_fmt(my)})">{label}</text>')
+    lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+
+def dxf_document(walls, dimensions=(), text_height=0.2):
+    """ASCII DXF (R12) for wall polylines (layer WALLS) and dimensions (layer DIMENSIONS), in meters."""
+    out = ['0', 'SECTION', '2', 'HEADER', '9', '$ACADVER', '1', 'AC1009',
+           '9', '$INSUNITS', '70', '6', '0', 'ENDSEC',
+           '0', 'SECTION', '2', 'ENTITIES']
+    for p in walls:
+        if len(p) < 2:
+            continue
+        closed = len(p) > 3 and np.array_equal(p[0], p[-1])
+        ring = p[:-1] if closed else p
+        out += ['0', 'POLYLINE', '8', 'WALLS', '66', '1', '70', '1' if closed else '0',
+                '10', '0', '20', '0', '30', '0']
+        for x, y in ring:
+            out += ['0', 'VERTEX', '8', 'WALLS', '10', _fmt(x), '20', _fmt(y), '30', '0']
+        out += ['0', 'SEQEND', '8', 'WALLS']
+    for (ax, ay), (bx, by), label in dimensions:
+        out += ['0', 'LINE', '8', 'DIMENSIONS', '10', _fmt(ax), '20', _fmt(ay), '30', '0',
+                '11', _fmt(bx), '21', _fmt(by), '31', '0']
+        angle = np.degrees(np.arctan2(by - ay, bx - ax))
+        if angle > 90 or angle < -90:
+            angle -= 180 * np.sign(angle)
+        mx, my = (ax + bx) / 2.0, (ay + by) / 2.0
+        out += ['0', 'TEXT', '8', 'DIMENSIONS', '10', _fmt(mx), '20', _fmt(my), '30', '0',
+                '40', _fmt(text_height), '1', label, '50', _fmt(angle),
+                '72', '1', '11', _fmt(mx), '21', _fmt(my), '31', '0']
+    out += ['0', 'ENDSEC', '0', 'EOF']
+    return '\n'.join(out) + '\n'
+
+
+def write_svg(path, walls, dimensions=()):
+    write_atomic(path, svg_document(walls, dimensions).encode('utf-8'))
+
+
+def write_dxf(path, walls, dimensions=()):
+    write_atomic(path, dxf_document(walls, dimensions).encode('ascii', 'replace'))
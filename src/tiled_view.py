@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+# Tiled rendering of cell arrays into a QGraphicsScene.
+#
+# Instead of one scene item per cell, a layer is split into TILE_SIZE x
+# TILE_SIZE blocks that are turned into pixmap items only when they scroll
+# into view. Edits invalidate single tiles, so repainting a brush stroke
+# costs one small image upload rather than a scene rebuild.
+
+from PyQt5 import QtGui, QtWidgets
+from PyQt5.QtCore import Qt
+
+import numpy as np
+
+
+TILE_SIZE = 256
+
+
+def tile_range(x0, y0, x1, y1, tile_size=TILE_SIZE):
+    """Return (tx0, ty0, tx1, ty1), inclusive, of tiles touching cells [x0, x1) x [y0, y1)."""
+    return (max(0, x0) // tile_size, max(0, y0) // tile_size,
+            max(0, x1 - 1) // tile_size, max(0, y1 - 1) // tile_size)
+
+
+def indexed_image(cells, color_table):
+    """Wrap a 2D uint8 array as an Indexed8 QImage (copied, so the array may change)."""
+    cells = np.ascontiguousarray(cells)
+    h, w = cells.shape
+    qim = QtGui.QImage(cells.data, w, h, w, QtGui.QImage.Format_Indexed8)
+    qim.setColorTable(color_table)
+    return qim.copy()
+
+
+def color_table_rgba(color_table):
+    """Turn a list of QRgb values into a (n, 4) uint8 RGBA lookup array."""
+    argb = np.asarray(color_table, dtype=np.uint32)
+    return np.stack([(argb >> 16) & 255, (argb >> 8) & 255, argb & 255, argb >> 24], axis=1).astype(np.uint8)
+
+
+def rgba_image(rgba):
+    """Wrap an (h, w, 4) uint8 RGBA array as a QImage (copied)."""
+    rgba = np.ascontiguousarray(rgba)
+    h, w = rgba.shape[:2]
+    qim = QtGui.QImage(rgba.data, w, h, w * 4, QtGui.QImage.Format_RGBA8888)
+    return qim.copy()
+
+
+class TiledLayer(object):
+    """A lazily materialized grid of pixmap tiles covering a width x height cell area.
+
+    `tile_source(x0, y0, x1, y1)` returns a QImage for the cells
+    [x0, x1) x [y0, y1), or None to leave the tile empty.
+    """
+
+    def __init__(self, scene, width, height, tile_source, z=0, tile_size=TILE_SIZE):
+        self.scene = scene
+        self.width = width
+        self.height = height
+        self.tile_source = tile_source
+        self.z = z
+        self.tile_size = tile_size
+        self.scale = 1.0
+        self.visible = True
+        self.items = {}
+        self._last_rect = None
+
+    @property
+    def tiles_x(self):
+        return (self.width + self.tile_size - 1) // self.tile_size
+
+    @property
+    def tiles_y(self):
+        return (self.height + self.tile_size - 1) // self.tile_size
+
+    def tile_bounds(self, ty, tx):
+        ts = self.tile_size
+        return tx * ts, ty * ts, min(self.width, (tx + 1) * ts), min(self.height, (ty + 1) * ts)
+
+    def set_scale(self, pixels_per_cell):
+        self.scale = float(pixels_per_cell)
+        for (ty, tx), item in self.items.items():
+            x0, y0, _, _ = self.tile_bounds(ty, tx)
+            item.setScale(self.scale)
+            item.setPos(x0 * self.scale, y0 * self.scale)
+
+    def set_visible(self, visible):
+        self.visible = bool(visible)
+        for item in self.items.values():
+            item.setVisible(self.visible)
+        if self.visible and self._last_rect is not None:
+            self.update_visible(*self._last_rect)
+
+    def _make_item(self, ty, tx):
+        x0, y0, x1, y1 = self.tile_bounds(ty, tx)
+        qim = self.tile_source(x0, y0, x1, y1)
+        if qim is None:
+            return None
+        item = QtWidgets.QGraphicsPixmapItem(QtGui.QPixmap.fromImage(qim))
+        item.setTransformationMode(Qt.FastTransformation)
+        item.setShapeMode(QtWidgets.QGraphicsPixmapItem.BoundingRectShape)
+        item.setAcceptedMouseButtons(Qt.NoButton)
+        item.setScale(self.scale)
+        item.setPos(x0 * self.scale, y0 * self.scale)
+        item.setZValue(self.z)
+        item.setVisible(self.visible)
+        self.scene.addItem(item)
+        return item
+
+    def update_visible(self, x0, y0, x1, y1, margin=1):
+        """Materialize tiles intersecting the cell rectangle [x0, x1) x [y0, y1)."""
+        self._last_rect = (x0, y0, x1, y1)
+        if not self.visible:
+            return
+        tx0, ty0, tx1, ty1 = tile_range(x0, y0, x1, y1, self.tile_size)
+        for ty in range(max(0, ty0 - margin), min(self.tiles_y, ty1 + margin + 1)):
+            for tx in range(max(0, tx0 - margin), min(self.tiles_x, tx1 + margin + 1)):
+                if (ty, tx) not in self.items:
+                    item = self._make_item(ty, tx)
+                    if item is not None:
+                        self.items[(ty, tx)] = item
+
+    def invalidate(self, tiles=None):
+        """Re-render materialized tiles (all of them when `tiles` is None)."""
+        keys = list(self.items.keys()) if tiles is None else [t for t in tiles if t in self.items]
+        for key in keys:
+            item = self.items[key]
+            x0, y0, x1, y1 = self.tile_bounds(*key)
+            qim = self.tile_source(x0, y0, x1, y1)
+            if qim is None:
+                self.scene.removeItem(item)
+                del self.items[key]
+            else:
+                item.setPixmap(QtGui.QPixmap.fromImage(qim))
+        if tiles is not None:
+            # Tiles that were empty before may have content now
+            for key in tiles:
+                if key not in self.items and self._last_rect is not None and self.visible:
+                    tx0, ty0, tx1, ty1 = tile_range(*self._last_rect, tile_size=self.tile_size)
+                    ty, tx = key
+                    if ty0 - 1 <= ty <= ty1 + 1 and tx0 - 1 <= tx <= tx1 + 1:
+                        item = self._make_item(ty, tx)
+                        if item is not None:
+                            self.items[key] = item
+
+    def refresh(self):
+        """Drop all tiles and rebuild the visible ones from the source."""
+        self.clear()
+        if self._last_rect is not None:
+            self.update_visible(*self._last_rect)
+
+    def clear(self):
+        for item in self.items.values():
+            try:
+                self.scene.removeItem(item)
+            except Exception:
+                pass
+        self.items = {}
@@ -161,8 +161,11 @@ class Ui_MapEditor(object):
         self.toolModeBox.addItem("🖱️ Select", "select")
         self.toolModeBox.addItem("🖌️ Paint", "paint")
         self.toolModeBox.addItem("📏 Measure", "measure")
+        self.toolModeBox.addItem("🔷 Area", "area")
+        self.toolModeBox.addItem("🪣 Fill", "fill")
         self.toolModeBox.addItem("➖ Line", "line")
         self.toolModeBox.addItem("🔤 Text", "text")
+        self.toolModeBox.addItem("🧭 Path", "path")
         self.toolModeLayout.addWidget(self.toolModeLabel)
         self.toolModeLayout.addWidget(self.toolModeBox)
         
@@ -194,6 +197,48 @@ class Ui_MapEditor(object):
         self.cursorLayout.addWidget(self.cursorSizeSlider)
         self.cursorLayout.addWidget(self.cursorSizeSpinBox)
 
+        # Fill connectivity
+        self.fillLayout = QtWidgets.QHBoxLayout()
+        self.fillLabel = QtWidgets.QLabel("Fill:")
+        self.fillConnectivityBox = QtWidgets.QComboBox()
+        self.fillConnectivityBox.addItem("4-connected", 4)
+        self.fillConnectivityBox.addItem("8-connected", 8)
+        self.fillConnectivityBox.setToolTip("8-connected fills also leak through diagonal gaps")
+        self.fillLayout.addWidget(self.fillLabel)
+        self.fillLayout.addWidget(self.fillConnectivityBox)
+
+        # Area tool: click-to-place polygon or connected free region
+        self.areaLayout = QtWidgets.QHBoxLayout()
+        self.areaLabel = QtWidgets.QLabel("Area:")
+        self.areaModeBox = QtWidgets.QComboBox()
+        self.areaModeBox.addItem("Polygon", "polygon")
+        self.areaModeBox.addItem("Region (click free space)", "region")
+        self.areaModeBox.setToolTip("Polygon: click the corners, click the first one or press Enter to close.\n"
+                                    "Region: click free space to measure the connected free area around it.")
+        self.areaLayout.addWidget(self.areaLabel)
+        self.areaLayout.addWidget(self.areaModeBox)
+
+        # Path checker: plan over free cells, optionally with inflation costs
+        self.pathLayout = QtWidgets.QHBoxLayout()
+        self.pathInflationCheck = QtWidgets.QCheckBox("Use inflation costs")
+        self.pathInflationCheck.setToolTip("Plan on the nav2 inflation costmap (parameters from Analyze → "
+                                           "Inflation cost preview): cells within the inscribed radius are "
+                                           "blocked and paths keep away from walls")
+        self.pathLayout.addWidget(self.pathInflationCheck)
+
+        # Snapping of measure/line endpoints to wall faces
+        self.snapLayout = QtWidgets.QHBoxLayout()
+        self.snapCheck = QtWidgets.QCheckBox("🧲 Snap to walls")
+        self.snapCheck.setChecked(True)
+        self.snapCheck.setToolTip("Measure, line and area points jump to the nearest wall face (hold Shift to place freely)")
+        self.snapToleranceSpin = QtWidgets.QSpinBox()
+        self.snapToleranceSpin.setRange(1, 50)
+        self.snapToleranceSpin.setValue(6)
+        self.snapToleranceSpin.setSuffix(" cells")
+        self.snapToleranceSpin.setToolTip("How far away a wall may be to snap to it")
+        self.snapLayout.addWidget(self.snapCheck)
+        self.snapLayout.addWidget(self.snapToleranceSpin)
+
         # Line thickness
         self.lineThicknessLayout = QtWidgets.QHBoxLayout()
         self.lineThicknessLabel = QtWidgets.QLabel("Line Thickness:")
@@ -267,6 +312,10 @@ class Ui_MapEditor(object):
         self.toolsLayout.addLayout(self.toolModeLayout)
         self.toolsLayout.addLayout(self.colorLayout)
         self.toolsLayout.addLayout(self.cursorLayout)
+        self.toolsLayout.addLayout(self.fillLayout)
+        self.toolsLayout.addLayout(self.areaLayout)
+        self.toolsLayout.addLayout(self.pathLayout)
+        self.toolsLayout.addLayout(self.snapLayout)
         self.toolsLayout.addLayout(self.lineThicknessLayout)
         self.toolsLayout.addLayout(self.textPropLayout)
         
@@ -314,12 +363,14 @@ class Ui_MapEditor(object):
         self.rotationSlider.setMaximum(180)
         self.rotationSlider.setValue(0)
         self.rotationSlider.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
-        self.rotationSpinBox = QtWidgets.QSpinBox()
+        # Fractional degrees so detected wall angles can be shown exactly
+        self.rotationSpinBox = QtWidgets.QDoubleSpinBox()
+        self.rotationSpinBox.setDecimals(1)
         self.rotationSpinBox.setMinimum(-180)
         self.rotationSpinBox.setMaximum(180)
         self.rotationSpinBox.setValue(0)
         self.rotationSpinBox.setSuffix("°")
-        self.rotationSpinBox.setMaximumWidth(70)
+        self.rotationSpinBox.setMaximumWidth(80)
         # Ensure up/down arrows are visible in the spin box
         try:
             self.rotationSpinBox.setButtonSymbols(QtWidgets.QAbstractSpinBox.UpDownArrows)
@@ -327,6 +378,9 @@ class Ui_MapEditor(object):
             pass
         self.resetRotationBtn = QtWidgets.QPushButton("↺ Reset")
         self.resetRotationBtn.setFixedWidth(72)
+        self.detectRotationBtn = QtWidgets.QPushButton("📐 Auto")
+        self.detectRotationBtn.setFixedWidth(72)
+        self.detectRotationBtn.setToolTip("Detect the dominant wall angle and propose a rotation that aligns it")
 
         self.rotationGrid = QtWidgets.QGridLayout()
         self.rotationGrid.setHorizontalSpacing(8)
@@ -335,15 +389,50 @@ class Ui_MapEditor(object):
         self.rotationGrid.addWidget(self.rotationLabel,   0, 0)
         self.rotationGrid.addWidget(self.rotationSpinBox, 0, 1)
         self.rotationGrid.addWidget(self.resetRotationBtn,0, 2)
+        self.rotationGrid.addWidget(self.detectRotationBtn, 0, 3)
         # Row 1: full-width slider
-        self.rotationGrid.addWidget(self.rotationSlider,  1, 0, 1, 3)
+        self.rotationGrid.addWidget(self.rotationSlider,  1, 0, 1, 4)
         # Make the slider column stretch
         self.rotationGrid.setColumnStretch(0, 0)
         self.rotationGrid.setColumnStretch(1, 0)
         self.rotationGrid.setColumnStretch(2, 1)
 
+        # Classification thresholds (trinary occupied / unknown / free)
+        self.thresholdGrid = QtWidgets.QGridLayout()
+        self.thresholdGrid.setHorizontalSpacing(8)
+        self.occupiedThreshLabel = QtWidgets.QLabel("Occupied ≥")
+        self.occupiedThreshSlider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.occupiedThreshSlider.setRange(0, 100)
+        self.occupiedThreshSpin = QtWidgets.QDoubleSpinBox()
+        self.occupiedThreshSpin.setRange(0.0, 1.0)
+        self.occupiedThreshSpin.setDecimals(3)
+        self.occupiedThreshSpin.setSingleStep(0.01)
+        self.occupiedThreshSpin.setMaximumWidth(80)
+        self.freeThreshLabel = QtWidgets.QLabel("Free ≤")
+        self.freeThreshSlider = QtWidgets.QSlider(QtCore.Qt.Horizontal)
+        self.freeThreshSlider.setRange(0, 100)
+        self.freeThreshSpin = QtWidgets.QDoubleSpinBox()
+        self.freeThreshSpin.setRange(0.0, 1.0)
+        self.freeThreshSpin.setDecimals(3)
+        self.freeThreshSpin.setSingleStep(0.01)
+        self.freeThreshSpin.setMaximumWidth(80)
+        self.resetThreshBtn = QtWidgets.QPushButton("↺ YAML")
+        self.resetThreshBtn.setToolTip("Restore the thresholds from the map YAML")
+        self.resetThreshBtn.setFixedWidth(72)
+        for w in (self.occupiedThreshSlider, self.occupiedThreshSpin, self.freeThreshSlider, self.freeThreshSpin):
+            w.setToolTip("Occupancy probability thresholds; saved to the output YAML")
+        self.thresholdGrid.addWidget(self.occupiedThreshLabel,  0, 0)
+        self.thresholdGrid.addWidget(self.occupiedThreshSlider, 0, 1)
+        self.thresholdGrid.addWidget(self.occupiedThreshSpin,   0, 2)
+        self.thresholdGrid.addWidget(self.freeThreshLabel,      1, 0)
+        self.thresholdGrid.addWidget(self.freeThreshSlider,     1, 1)
+        self.thresholdGrid.addWidget(self.freeThreshSpin,       1, 2)
+        self.thresholdGrid.addWidget(self.resetThreshBtn,       0, 3, 2, 1)
+        self.thresholdGrid.setColumnStretch(1, 1)
+
         self.viewLayout.addLayout(self.zoomLayout)
         self.viewLayout.addLayout(self.rotationGrid)
+        self.viewLayout.addLayout(self.thresholdGrid)
         
         # Action buttons
         # Use a grid layout here so buttons never overlap and can wrap into two tidy rows
@@ -491,8 +580,98 @@ class Ui_MapEditor(object):
         # File menu
         self.fileMenu = self.menubar.addMenu("File")
         self.viewMenu = self.menubar.addMenu("View")
+        self.mapMenu = self.menubar.addMenu("Map")
+        self.analyzeMenu = self.menubar.addMenu("Analyze")
         self.helpMenu = self.menubar.addMenu("Help")
-        
+
+        # File menu actions
+        self.actionBrowseMaps = QtWidgets.QAction("Browse maps…", MapEditor)
+        self.actionBrowseMaps.setShortcut("Ctrl+O")
+        self.actionBrowseMaps.setToolTip("Show the map library with thumbnails of every indexed map")
+        self.actionSaveNative = QtWidgets.QAction("Save as native tiled map (.rmap)", MapEditor)
+        self.actionSaveNative.setCheckable(True)
+        self.actionSaveNative.setToolTip("Save only changed tiles to output/<name>.rmap instead of a full PGM")
+        self.actionExportRos = QtWidgets.QAction("Export ROS map (PGM + YAML)", MapEditor)
+        self.actionAutosave = QtWidgets.QAction("Autosave", MapEditor)
+        self.actionAutosave.setCheckable(True)
+        self.actionAutosave.setChecked(True)
+        self.actionAutosaveSettings = QtWidgets.QAction("Autosave settings…", MapEditor)
+        self.actionRestoreAutosave = QtWidgets.QAction("Restore autosave", MapEditor)
+        self.actionRestoreAutosave.setEnabled(False)
+        self.fileMenu.addAction(self.actionBrowseMaps)
+        self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.actionSaveNative)
+        self.fileMenu.addAction(self.actionExportRos)
+        self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.actionAutosave)
+        self.fileMenu.addAction(self.actionAutosaveSettings)
+        self.fileMenu.addAction(self.actionRestoreAutosave)
+        
+        # Map menu actions (whole-map cleanup)
+        self.actionRemoveSpeckles = QtWidgets.QAction("Remove speckles…", MapEditor)
+        self.actionRemoveSpeckles.setToolTip("Erase small occupied blobs (laser noise) in one step")
+        self.actionMorphology = QtWidgets.QAction("Morphology pipeline…", MapEditor)
+        self.actionMorphology.setToolTip("Open/close/dilate/erode occupied, free or unknown cells")
+        self.mapMenu.addAction(self.actionRemoveSpeckles)
+        self.mapMenu.addAction(self.actionMorphology)
+        self.actionStraightenWalls = QtWidgets.QAction("Straighten walls…", MapEditor)
+        self.actionStraightenWalls.setToolTip("Detect straight wall segments and redraw them as crisp lines")
+        self.mapMenu.addAction(self.actionStraightenWalls)
+        self.mapMenu.addSeparator()
+        self.actionBakeRotation = QtWidgets.QAction("Apply rotation to map", MapEditor)
+        self.actionBakeRotation.setToolTip("Resample the map so the view rotation is saved with it")
+        self.mapMenu.addAction(self.actionBakeRotation)
+        self.actionDetectWallAngle = QtWidgets.QAction("Detect wall angle", MapEditor)
+        self.actionDetectWallAngle.setToolTip("Estimate the dominant wall orientation and propose an aligning rotation")
+        self.mapMenu.addAction(self.actionDetectWallAngle)
+        self.mapMenu.addSeparator()
+        self.actionCropToKnown = QtWidgets.QAction("Crop to known area", MapEditor)
+        self.actionCropToKnown.setToolTip("Cut away the unknown border, keeping a margin")
+        self.mapMenu.addAction(self.actionCropToKnown)
+        self.actionResizeCanvas = QtWidgets.QAction("Crop / pad canvas…", MapEditor)
+        self.actionResizeCanvas.setToolTip("Add or remove cells on each side of the map")
+        self.mapMenu.addAction(self.actionResizeCanvas)
+        self.actionResample = QtWidgets.QAction("Change resolution…", MapEditor)
+        self.actionResample.setToolTip("Resample the map to a coarser or finer cell size")
+        self.mapMenu.addAction(self.actionResample)
+        self.mapMenu.addSeparator()
+        self.actionRasterizeLines = QtWidgets.QAction("Rasterize selected lines into map", MapEditor)
+        self.actionRasterizeLines.setToolTip("Draw the selected lines into the map as occupied cells (virtual walls)")
+        self.mapMenu.addAction(self.actionRasterizeLines)
+
+        # Analyze menu: measurements and checks that read the map
+        self.actionAutoDimension = QtWidgets.QAction("Auto-dimension room", MapEditor)
+        self.actionAutoDimension.setShortcut("Ctrl+D")
+        self.actionAutoDimension.setToolTip("Click inside a room to dimension its width and depth")
+        self.analyzeMenu.addAction(self.actionAutoDimension)
+        self.actionDetectDoorways = QtWidgets.QAction("Detect doorways", MapEditor)
+        self.actionDetectDoorways.setToolTip("Find gaps in walls and dimension each doorway")
+        self.analyzeMenu.addAction(self.actionDetectDoorways)
+        self.actionAlignAutoDimensions = QtWidgets.QAction("Align to walls", MapEditor)
+        self.actionAlignAutoDimensions.setCheckable(True)
+        self.actionAlignAutoDimensions.setChecked(True)
+        self.actionAlignAutoDimensions.setToolTip("Measure along the dominant wall directions instead of the map axes")
+        self.analyzeMenu.addAction(self.actionAlignAutoDimensions)
+        self.analyzeMenu.addSeparator()
+        self.actionClearance = QtWidgets.QAction("Clearance heatmap…", MapEditor)
+        self.actionClearance.setToolTip("Color free cells by their distance to the nearest obstacle")
+        self.analyzeMenu.addAction(self.actionClearance)
+        self.actionInflation = QtWidgets.QAction("Inflation cost preview…", MapEditor)
+        self.actionInflation.setToolTip("Preview the nav2 inflation layer for inflation_radius and cost_scaling_factor")
+        self.analyzeMenu.addAction(self.actionInflation)
+        self.analyzeMenu.addSeparator()
+        self.actionReachability = QtWidgets.QAction("Reachability from start…", MapEditor)
+        self.actionReachability.setToolTip("Find free regions a robot at a start cell cannot reach")
+        self.analyzeMenu.addAction(self.actionReachability)
+        self.analyzeMenu.addSeparator()
+        self.actionVectorizeWalls = QtWidgets.QAction("Vectorize walls…", MapEditor)
+        self.actionVectorizeWalls.setToolTip("Trace the walls as simplified polylines and export them to SVG/DXF")
+        self.analyzeMenu.addAction(self.actionVectorizeWalls)
+        self.analyzeMenu.addSeparator()
+        self.actionCompareMaps = QtWidgets.QAction("Compare with map…", MapEditor)
+        self.actionCompareMaps.setToolTip("Show cells that differ from a reference map (e.g. the last cleaned map)")
+        self.analyzeMenu.addAction(self.actionCompareMaps)
+
         MapEditor.setMenuBar(self.menubar)
         
         # Enhanced status bar
@@ -511,8 +690,11 @@ class Ui_MapEditor(object):
         self.cursorSizeSpinBox.valueChanged.connect(self.cursorSizeSlider.setValue)
         self.lineThicknessSlider.valueChanged.connect(self.lineThicknessSpinBox.setValue)
         self.lineThicknessSpinBox.valueChanged.connect(self.lineThicknessSlider.setValue)
-        self.rotationSlider.valueChanged.connect(self.rotationSpinBox.setValue)
-        self.rotationSpinBox.valueChanged.connect(self.rotationSlider.setValue)
+        # The slider moves in whole degrees; only push it to the spinbox when the
+        # rounded values differ so fractional angles typed in the spinbox survive
+        self.rotationSlider.valueChanged.connect(
+            lambda v: self.rotationSpinBox.setValue(v) if int(round(self.rotationSpinBox.value())) != v else None)
+        self.rotationSpinBox.valueChanged.connect(lambda v: self.rotationSlider.setValue(int(round(v))))
         
         self.retranslateUi(MapEditor)
         QtCore.QMetaObject.connectSlotsByName(MapEditor)
@@ -0,0 +1,684 @@
+# -*- coding: utf-8 -*-
+
+# Tool panels for map cleanup operations.
+#
+# Panels only collect parameters and emit signals; the editor owns the map,
+# computes previews and applies edits (so everything stays undoable).
+
+from PyQt5 import QtCore, QtWidgets
+
+
+class SpeckleDialog(QtWidgets.QDialog):
+    """Parameters for removing small occupied components (laser noise).
+
+    Emits `previewChanged(threshold, unit, connectivity)` (debounced) while
+    the user edits, `applyRequested(...)` on Apply and `closed()` when the
+    dialog goes away. `unit` is 'cells' or 'm2'.
+    """
+    previewChanged = QtCore.pyqtSignal(float, str, int)
+    applyRequested = QtCore.pyqtSignal(float, str, int)
+    closed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(SpeckleDialog, self).__init__(parent)
+        self.setWindowTitle("Remove speckles")
+        self.setModal(False)
+
+        layout = QtWidgets.QFormLayout(self)
+        self.thresholdSpin = QtWidgets.QDoubleSpinBox(self)
+        self.thresholdSpin.setRange(0.0, 1e6)
+        self.thresholdSpin.setDecimals(3)
+        self.thresholdSpin.setValue(4)
+        self.unitBox = QtWidgets.QComboBox(self)
+        self.unitBox.addItem("cells", 'cells')
+        self.unitBox.addItem("m²", 'm2')
+        sizeRow = QtWidgets.QHBoxLayout()
+        sizeRow.addWidget(self.thresholdSpin)
+        sizeRow.addWidget(self.unitBox)
+        layout.addRow("Remove blobs smaller than:", sizeRow)
+
+        self.connectivityBox = QtWidgets.QComboBox(self)
+        self.connectivityBox.addItem("8-connected", 8)
+        self.connectivityBox.addItem("4-connected", 4)
+        self.connectivityBox.setToolTip("8-connected treats diagonally touching cells as one blob")
+        layout.addRow("Blob connectivity:", self.connectivityBox)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        layout.addRow(self.summaryLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(self)
+        self.applyBtn = buttons.addButton("Apply", QtWidgets.QDialogButtonBox.AcceptRole)
+        buttons.addButton(QtWidgets.QDialogButtonBox.Close)
+        self.applyBtn.clicked.connect(lambda: self.applyRequested.emit(*self.params()))
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        # Relabeling big maps is not free; wait for typing to settle
+        self._debounce = QtCore.QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(150)
+        self._debounce.timeout.connect(lambda: self.previewChanged.emit(*self.params()))
+        self.thresholdSpin.valueChanged.connect(self._debounce.start)
+        self.unitBox.currentIndexChanged.connect(self._debounce.start)
+        self.connectivityBox.currentIndexChanged.connect(self._debounce.start)
+
+    def params(self):
+        return (self.thresholdSpin.value(), self.unitBox.currentData(),
+                int(self.connectivityBox.currentData()))
+
+    def setSummary(self, blobs, cells, area_m2):
+        self.summaryLbl.setText(f"{blobs} blobs, {cells} cells ({area_m2:.2f} m²) will become free")
+        self.applyBtn.setEnabled(blobs > 0)
+
+    def showEvent(self, event):
+        super(SpeckleDialog, self).showEvent(event)
+        self._debounce.start(0)
+
+    def done(self, result):
+        self._debounce.stop()
+        super(SpeckleDialog, self).done(result)
+        self.closed.emit()
+
+
+class MorphologyPanel(QtWidgets.QDockWidget):
+    """Builds a chain of morphological steps on one cell class each.
+
+    Emits `pipelineChanged(steps)` whenever the chain or the preview toggle
+    changes (steps is an empty list while preview is off), `applyRequested(steps)`
+    and `cancelRequested()`. A step is a tuple (op, class_name, size).
+    """
+    pipelineChanged = QtCore.pyqtSignal(list)
+    applyRequested = QtCore.pyqtSignal(list)
+    cancelRequested = QtCore.pyqtSignal()
+    closed = QtCore.pyqtSignal()
+
+    OPS = [("Dilate", 'dilate'), ("Erode", 'erode'), ("Open", 'open'), ("Close", 'close')]
+    CLASSES = [("Occupied", 'occupied'), ("Free", 'free'), ("Unknown", 'unknown')]
+
+    def __init__(self, parent=None):
+        super(MorphologyPanel, self).__init__("🧹 Morphology", parent)
+        self.setObjectName("morphologyDock")
+        body = QtWidgets.QWidget(self)
+        layout = QtWidgets.QVBoxLayout(body)
+        layout.setContentsMargins(6, 6, 6, 6)
+
+        stepRow = QtWidgets.QHBoxLayout()
+        self.opBox = QtWidgets.QComboBox(body)
+        for label, op in self.OPS:
+            self.opBox.addItem(label, op)
+        self.classBox = QtWidgets.QComboBox(body)
+        for label, cls in self.CLASSES:
+            self.classBox.addItem(label, cls)
+        self.sizeSpin = QtWidgets.QSpinBox(body)
+        self.sizeSpin.setRange(1, 50)
+        self.sizeSpin.setSuffix(" cells")
+        self.addBtn = QtWidgets.QPushButton("➕", body)
+        self.addBtn.setToolTip("Append step")
+        self.addBtn.clicked.connect(self.addStep)
+        stepRow.addWidget(self.opBox)
+        stepRow.addWidget(self.classBox)
+        stepRow.addWidget(self.sizeSpin)
+        stepRow.addWidget(self.addBtn)
+
+        self.stepList = QtWidgets.QListWidget(body)
+        self.stepList.setDragDropMode(QtWidgets.QAbstractItemView.InternalMove)
+        self.stepList.model().rowsMoved.connect(self._emitChanged)
+
+        listBtns = QtWidgets.QHBoxLayout()
+        self.removeBtn = QtWidgets.QPushButton("➖ Remove", body)
+        self.removeBtn.clicked.connect(self.removeStep)
+        self.clearBtn = QtWidgets.QPushButton("🗑️ Clear", body)
+        self.clearBtn.clicked.connect(self.clearSteps)
+        listBtns.addWidget(self.removeBtn)
+        listBtns.addWidget(self.clearBtn)
+
+        self.previewCheck = QtWidgets.QCheckBox("Preview visible area", body)
+        self.previewCheck.setChecked(True)
+        self.previewCheck.toggled.connect(self._emitChanged)
+
+        self.progressBar = QtWidgets.QProgressBar(body)
+        self.progressBar.setVisible(False)
+        applyRow = QtWidgets.QHBoxLayout()
+        self.applyBtn = QtWidgets.QPushButton("✅ Apply to Map", body)
+        self.applyBtn.clicked.connect(lambda: self.applyRequested.emit(self.steps()))
+        self.cancelBtn = QtWidgets.QPushButton("Cancel", body)
+        self.cancelBtn.setEnabled(False)
+        self.cancelBtn.clicked.connect(self.cancelRequested.emit)
+        applyRow.addWidget(self.applyBtn)
+        applyRow.addWidget(self.cancelBtn)
+
+        layout.addLayout(stepRow)
+        layout.addWidget(self.stepList)
+        layout.addLayout(listBtns)
+        layout.addWidget(self.previewCheck)
+        layout.addWidget(self.progressBar)
+        layout.addLayout(applyRow)
+        self.setWidget(body)
+        self._updateButtons()
+
+    def steps(self):
+        return [tuple(self.stepList.item(i).data(QtCore.Qt.UserRole)) for i in range(self.stepList.count())]
+
+    def addStep(self):
+        step = (self.opBox.currentData(), self.classBox.currentData(), self.sizeSpin.value())
+        item = QtWidgets.QListWidgetItem(f"{self.opBox.currentText()} {self.classBox.currentText().lower()} "
+                                         f"× {step[2]}")
+        item.setData(QtCore.Qt.UserRole, list(step))
+        self.stepList.addItem(item)
+        self._emitChanged()
+
+    def removeStep(self):
+        row = self.stepList.currentRow()
+        if row >= 0:
+            self.stepList.takeItem(row)
+            self._emitChanged()
+
+    def clearSteps(self):
+        self.stepList.clear()
+        self._emitChanged()
+
+    def setRunning(self, running):
+        """Switch between editing and 'applying on the worker' states."""
+        self.progressBar.setVisible(running)
+        self.progressBar.setValue(0)
+        self.cancelBtn.setEnabled(running)
+        for w in (self.applyBtn, self.addBtn, self.removeBtn, self.clearBtn, self.stepList):
+            w.setEnabled(not running)
+        if not running:
+            self._updateButtons()
+
+    def setProgress(self, done, total):
+        self.progressBar.setMaximum(max(1, total))
+        self.progressBar.setValue(done)
+
+    def _updateButtons(self):
+        has_steps = self.stepList.count() > 0
+        self.applyBtn.setEnabled(has_steps)
+        self.removeBtn.setEnabled(has_steps)
+        self.clearBtn.setEnabled(has_steps)
+
+    def _emitChanged(self, *args):
+        self._updateButtons()
+        self.pipelineChanged.emit(self.steps() if self.previewCheck.isChecked() else [])
+
+    def closeEvent(self, event):
+        super(MorphologyPanel, self).closeEvent(event)
+        self.closed.emit()
+
+
+class CanvasDialog(QtWidgets.QDialog):
+    """Grow or shrink the map canvas edge by edge.
+
+    Each spin box is the number of cells to add on that side (negative
+    values crop). "Fit to known area" fills them in from `known_bbox`
+    (x0, y0, x1, y1) plus the margin. Read `edges()` after exec_().
+    """
+
+    def __init__(self, width, height, resolution, known_bbox=None, margin=10, parent=None):
+        super(CanvasDialog, self).__init__(parent)
+        self.setWindowTitle("Crop / pad canvas")
+        self.map_size = (width, height)
+        self.resolution = resolution
+        self.known_bbox = known_bbox
+
+        layout = QtWidgets.QFormLayout(self)
+        self.edgeSpins = {}
+        for side in ('left', 'top', 'right', 'bottom'):
+            spin = QtWidgets.QSpinBox(self)
+            spin.setRange(-1000000, 1000000)
+            spin.setSuffix(" cells")
+            spin.valueChanged.connect(self._updateSummary)
+            self.edgeSpins[side] = spin
+            layout.addRow(f"{side.capitalize()}:", spin)
+
+        fitRow = QtWidgets.QHBoxLayout()
+        self.marginSpin = QtWidgets.QSpinBox(self)
+        self.marginSpin.setRange(0, 100000)
+        self.marginSpin.setValue(margin)
+        self.marginSpin.setSuffix(" cells")
+        self.fitBtn = QtWidgets.QPushButton("Fit to known area", self)
+        self.fitBtn.setEnabled(known_bbox is not None)
+        self.fitBtn.clicked.connect(self.fitToKnown)
+        fitRow.addWidget(self.marginSpin)
+        fitRow.addWidget(self.fitBtn)
+        layout.addRow("Margin:", fitRow)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        layout.addRow(self.summaryLbl)
+
+        self.buttons = QtWidgets.QDialogButtonBox(
+            QtWidgets.QDialogButtonBox.Ok | QtWidgets.QDialogButtonBox.Cancel, self)
+        self.buttons.accepted.connect(self.accept)
+        self.buttons.rejected.connect(self.reject)
+        layout.addRow(self.buttons)
+        self._updateSummary()
+
+    def edges(self):
+        """(left, top, right, bottom) cells to add; negative values crop."""
+        return tuple(self.edgeSpins[s].value() for s in ('left', 'top', 'right', 'bottom'))
+
+    def fitToKnown(self):
+        if self.known_bbox is None:
+            return
+        margin = self.marginSpin.value()
+        x0, y0, x1, y1 = self.known_bbox
+        w, h = self.map_size
+        # Margins may reach past the current edges; those cells are padded
+        values = (margin - x0, margin - y0, x1 + margin - w, y1 + margin - h)
+        for side, value in zip(('left', 'top', 'right', 'bottom'), values):
+            self.edgeSpins[side].setValue(value)
+
+    def _updateSummary(self, *args):
+        left, top, right, bottom = self.edges()
+        w, h = self.map_size
+        new_w, new_h = w + left + right, h + top + bottom
+        ok = new_w > 0 and new_h > 0
+        self.buttons.button(QtWidgets.QDialogButtonBox.Ok).setEnabled(ok and any(self.edges()))
+        if ok:
+            self.summaryLbl.setText(f"{w}x{h} → {new_w}x{new_h} cells "
+                                    f"({new_w * self.resolution:.2f} x {new_h * self.resolution:.2f} m)")
+        else:
+            self.summaryLbl.setText("⚠️ The map would be empty")
+
+
+class ClearanceDialog(QtWidgets.QDialog):
+    """Controls for the clearance heatmap.
+
+    Emits `previewChanged(threshold, max_range)` (both in meters) whenever a
+    value changes and `closed()` when the dialog goes away. Only the color
+    lookup table depends on the values, so no debouncing is needed.
+    """
+    previewChanged = QtCore.pyqtSignal(float, float)
+    closed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(ClearanceDialog, self).__init__(parent)
+        self.setWindowTitle("Clearance heatmap")
+        self.setModal(False)
+
+        layout = QtWidgets.QFormLayout(self)
+        self.thresholdSpin = QtWidgets.QDoubleSpinBox(self)
+        self.thresholdSpin.setRange(0.0, 10.0)
+        self.thresholdSpin.setDecimals(2)
+        self.thresholdSpin.setSingleStep(0.05)
+        self.thresholdSpin.setValue(0.3)
+        self.thresholdSpin.setSuffix(" m")
+        self.thresholdSpin.setToolTip("Free cells closer than this to an obstacle are highlighted "
+                                      "(e.g. the robot's footprint radius)")
+        layout.addRow("Highlight clearance below:", self.thresholdSpin)
+
+        self.rangeSpin = QtWidgets.QDoubleSpinBox(self)
+        self.rangeSpin.setRange(0.05, 50.0)
+        self.rangeSpin.setDecimals(2)
+        self.rangeSpin.setSingleStep(0.25)
+        self.rangeSpin.setValue(1.5)
+        self.rangeSpin.setSuffix(" m")
+        self.rangeSpin.setToolTip("Clearances above this are not colored")
+        layout.addRow("Color scale up to:", self.rangeSpin)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        self.summaryLbl.setWordWrap(True)
+        layout.addRow(self.summaryLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close, self)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.thresholdSpin.valueChanged.connect(lambda _: self.previewChanged.emit(*self.params()))
+        self.rangeSpin.valueChanged.connect(lambda _: self.previewChanged.emit(*self.params()))
+
+    def params(self):
+        return self.thresholdSpin.value(), self.rangeSpin.value()
+
+    def setSummary(self, text):
+        self.summaryLbl.setText(text)
+
+    def showEvent(self, event):
+        super(ClearanceDialog, self).showEvent(event)
+        self.previewChanged.emit(*self.params())
+
+    def done(self, result):
+        super(ClearanceDialog, self).done(result)
+        self.closed.emit()
+
+
+class InflationDialog(QtWidgets.QDialog):
+    """nav2 inflation layer parameters for the cost preview.
+
+    Emits `previewChanged(inflation_radius, cost_scaling_factor, inscribed_radius)`
+    (meters, 1/meters, meters) on every change, so the radius slider can be
+    scrubbed, and `closed()` when the dialog goes away.
+    """
+    previewChanged = QtCore.pyqtSignal(float, float, float)
+    closed = QtCore.pyqtSignal()
+
+    MAX_RADIUS = 5.0
+    # nav2 defaults: inflation_radius, cost_scaling_factor, inscribed radius
+    DEFAULTS = (0.55, 3.0, 0.22)
+
+    def __init__(self, parent=None):
+        super(InflationDialog, self).__init__(parent)
+        self.setWindowTitle("Inflation cost preview")
+        self.setModal(False)
+
+        layout = QtWidgets.QFormLayout(self)
+        self.radiusSlider = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
+        self.radiusSlider.setRange(0, int(self.MAX_RADIUS * 100))
+        self.radiusSpin = QtWidgets.QDoubleSpinBox(self)
+        self.radiusSpin.setRange(0.0, self.MAX_RADIUS)
+        self.radiusSpin.setDecimals(2)
+        self.radiusSpin.setSingleStep(0.05)
+        self.radiusSpin.setSuffix(" m")
+        radiusRow = QtWidgets.QHBoxLayout()
+        radiusRow.addWidget(self.radiusSlider)
+        radiusRow.addWidget(self.radiusSpin)
+        layout.addRow("inflation_radius:", radiusRow)
+
+        self.scalingSpin = QtWidgets.QDoubleSpinBox(self)
+        self.scalingSpin.setRange(0.0, 100.0)
+        self.scalingSpin.setDecimals(2)
+        self.scalingSpin.setSingleStep(0.5)
+        self.scalingSpin.setValue(self.DEFAULTS[1])
+        self.scalingSpin.setToolTip("Higher values make the cost fall off faster away from obstacles")
+        layout.addRow("cost_scaling_factor:", self.scalingSpin)
+
+        self.inscribedSpin = QtWidgets.QDoubleSpinBox(self)
+        self.inscribedSpin.setRange(0.0, self.MAX_RADIUS)
+        self.inscribedSpin.setDecimals(2)
+        self.inscribedSpin.setSingleStep(0.01)
+        self.inscribedSpin.setValue(self.DEFAULTS[2])
+        self.inscribedSpin.setSuffix(" m")
+        self.inscribedSpin.setToolTip("Robot inscribed radius (robot_radius for circular robots)")
+        layout.addRow("Inscribed radius:", self.inscribedSpin)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        self.summaryLbl.setWordWrap(True)
+        layout.addRow(self.summaryLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(QtWidgets.QDialogButtonBox.Close, self)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.radiusSlider.valueChanged.connect(lambda v: self.radiusSpin.setValue(v / 100.0))
+        self.radiusSpin.valueChanged.connect(self._onRadius)
+        self.scalingSpin.valueChanged.connect(lambda _: self.previewChanged.emit(*self.params()))
+        self.inscribedSpin.valueChanged.connect(lambda _: self.previewChanged.emit(*self.params()))
+        self.radiusSpin.setValue(self.DEFAULTS[0])
+
+    def _onRadius(self, value):
+        if self.radiusSlider.value() != int(round(value * 100)):
+            self.radiusSlider.blockSignals(True)
+            self.radiusSlider.setValue(int(round(value * 100)))
+            self.radiusSlider.blockSignals(False)
+        self.previewChanged.emit(*self.params())
+
+    def params(self):
+        return self.radiusSpin.value(), self.scalingSpin.value(), self.inscribedSpin.value()
+
+    def setSummary(self, text):
+        self.summaryLbl.setText(text)
+
+    def showEvent(self, event):
+        super(InflationDialog, self).showEvent(event)
+        self.previewChanged.emit(*self.params())
+
+    def done(self, result):
+        super(InflationDialog, self).done(result)
+        self.closed.emit()
+
+
+class ReachabilityDialog(QtWidgets.QDialog):
+    """Lists the free regions that cannot be reached from the picked start cell.
+
+    Emits `pickRequested()` for a new start cell, `markRequested(kind)` with
+    kind 'uncertain' or 'occupied', `pocketActivated(x, y)` (cell coordinates
+    of a region's centroid) when a row is double-clicked, and `closed()`.
+    """
+    pickRequested = QtCore.pyqtSignal()
+    markRequested = QtCore.pyqtSignal(str)
+    pocketActivated = QtCore.pyqtSignal(float, float)
+    closed = QtCore.pyqtSignal()
+
+    MAX_LISTED = 200
+
+    def __init__(self, parent=None):
+        super(ReachabilityDialog, self).__init__(parent)
+        self.setWindowTitle("Reachability")
+        self.setModal(False)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        self.summaryLbl = QtWidgets.QLabel("Pick the robot's start cell on the map.", self)
+        self.summaryLbl.setWordWrap(True)
+        layout.addWidget(self.summaryLbl)
+
+        self.pocketList = QtWidgets.QListWidget(self)
+        self.pocketList.setToolTip("Largest first. Double-click to center the view on a region.")
+        self.pocketList.itemDoubleClicked.connect(
+            lambda item: self.pocketActivated.emit(*item.data(QtCore.Qt.UserRole)))
+        layout.addWidget(self.pocketList)
+
+        buttons = QtWidgets.QDialogButtonBox(self)
+        self.pickBtn = buttons.addButton("🚩 Pick start", QtWidgets.QDialogButtonBox.ActionRole)
+        self.unknownBtn = buttons.addButton("Mark unknown", QtWidgets.QDialogButtonBox.ActionRole)
+        self.occupiedBtn = buttons.addButton("Mark occupied", QtWidgets.QDialogButtonBox.ActionRole)
+        buttons.addButton(QtWidgets.QDialogButtonBox.Close)
+        self.pickBtn.clicked.connect(self.pickRequested.emit)
+        self.unknownBtn.clicked.connect(lambda: self.markRequested.emit('uncertain'))
+        self.occupiedBtn.clicked.connect(lambda: self.markRequested.emit('occupied'))
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+        self.setPockets([], self.summaryLbl.text())
+
+    def setPockets(self, pockets, summary):
+        """Show `pockets` as (area_m2, cells, x, y) tuples, largest first."""
+        self.summaryLbl.setText(summary)
+        self.pocketList.clear()
+        for area_m2, cells, x, y in pockets:
+            item = QtWidgets.QListWidgetItem(f"{area_m2:.2f} m²  ({cells} cells)")
+            item.setData(QtCore.Qt.UserRole, (x, y))
+            self.pocketList.addItem(item)
+        self.unknownBtn.setEnabled(bool(pockets))
+        self.occupiedBtn.setEnabled(bool(pockets))
+
+    def done(self, result):
+        super(ReachabilityDialog, self).done(result)
+        self.closed.emit()
+
+
+class WallVectorDialog(QtWidgets.QDialog):
+    """Controls for wall vectorization.
+
+    Emits `toleranceChanged(tolerance)` (meters) when the simplification
+    tolerance changes or the dialog is shown, `exportRequested()` for the
+    SVG/DXF export and `closed()` when the dialog goes away.
+    """
+    toleranceChanged = QtCore.pyqtSignal(float)
+    exportRequested = QtCore.pyqtSignal()
+    closed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(WallVectorDialog, self).__init__(parent)
+        self.setWindowTitle("Vectorize walls")
+        self.setModal(False)
+
+        layout = QtWidgets.QFormLayout(self)
+        self.toleranceSpin = QtWidgets.QDoubleSpinBox(self)
+        self.toleranceSpin.setRange(0.0, 1.0)
+        self.toleranceSpin.setDecimals(3)
+        self.toleranceSpin.setSingleStep(0.01)
+        self.toleranceSpin.setValue(0.05)
+        self.toleranceSpin.setSuffix(" m")
+        self.toleranceSpin.setToolTip("Douglas-Peucker tolerance: how far the simplified walls may "
+                                      "deviate from the traced cell outline")
+        layout.addRow("Simplification tolerance:", self.toleranceSpin)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        self.summaryLbl.setWordWrap(True)
+        layout.addRow(self.summaryLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(self)
+        self.exportBtn = buttons.addButton("📐 Export SVG + DXF", QtWidgets.QDialogButtonBox.ActionRole)
+        self.exportBtn.setToolTip("Write the walls and dimensions to output/ in world meters")
+        buttons.addButton(QtWidgets.QDialogButtonBox.Close)
+        self.exportBtn.clicked.connect(self.exportRequested.emit)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+
+        self.toleranceSpin.valueChanged.connect(self.toleranceChanged.emit)
+
+    def tolerance(self):
+        return self.toleranceSpin.value()
+
+    def setSummary(self, text):
+        self.summaryLbl.setText(text)
+
+    def showEvent(self, event):
+        super(WallVectorDialog, self).showEvent(event)
+        self.toleranceChanged.emit(self.tolerance())
+
+    def done(self, result):
+        super(WallVectorDialog, self).done(result)
+        self.closed.emit()
+
+
+class StraightenDialog(QtWidgets.QDialog):
+    """Parameters for redrawing jagged walls as straight lines.
+
+    Emits `previewChanged(params)` (debounced) while the user edits,
+    `applyRequested(params)` on Apply and `closed()` when the dialog goes
+    away. `params` is the dict returned by params(); lengths are in meters.
+    """
+    previewChanged = QtCore.pyqtSignal(object)
+    applyRequested = QtCore.pyqtSignal(object)
+    closed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(StraightenDialog, self).__init__(parent)
+        self.setWindowTitle("Straighten walls")
+        self.setModal(False)
+
+        layout = QtWidgets.QFormLayout(self)
+
+        def meters(value, maximum, step, tip):
+            spin = QtWidgets.QDoubleSpinBox(self)
+            spin.setRange(0.0, maximum)
+            spin.setDecimals(2)
+            spin.setSingleStep(step)
+            spin.setValue(value)
+            spin.setSuffix(" m")
+            spin.setToolTip(tip)
+            spin.valueChanged.connect(lambda _: self._debounce.start())
+            return spin
+
+        self._debounce = QtCore.QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(250)
+        self._debounce.timeout.connect(lambda: self.previewChanged.emit(self.params()))
+
+        self.minLengthSpin = meters(0.5, 20.0, 0.1, "Shorter straight runs are left alone")
+        layout.addRow("Minimum wall length:", self.minLengthSpin)
+        self.bandSpin = meters(0.1, 1.0, 0.05, "Cells up to this far from a wall face count as part of it; "
+                                              "occupied noise within it on the free side is cleared")
+        layout.addRow("Noise band:", self.bandSpin)
+        self.thicknessSpin = meters(0.1, 1.0, 0.05, "Width of the redrawn wall line")
+        layout.addRow("Wall thickness:", self.thicknessSpin)
+
+        self.snapCheck = QtWidgets.QCheckBox("Snap to dominant wall directions", self)
+        self.snapCheck.setChecked(True)
+        self.snapCheck.setToolTip("Make walls close to the map's main wall angle (or its perpendicular) exactly parallel to it")
+        self.snapSpin = QtWidgets.QDoubleSpinBox(self)
+        self.snapSpin.setRange(0.0, 45.0)
+        self.snapSpin.setDecimals(1)
+        self.snapSpin.setValue(10.0)
+        self.snapSpin.setSuffix("°")
+        self.snapSpin.setToolTip("Walls further off than this keep their own angle")
+        self.snapCheck.toggled.connect(self.snapSpin.setEnabled)
+        self.snapCheck.toggled.connect(lambda _: self._debounce.start())
+        self.snapSpin.valueChanged.connect(lambda _: self._debounce.start())
+        snapRow = QtWidgets.QHBoxLayout()
+        snapRow.addWidget(self.snapCheck)
+        snapRow.addWidget(self.snapSpin)
+        layout.addRow(snapRow)
+
+        self.summaryLbl = QtWidgets.QLabel("", self)
+        self.summaryLbl.setWordWrap(True)
+        layout.addRow(self.summaryLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(self)
+        self.applyBtn = buttons.addButton("Apply", QtWidgets.QDialogButtonBox.AcceptRole)
+        buttons.addButton(QtWidgets.QDialogButtonBox.Close)
+        self.applyBtn.clicked.connect(lambda: self.applyRequested.emit(self.params()))
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.setSummary("", False)
+
+    def params(self):
+        return {
+            'min_length': self.minLengthSpin.value(),
+            'band': self.bandSpin.value(),
+            'thickness': self.thicknessSpin.value(),
+            'snap_deg': self.snapSpin.value() if self.snapCheck.isChecked() else None,
+        }
+
+    def setSummary(self, text, can_apply):
+        self.summaryLbl.setText(text)
+        self.applyBtn.setEnabled(can_apply)
+
+    def showEvent(self, event):
+        super(StraightenDialog, self).showEvent(event)
+        self._debounce.start(0)
+
+    def done(self, result):
+        self._debounce.stop()
+        super(StraightenDialog, self).done(result)
+        self.closed.emit()
+
+
+class CompareDialog(QtWidgets.QDialog):
+    """Map diff viewer controls: pick a reference map and read the statistics.
+
+    Emits `loadRequested()` to choose a reference map file,
+    `openedRequested()` to compare against the open map's file as it is on
+    disk, and `closed()` when the dialog goes away.
+    """
+    loadRequested = QtCore.pyqtSignal()
+    openedRequested = QtCore.pyqtSignal()
+    closed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super(CompareDialog, self).__init__(parent)
+        self.setWindowTitle("Compare maps")
+        self.setModal(False)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        self.referenceLbl = QtWidgets.QLabel("No reference map loaded.", self)
+        self.referenceLbl.setWordWrap(True)
+        layout.addWidget(self.referenceLbl)
+        legend = QtWidgets.QLabel("<span style='color:#00c040'>■</span> added obstacles &nbsp; "
+                                  "<span style='color:#ff2828'>■</span> removed obstacles &nbsp; "
+                                  "<span style='color:#ffc800'>■</span> free ↔ unknown", self)
+        layout.addWidget(legend)
+        self.statsLbl = QtWidgets.QLabel("", self)
+        self.statsLbl.setWordWrap(True)
+        layout.addWidget(self.statsLbl)
+
+        buttons = QtWidgets.QDialogButtonBox(self)
+        self.loadBtn = buttons.addButton("📂 Load reference…", QtWidgets.QDialogButtonBox.ActionRole)
+        self.loadBtn.setToolTip("Compare with another map; it is aligned through the YAML origins")
+        self.openedBtn = buttons.addButton("🕘 As opened", QtWidgets.QDialogButtonBox.ActionRole)
+        self.openedBtn.setToolTip("Compare with the open map's file on disk, before this session's edits")
+        buttons.addButton(QtWidgets.QDialogButtonBox.Close)
+        self.loadBtn.clicked.connect(self.loadRequested.emit)
+        self.openedBtn.clicked.connect(self.openedRequested.emit)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def setReference(self, text):
+        self.referenceLbl.setText(text)
+
+    def setStats(self, text):
+        self.statsLbl.setText(text)
+
+    def done(self, result):
+        super(CompareDialog, self).done(result)
+        self.closed.emit()
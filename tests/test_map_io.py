@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+# Regression checks for the map readers. Run with: python -m pytest tests
+
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import map_io  # noqa: E402
+from map_io import DepthMapping, read_map, read_map_header  # noqa: E402
+
+
+def _write_png16(path):
+    samples = np.linspace(0, 11000, 64 * 32).astype(np.uint16).reshape(32, 64)
+    Image.fromarray(samples).save(path)
+    return samples
+
+
+def _open_as_mode_i(monkeypatch):
+    """Open images the way Pillow 9 opens 16-bit PNGs: as mode 'I'."""
+    open_image = Image.open
+
+    def open_i(stream):
+        im = open_image(stream)
+        im.load()
+        return im.convert('I') if im.mode.startswith('I;16') else im
+    monkeypatch.setattr(map_io.Image, 'open', open_i)
+
+
+def test_png16_uses_the_16_bit_range(tmp_path, monkeypatch):
+    path = str(tmp_path / 'depth.png')
+    samples = _write_png16(path)
+    expected = np.rint(samples / 65535.0 * 255).astype(np.uint8)
+    header = read_map_header(path)
+    results = [read_map(path)]
+    _open_as_mode_i(monkeypatch)
+    results.append(read_map(path))
+    for data, info in results:
+        assert info['maxval'] == header['maxval'] == 65535
+        assert np.array_equal(data, expected)
+
+
+def test_png16_shift_keeps_the_high_byte(tmp_path, monkeypatch):
+    path = str(tmp_path / 'depth.png')
+    samples = _write_png16(path)
+    shift = DepthMapping('shift')
+    plain, _ = read_map(path, shift)
+    _open_as_mode_i(monkeypatch)
+    legacy, _ = read_map(path, shift)
+    assert np.array_equal(plain, (samples >> 8).astype(np.uint8))
+    assert np.array_equal(legacy, plain)